@@ -3,12 +3,16 @@ VanCr Backend API - Contact Form & Product Management Service
 Python Flask app with Azure Cosmos DB, Azure Blob Storage, and Azure SQL Database
 Uses Managed Identity for authentication to Azure services
 """
+import importlib
+import importlib.util
+import math
 import os
 import sys
 import uuid
-import json
-from datetime import datetime, timezone
-from flask import Flask, request, jsonify, send_from_directory
+import mimetypes
+import re
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response, request, jsonify, render_template
 
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
@@ -18,31 +22,89 @@ if sys.platform == 'win32':
         pass
 from flask_cors import CORS
 import struct
+import tempfile
+import threading
+import time
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-import bcrypt
-
-# Import Azure SDK with graceful fallback for local dev
-try:
-    from azure.cosmos import CosmosClient, PartitionKey
-    from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
-    from azure.storage.blob import BlobServiceClient, ContentSettings
-    AZURE_AVAILABLE = True
-except ImportError as e:
-    print(f"WARNING: Azure SDK not available: {e}")
-    print("Running in local dev mode without Azure services")
-    AZURE_AVAILABLE = False
-
-# Try to import pyodbc for SQL Server, fallback if not available
-try:
-    import pyodbc
-    PYODBC_AVAILABLE = True
-except ImportError:
-    print("WARNING: pyodbc not available - SQL Server connections will fail")
-    PYODBC_AVAILABLE = False
+from search import SearchIndex
+from price_index import PriceIndex, SORT_OPTIONS
+from jobs import JobQueue
+from assets import AssetServer, SITE_ROOT, is_hashed_asset, negotiate_encoding
+from static_cache import StaticCache, static_response
+from uploads import LimitedRequest, check_image_stream, check_image_upload
+from metrics import instrument, instrument_app, render_metrics, timed
+from tracing import TraceExporter, span, trace_requests
+from log_setup import configure_logging, parse_levels
+from json_provider import FastJSONProvider
+from ratelimit import MemoryStore, RateLimiter, SQLiteStore, client_address, parse_limit
+from compression import DEFAULT_CONTENT_TYPES, DEFAULT_ENCODINGS, DEFAULT_MIN_SIZE, Compressor, compress_responses
+from image_gc import DEFAULT_GRACE_SECONDS, collect_orphans
+from blob_upload import DEFAULT_BLOCK_SIZE, DEFAULT_MAX_CONCURRENCY
+from image_store import ImageStore, content_blob_name, content_hash
+from snapshot import (
+    BlobContainerPublisher, LocalDirectoryPublisher, IMMUTABLE_CACHE_CONTROL,
+    compact_product, is_fingerprinted, publish_snapshot,
+)
+from markupsafe import Markup
+from storefront import FILTER_GROUPS, SUBCATEGORIES, FragmentCache, filter_products, inline_json, shop_filters
+
+# Heavy SDKs (Azure, pyodbc, bcrypt) are imported where they are used, or ahead
+# of time by the warm-up thread, so the app can answer requests sooner after a
+# cold start; here we only check that they are installed
+def _module_available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+AZURE_AVAILABLE = all(_module_available(name) for name in ('azure.cosmos', 'azure.identity', 'azure.storage.blob'))
+PYODBC_AVAILABLE = _module_available('pyodbc')
 
-# Flask app with static files from parent directory
-app = Flask(__name__, static_folder='..', static_url_path='')
+# Logging: root level, per-logger levels ("azure=WARNING,jobs=DEBUG"), json or text
+# lines, records up to LOG_RATE_LEVEL (DEBUG; INFO opts INFO in too) let through per
+# call site per LOG_RATE_WINDOW seconds (0 = no limit) and the fraction of DEBUG records kept
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = parse_levels(os.environ.get('LOG_LEVELS'))
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text' if os.environ.get('FLASK_DEBUG') else 'json')
+LOG_RATE_LIMIT = int(os.environ.get('LOG_RATE_LIMIT', '20'))
+LOG_RATE_WINDOW = float(os.environ.get('LOG_RATE_WINDOW', '60'))
+LOG_RATE_LEVEL = os.environ.get('LOG_RATE_LEVEL', 'DEBUG')
+LOG_DEBUG_SAMPLE = float(os.environ.get('LOG_DEBUG_SAMPLE', '1'))
+log_handler = configure_logging(LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_RATE_LIMIT, LOG_RATE_WINDOW, LOG_DEBUG_SAMPLE,
+                                rate_level=LOG_RATE_LEVEL)
+
+# Flask app; the site in the parent directory is served by serve_static (Flask's own
+# static route would match every path ahead of it)
+app = Flask(__name__, static_folder=None)
 CORS(app)  # Enable CORS for all origins (restrict in production via CORS config)
+app.json = FastJSONProvider(app)  # orjson for jsonify() and request bodies when installed
+instrument_app(app)  # Request latency per route, served from /metrics
+
+if not AZURE_AVAILABLE:
+    app.logger.warning('Azure SDK not available; running in local dev mode without Azure services')
+if not PYODBC_AVAILABLE:
+    app.logger.warning('pyodbc not available - SQL Server connections will fail')
+
+# Request tracing: every request gets an X-Request-ID (also on its log lines) and a
+# trace of its dependency calls. Finished traces are appended to TRACE_FILE and/or
+# posted to an OTLP/HTTP collector; only those slower than TRACE_MIN_MS are kept
+TRACE_FILE = os.environ.get('TRACE_FILE')
+TRACE_OTLP_ENDPOINT = os.environ.get('TRACE_OTLP_ENDPOINT')
+TRACE_MIN_MS = float(os.environ.get('TRACE_MIN_MS', '0'))
+trace_exporter = None
+if TRACE_FILE or TRACE_OTLP_ENDPOINT:
+    trace_exporter = TraceExporter(TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_MIN_MS, logger=app.logger)
+trace_requests(app, trace_exporter)
+
+# Response compression: codings in server preference order (empty disables it), the
+# minimum body size in bytes and the content types that are compressed
+COMPRESS_ENCODINGS = os.environ.get('COMPRESS_ENCODINGS', ','.join(DEFAULT_ENCODINGS))
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', str(DEFAULT_MIN_SIZE)))
+COMPRESS_TYPES = os.environ.get('COMPRESS_TYPES', ','.join(DEFAULT_CONTENT_TYPES))
+compressor = Compressor([e.strip() for e in COMPRESS_ENCODINGS.split(',') if e.strip()], COMPRESS_MIN_SIZE,
+                        [t.strip() for t in COMPRESS_TYPES.split(',') if t.strip()])
+compress_responses(app, compressor)
 
 # Environment variables
 COSMOS_ACCOUNT = os.environ.get('COSMOS_ACCOUNT', 'vancr-cosmos')
@@ -61,73 +123,181 @@ SQL_USERNAME = 'vancradmin'
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
-# Initialize Azure credential for authentication
+# Image uploads are staged to Blob Storage in blocks of this size, this many at a time
+BLOB_BLOCK_SIZE = int(os.environ.get('BLOB_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+BLOB_MAX_CONCURRENCY = int(os.environ.get('BLOB_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+
+# Direct-to-blob browser uploads: SAS lifetime in seconds and maximum image size
+UPLOAD_SAS_TTL = int(os.environ.get('UPLOAD_SAS_TTL', '600'))
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', str(20 * 1024 * 1024)))
+
+# Request bodies: default limit, limit for the product upload routes (image plus
+# form fields), size above which file parts spool to disk and image dimension
+# limits (checked from header bytes before anything is stored)
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', str(1024 * 1024)))
+MAX_UPLOAD_REQUEST_BYTES = int(os.environ.get('MAX_UPLOAD_REQUEST_BYTES', str(MAX_IMAGE_BYTES + 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', str(1024 * 1024)))
+MAX_IMAGE_DIMENSION = int(os.environ.get('MAX_IMAGE_DIMENSION', '12000'))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(50 * 1000 * 1000)))
+
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+app.request_class = LimitedRequest
+LimitedRequest.body_limits = {'add_product': MAX_UPLOAD_REQUEST_BYTES, 'update_product': MAX_UPLOAD_REQUEST_BYTES}
+LimitedRequest.spool_threshold = UPLOAD_SPOOL_BYTES
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Seconds before the in-process catalog indexes (search, price) are refreshed
+# from Cosmos DB (picks up writes made through other gunicorn workers)
+CATALOG_INDEX_TTL = int(os.environ.get('CATALOG_INDEX_TTL', '300'))
+
+# Static catalog snapshot (data/products.json fallback used by shop.js).
+# Published to SNAPSHOT_CONTAINER in Blob Storage when set, otherwise to SNAPSHOT_DIR.
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', os.path.join(SITE_ROOT, 'data'))
+SNAPSHOT_CONTAINER = os.environ.get('SNAPSHOT_CONTAINER')
+SNAPSHOT_DEBOUNCE = float(os.environ.get('SNAPSHOT_DEBOUNCE', '2'))
+
+# Server-rendered shop.html (product grid and catalog data inlined); set to 0 to
+# serve the root shop.html (rendered from the same template) that shop.js fills in
+SSR_SHOP = os.environ.get('SSR_SHOP', '1') == '1'
+
+# Background jobs (renditions, blob cleanup, metadata, snapshots): SQLite queue file
+# shared by all worker processes, worker threads per process and attempts before dead-lettering.
+# The file belongs on local disk: SQLite locking is unreliable on App Service's /home
+# share (SMB), so the default is the instance's temp directory. It is opened on first use.
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'vancr-jobs.sqlite3'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+# Finished jobs are deleted after JOB_RETENTION seconds, checked every JOB_PURGE_INTERVAL (0 disables)
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', str(7 * 24 * 3600)))
+JOB_PURGE_INTERVAL = float(os.environ.get('JOB_PURGE_INTERVAL', '3600'))
+
+# Orphaned image collection: seconds between scheduled runs (0 disables) and
+# minimum blob age before deletion
+IMAGE_GC_INTERVAL = float(os.environ.get('IMAGE_GC_INTERVAL', str(24 * 3600)))
+IMAGE_GC_GRACE = float(os.environ.get('IMAGE_GC_GRACE', str(DEFAULT_GRACE_SECONDS)))
+
+# Bearer token required to read /metrics (open when unset)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Import the SDKs and open the Azure clients in a background thread when a
+# worker starts (set to 0 to load everything on first use instead)
+WARM_UP = os.environ.get('WARM_UP', '1') == '1'
+
+# Token buckets for the bcrypt endpoints as "requests/seconds" (0 disables one), per
+# client IP and per target email (for login, failed attempts only). RATE_LIMIT_DB shares
+# the buckets between worker processes through a SQLite file; gunicorn.conf.py sets it
+# when it runs more than one worker (otherwise each process keeps its own in memory).
+# X-Forwarded-For is trusted for RATE_LIMIT_PROXIES hops (App Service's front end is one)
+RATE_LIMIT = os.environ.get('RATE_LIMIT', '1') == '1'
+RATE_LIMIT_LOGIN_IP = parse_limit(os.environ.get('RATE_LIMIT_LOGIN_IP', '20/60'))
+RATE_LIMIT_LOGIN_EMAIL = parse_limit(os.environ.get('RATE_LIMIT_LOGIN_EMAIL', '5/300'))
+RATE_LIMIT_SIGNUP_IP = parse_limit(os.environ.get('RATE_LIMIT_SIGNUP_IP', '5/600'))
+RATE_LIMIT_SIGNUP_EMAIL = parse_limit(os.environ.get('RATE_LIMIT_SIGNUP_EMAIL', '3/3600'))
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB')
+RATE_LIMIT_PROXIES = int(os.environ.get('RATE_LIMIT_PROXIES', '1'))
+rate_limiter = RateLimiter(SQLiteStore(RATE_LIMIT_DB) if RATE_LIMIT_DB else MemoryStore(), {
+    'login_ip': RATE_LIMIT_LOGIN_IP,
+    'login_email': RATE_LIMIT_LOGIN_EMAIL,
+    'signup_ip': RATE_LIMIT_SIGNUP_IP,
+    'signup_email': RATE_LIMIT_SIGNUP_EMAIL,
+} if RATE_LIMIT else {})
+
+# Azure credential, created on first use (see get_credential)
 credential = None
-if AZURE_AVAILABLE:
-    print("Initializing Azure credential...")
-    try:
-        # For local development, use AzureCliCredential (works with 'az login')
-        # For production (Azure), use ManagedIdentityCredential
-        from azure.identity import AzureCliCredential, ManagedIdentityCredential, ChainedTokenCredential
-        
-        # Try CLI credential first (local), then Managed Identity (Azure)
-        cli_credential = AzureCliCredential()
-        managed_credential = ManagedIdentityCredential()
-        credential = ChainedTokenCredential(cli_credential, managed_credential)
-        
-        print("[OK] Azure credential initialized (CLI + Managed Identity chain)")
-    except Exception as e:
-        print(f"WARNING: Could not initialize Azure credential: {e}")
-        credential = None
-else:
-    print("WARNING: Azure SDK not available - Azure services will not work")
+credential_lock = threading.Lock()
 
 cosmos_client = None
 database = None
 container = None
 blob_service_client = None
 
+# In-process catalog indexes, loaded from Cosmos DB on first use
+search_index = SearchIndex()
+price_index = PriceIndex()
+catalog_loaded_at = None
+catalog_lock = threading.Lock()
+catalog_refreshing = False
+# Guards index writes and the swap to a rebuilt index; while a rebuild is
+# reading Cosmos DB, writes are also recorded here to be replayed onto it
+catalog_write_lock = threading.Lock()
+catalog_pending_writes = None
+# Bumped on every catalog change; keys the rendered storefront fragments
+catalog_version = 0
+fragment_cache = FragmentCache()
+# Serialized catalog API responses (and their compressed variants), also keyed by catalog_version
+RESPONSE_CACHE_ENTRIES = int(os.environ.get('RESPONSE_CACHE_ENTRIES', '64'))
+response_cache = FragmentCache(max_entries=RESPONSE_CACHE_ENTRIES)
+
+job_queue = JobQueue(JOB_DB_PATH, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS, logger=app.logger)
+# Process that started the warm-up and job workers (they are per process)
+background_pid = None
+background_lock = threading.Lock()
+
+# User delegation key for upload SAS tokens (valid for hours, so it is reused)
+user_delegation_key = None
+user_delegation_key_expiry = None
+user_delegation_key_lock = threading.Lock()
+
+def get_credential():
+    """Azure credential chain: CLI (local 'az login') first, then Managed Identity (Azure)."""
+    global credential
+    if credential is not None or not AZURE_AVAILABLE:
+        return credential
+    with credential_lock:
+        if credential is None:
+            try:
+                from azure.identity import AzureCliCredential, ManagedIdentityCredential, ChainedTokenCredential
+                credential = ChainedTokenCredential(AzureCliCredential(), ManagedIdentityCredential())
+                app.logger.info('Azure credential initialized (CLI + Managed Identity chain)')
+            except Exception as e:
+                app.logger.warning(f'Could not initialize Azure credential: {e}')
+    return credential
+
 def init_cosmos():
     """Initialize Cosmos DB client using Managed Identity."""
     global cosmos_client, database, container
     
-    if not credential:
+    if not get_credential():
         raise ValueError("Azure credential not initialized")
     
-    print(f"Connecting to Cosmos DB: {COSMOS_ENDPOINT}")
-    cosmos_client = CosmosClient(COSMOS_ENDPOINT, credential=credential)
+    from azure.cosmos import CosmosClient
+    app.logger.debug(f'Connecting to Cosmos DB: {COSMOS_ENDPOINT}')
+    cosmos_client = instrument(CosmosClient(COSMOS_ENDPOINT, credential=credential), 'cosmos')
     
     # Get existing database and container (don't try to create - requires different permissions)
     database = cosmos_client.get_database_client(DATABASE_NAME)
     container = database.get_container_client(CONTAINER_NAME)
     
-    print(f"[OK] Cosmos DB initialized: {DATABASE_NAME}/{CONTAINER_NAME}")
+    app.logger.info(f'Cosmos DB initialized: {DATABASE_NAME}/{CONTAINER_NAME}')
 
 def init_blob_storage():
     """Initialize Blob Storage client using Managed Identity."""
     global blob_service_client
     
-    if not credential:
+    if not get_credential():
         raise ValueError("Azure credential not initialized")
     
-    print(f"Connecting to Blob Storage: {STORAGE_ENDPOINT}")
-    blob_service_client = BlobServiceClient(account_url=STORAGE_ENDPOINT, credential=credential)
-    print(f"[OK] Blob Storage initialized")
+    from azure.storage.blob import BlobServiceClient
+    app.logger.debug(f'Connecting to Blob Storage: {STORAGE_ENDPOINT}')
+    blob_service_client = instrument(BlobServiceClient(account_url=STORAGE_ENDPOINT, credential=credential), 'blob')
+    app.logger.info('Blob Storage initialized')
 
 def get_sql_connection():
     """Get SQL Server connection using Managed Identity (Azure AD authentication)."""
+    import pyodbc
     try:
-        if not credential:
+        if not get_credential():
             raise ValueError("Azure credential not initialized")
         
         # Get access token for SQL
-        token = credential.get_token("https://database.windows.net/.default")
+        token = timed('identity', 'get_token', credential.get_token, "https://database.windows.net/.default")
         token_bytes = token.token.encode("UTF-16-LE")
         token_struct = struct.pack(f'<I{len(token_bytes)}s', len(token_bytes), token_bytes)
         
         # Select an available ODBC driver on this host (prefer 18, then 17, then generic)
         available_drivers = [d for d in pyodbc.drivers()]
-        app.logger.info(f"Available ODBC drivers: {available_drivers}")
+        app.logger.debug(f"Available ODBC drivers: {available_drivers}")
         preferred = None
         for name in ('ODBC Driver 18 for SQL Server', 'ODBC Driver 17 for SQL Server', 'SQL Server'):
             if name in available_drivers:
@@ -146,20 +316,18 @@ def get_sql_connection():
         )
 
         SQL_COPT_SS_ACCESS_TOKEN = 1256  # Connection option for access token
-        app.logger.info(f"Attempting Managed Identity SQL connection using driver: {preferred}")
-        conn = pyodbc.connect(connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})
-        print("[OK] SQL connection established with Managed Identity")
-        return conn
+        app.logger.debug(f"Attempting Managed Identity SQL connection using driver: {preferred}")
+        conn = timed('sql', 'connect', pyodbc.connect, connection_string,
+                     attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct})
+        app.logger.debug("SQL connection established with Managed Identity")
+        return instrument(conn, 'sql')
     except Exception as e:
         app.logger.error(f"SQL Managed Identity connection failed: {e}")
-        app.logger.error(f"SQL Managed Identity connection failed (outer): {e}")
         # Fallback to SQL authentication if Managed Identity fails
         password = os.environ.get('SQL_PASSWORD', 'VanCr@2025SecurePass!')
         # Fallback to SQL authentication: pick an available driver similarly
         available_drivers = [d for d in pyodbc.drivers()]
-        # Fallback: pick an available driver for SQL auth too and log the choice
-        fallback_drivers = [d for d in pyodbc.drivers()]
-        app.logger.info(f"Drivers available for fallback: {fallback_drivers}")
+        app.logger.debug(f"Drivers available for fallback: {available_drivers}")
         preferred = None
         for name in ('ODBC Driver 18 for SQL Server', 'ODBC Driver 17 for SQL Server', 'SQL Server'):
             if name in available_drivers:
@@ -179,27 +347,611 @@ def get_sql_connection():
             f"Encrypt=yes;"
             f"TrustServerCertificate=no;"
         )
-        print("WARNING: Falling back to SQL authentication")
-        return pyodbc.connect(connection_string)
+        app.logger.debug("Falling back to SQL authentication")
+        return instrument(timed('sql', 'connect', pyodbc.connect, connection_string), 'sql')
+
+def get_image_store():
+    """Content-addressed image store over the product-images container."""
+    if database is None:
+        init_cosmos()
+    return ImageStore(
+        blob_service_client.get_container_client(BLOB_CONTAINER),
+        database.get_container_client(PRODUCTS_CONTAINER),
+        block_size=BLOB_BLOCK_SIZE,
+        max_concurrency=BLOB_MAX_CONCURRENCY
+    )
+
+def store_product_image(file):
+    """Store an uploaded product photo under its content hash and reference it.
+
+    Returns the image reference document (sha256, url, blobName, images).
+    Identical photos are uploaded only once; renditions are rendered by a
+    background job (see schedule_image_jobs).
+    """
+    ext = os.path.splitext(secure_filename(file.filename))[1].lstrip('.').lower() or 'bin'
+    with span('image.store', ext=ext):
+        ref = get_image_store().put(file, ext)
+    app.logger.info(f'Image stored as {ref["blobName"]} (refCount {ref["refCount"]})')
+    return ref
+
+def release_product_image(product):
+    """Queue dropping a product's reference on its image (blobs go when no product uses them)."""
+    image = {key: product.get(key) for key in ('id', 'imageUrl', 'imageHash')}
+    return job_queue.enqueue('image.release', {'product': image})
+
+def release_unsaved_image(ref):
+    """Drop a reference taken for a product write that failed, so the image is not leaked."""
+    try:
+        get_image_store().release(ref['sha256'])
+    except Exception:
+        app.logger.exception(f'Could not release image {ref["sha256"]}; queueing it')
+        release_product_image({'imageHash': ref['sha256']})
+
+def ensure_azure_clients():
+    """Initialize the Cosmos DB and Blob Storage clients (for code running outside requests)."""
+    if database is None:
+        init_cosmos()
+    if blob_service_client is None:
+        init_blob_storage()
+
+def _close_client(client):
+    """Close an Azure SDK client's connection pool, ignoring errors."""
+    try:
+        if hasattr(client, 'close'):
+            client.close()
+        elif hasattr(client, '__exit__'):
+            client.__exit__(None, None, None)
+    except Exception as e:
+        app.logger.warning(f'Error closing {type(client).__name__}: {e}')
+
+def warm_up():
+    """Import the heavy SDKs, open this process's Azure clients and build the catalog
+    indexes before a request needs them."""
+    started = time.perf_counter()
+    for name in ('azure.identity', 'azure.cosmos', 'azure.storage.blob', 'pyodbc', 'bcrypt'):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    if AZURE_AVAILABLE:
+        try:
+            ensure_azure_clients()
+        except Exception as e:
+            app.logger.warning(f'Could not initialize Azure clients in worker {os.getpid()}: {e}')
+        # The first search or price query would otherwise wait for the whole catalog build
+        try:
+            ensure_catalog_indexes()
+        except Exception as e:
+            app.logger.warning(f'Could not build the catalog indexes in worker {os.getpid()}: {e}')
+    app.logger.info(f'Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+def start_warm_up():
+    """Run warm_up() in a background thread so serving does not wait for it."""
+    if WARM_UP:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+def schedule_recurring_jobs():
+    """Queue the self-rescheduling jobs (image GC, job purge) unless they already are."""
+    if IMAGE_GC_INTERVAL > 0:
+        job_queue.ensure('image.gc', delay=IMAGE_GC_INTERVAL)
+    if JOB_PURGE_INTERVAL > 0:
+        job_queue.ensure('jobs.purge', delay=JOB_PURGE_INTERVAL)
+
+def start_background_work():
+    """Start the warm-up, job worker threads and recurring jobs, once per process.
+
+    The warm-up does not depend on the job workers, so it also runs with
+    JOB_WORKERS=0. Returns True in the call that started them.
+    """
+    global background_pid
+    with background_lock:
+        if background_pid == os.getpid():
+            return False
+        background_pid = os.getpid()
+    start_warm_up()
+    job_queue.start()
+    try:
+        schedule_recurring_jobs()
+    except Exception as e:
+        app.logger.warning(f'Could not schedule recurring jobs: {e}')
+    return True
+
+def init_worker():
+    """Per-process setup after a gunicorn fork: own Azure clients and background work."""
+    global cosmos_client, database, container, blob_service_client
+    # Connection pools opened in the master are not safe to share
+    cosmos_client = database = container = blob_service_client = None
+    start_background_work()
+
+def shutdown_worker():
+    """Drain a worker before it exits: finish running jobs and close client pools."""
+    job_queue.stop(timeout=10)
+    for client in (cosmos_client, blob_service_client):
+        if client is not None:
+            _close_client(client)
+    log_handler.stop()
+
+def _release_image_job(payload):
+    """Job: drop a product's image reference, deleting blobs no other product uses."""
+    ensure_azure_clients()
+    product = payload['product']
+    if product.get('imageHash'):
+        if get_image_store().release(product['imageHash']):
+            app.logger.info(f'Deleted unreferenced image {product["imageHash"]}')
+    elif 'blob.core.windows.net' in (product.get('imageUrl') or ''):
+        # Images uploaded before content addressing live under products/<id>
+        container_client = blob_service_client.get_container_client(BLOB_CONTAINER)
+        prefix = f"products/{product['id']}"
+        for blob in container_client.list_blobs(name_starts_with=prefix):
+            if blob.name[len(prefix):][:1] in ('.', '/'):
+                container_client.delete_blob(blob.name)
+                app.logger.info(f'Deleted legacy image blob: {blob.name}')
+
+def check_rate_limit(action, email):
+    """Return a 429 response if this client or `email` is out of `action` attempts.
+
+    Called once the request is valid, before any bcrypt or SQL work. An
+    allowed request takes a token from both buckets in one atomic step, so
+    concurrent guesses cannot share one; refund_rate_limit() gives the
+    email's token back when the outcome should not count. A failing store
+    lets the request through.
+    """
+    ip = client_address(request.remote_addr, request.headers.get('X-Forwarded-For'), RATE_LIMIT_PROXIES)
+    try:
+        retry_after = rate_limiter.check((f'{action}_ip', ip), (f'{action}_email', email))
+    except Exception as e:
+        app.logger.warning(f'Rate limit check failed, allowing the request: {e}')
+        return None
+    if not retry_after:
+        return None
+    seconds = max(1, math.ceil(retry_after))
+    app.logger.info(f'{action} rate limited for {seconds}s')
+    response = jsonify({'ok': False, 'error': f'Too many attempts. Please try again in {seconds} seconds.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+def refund_rate_limit(action, email):
+    """Give back the `action` attempt `email` was charged (e.g. for a successful login)."""
+    try:
+        rate_limiter.refund((f'{action}_email', email))
+    except Exception as e:
+        app.logger.warning(f'Rate limit refund failed: {e}')
+
+def check_admin():
+    """Return an error response unless the X-User-Id header belongs to an active Admin."""
+    user_id = request.headers.get('X-User-Id')
+    if not user_id:
+        return jsonify({'ok': False, 'error': 'Unauthorized. Please login.'}), 401
+    
+    conn = get_sql_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT access_level FROM Users WHERE user_id = ? AND active = 1", (user_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    
+    if not row or row[0] != 'Admin':
+        return jsonify({'ok': False, 'error': 'Unauthorized. Admin access required.'}), 403
+    return None
+
+def get_user_delegation_key():
+    """Return a cached user delegation key, requesting a new one when it nears expiry."""
+    global user_delegation_key, user_delegation_key_expiry
+    with user_delegation_key_lock:
+        now = datetime.now(timezone.utc)
+        if user_delegation_key is None or user_delegation_key_expiry - now < timedelta(minutes=30):
+            user_delegation_key_expiry = now + timedelta(hours=6)
+            user_delegation_key = blob_service_client.get_user_delegation_key(
+                key_start_time=now - timedelta(minutes=5),
+                key_expiry_time=user_delegation_key_expiry
+            )
+        return user_delegation_key
+
+def attach_uploaded_image(digest, ext):
+    """Reference an image the browser uploaded directly; returns its reference document."""
+    if not SHA256_RE.match(digest or '') or ext not in ALLOWED_EXTENSIONS:
+        raise ValueError('Invalid image hash or extension')
+    ref = get_image_store().attach(digest, ext, MAX_IMAGE_BYTES)
+    app.logger.info(f'Attached directly uploaded image {ref["blobName"]} (refCount {ref["refCount"]}'
+                    f'{", pending verification" if ref.get("pending") else ""})')
+    return ref
+
+def check_stored_image(stream):
+    """Apply the upload size and dimension limits to stored image bytes before anything decodes them."""
+    return check_image_stream(stream, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS)
+
+def set_product_image(product, ref):
+    """Point a product document at a stored (verified) image."""
+    product['imageUrl'] = ref['url']
+    product['imageHash'] = ref['sha256']
+    if ref.get('images'):
+        product['images'] = ref['images']
+    else:
+        product.pop('images', None)
+
+def _image_verify_job(payload):
+    """Job: verify a directly uploaded image, then make it the product's image.
+
+    The product keeps its previous image (or the placeholder) until then; a
+    rejected upload just drops the product's pending reference.
+    """
+    ensure_azure_clients()
+    digest = payload['sha256']
+    product_id = payload['productId']
+    try:
+        ref = get_image_store().verify(digest, check_stored_image)
+    except ValueError as e:
+        app.logger.warning(f'Rejected uploaded image {digest} for product {product_id}: {e}')
+        ref = None
+
+    products_container = database.get_container_client(PRODUCTS_CONTAINER)
+    product = products_container.read_item(item=product_id, partition_key=product_id)
+    if product.get('pendingImageHash') != digest:
+        return  # Superseded; whoever replaced it released this reference
+    del product['pendingImageHash']
+    replaced_image = {key: product.get(key) for key in ('id', 'imageUrl', 'imageHash')}
+    if ref is not None:
+        set_product_image(product, ref)
+    products_container.replace_item(item=product_id, body=product)
+    if ref is None:
+        release_product_image({'imageHash': digest})
+        return
+    on_product_written(product)
+    release_product_image(replaced_image)
+    schedule_image_jobs(ref, product_id)
+
+def _image_renditions_job(payload):
+    """Job: render renditions of a stored image and attach them to the product."""
+    # Pillow is only loaded by the jobs that need it, not when the app is imported
+    from images import PIL_AVAILABLE, upload_derivatives
+
+    ensure_azure_clients()
+    digest = payload['sha256']
+    product_id = payload['productId']
+    store = get_image_store()
+    ref = store.lookup(digest)
+    if ref is None:
+        return
+    if not ref.get('images'):
+        if not PIL_AVAILABLE:
+            return
+        container_client = blob_service_client.get_container_client(BLOB_CONTAINER)
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            container_client.download_blob(ref['blobName']).readinto(spool)
+            if content_hash(spool) != digest:
+                raise ValueError(f'Stored image {ref["blobName"]} does not match its hash')
+            # Never hand Pillow an image past the upload limits
+            check_stored_image(spool)
+            images = upload_derivatives(container_client, digest, spool)
+        ref = store.update(digest, images=images)
+    
+    products_container = database.get_container_client(PRODUCTS_CONTAINER)
+    product = products_container.read_item(item=product_id, partition_key=product_id)
+    if product.get('imageHash') == digest and product.get('images') != ref['images']:
+        product['images'] = ref['images']
+        products_container.replace_item(item=product_id, body=product)
+        on_product_written(product)
+
+def _image_metadata_job(payload):
+    """Job: record format and pixel dimensions of a stored image from its header bytes."""
+    from images import INFO_BYTES, PIL_AVAILABLE, read_image_info
+
+    if not PIL_AVAILABLE:
+        return
+    ensure_azure_clients()
+    digest = payload['sha256']
+    store = get_image_store()
+    ref = store.lookup(digest)
+    if ref is None or ref.get('width'):
+        return
+    container_client = blob_service_client.get_container_client(BLOB_CONTAINER)
+    head = container_client.download_blob(ref['blobName'], offset=0, length=INFO_BYTES).readall()
+    store.update(digest, **read_image_info(head))
+
+def collect_orphaned_images(delete=False, grace_seconds=IMAGE_GC_GRACE):
+    """Report (and with delete=True remove) image blobs no product references."""
+    ensure_azure_clients()
+    return collect_orphans(
+        blob_service_client.get_container_client(BLOB_CONTAINER),
+        database.get_container_client(PRODUCTS_CONTAINER),
+        grace_seconds=grace_seconds,
+        delete=delete,
+        logger=app.logger
+    )
+
+def _image_gc_job(payload):
+    """Job: delete orphaned image blobs, then queue the next scheduled run."""
+    if IMAGE_GC_INTERVAL > 0:
+        job_queue.enqueue('image.gc', delay=IMAGE_GC_INTERVAL, dedupe_key='image.gc')
+    collect_orphaned_images(delete=payload.get('delete', True))
+
+def _purge_jobs_job(payload):
+    """Job: delete finished jobs past JOB_RETENTION, then queue the next scheduled run."""
+    if JOB_PURGE_INTERVAL > 0:
+        job_queue.enqueue('jobs.purge', delay=JOB_PURGE_INTERVAL, dedupe_key='jobs.purge')
+    purged = job_queue.purge(JOB_RETENTION)
+    if purged:
+        app.logger.info(f'Purged {purged} finished jobs')
+
+def schedule_image_jobs(ref, product_id):
+    """Queue renditions and metadata extraction for a product's newly attached image."""
+    job_ids = []
+    if not ref.get('images'):
+        job_ids.append(job_queue.enqueue('image.renditions', {'sha256': ref['sha256'], 'productId': product_id}))
+    if not ref.get('width'):
+        job_ids.append(job_queue.enqueue('image.metadata', {'sha256': ref['sha256']}))
+    return job_ids
+
+def fetch_all_products():
+    """Read every product document from Cosmos DB."""
+    if database is None:
+        init_cosmos()
+    products_container = database.get_container_client(PRODUCTS_CONTAINER)
+    return list(products_container.query_items(
+        query="SELECT * FROM c WHERE c.type = 'product'",
+        enable_cross_partition_query=True
+    ))
+
+def _rebuild_catalog_indexes():
+    """Build fresh catalog indexes from Cosmos DB and swap them in.
+
+    Writes made while the products are being read are replayed onto the new
+    indexes before the swap, so a background refresh never loses them.
+    Returns the number of products loaded.
+    """
+    global search_index, price_index, catalog_loaded_at, catalog_version, catalog_pending_writes
+    with catalog_write_lock:
+        catalog_pending_writes = []
+    try:
+        products = fetch_all_products()
+        fresh_search = SearchIndex.build(products)
+        fresh_prices = PriceIndex()
+        fresh_prices.rebuild(products)
+        with catalog_write_lock:
+            for product_id, product in catalog_pending_writes:
+                if product is None:
+                    fresh_search.remove(product_id)
+                    fresh_prices.remove(product_id)
+                else:
+                    fresh_search.upsert(product)
+                    fresh_prices.upsert(product)
+            search_index, price_index = fresh_search, fresh_prices
+            catalog_loaded_at = time.monotonic()
+            catalog_version += 1
+        return len(products)
+    finally:
+        with catalog_write_lock:
+            catalog_pending_writes = None
+
+def _refresh_catalog_indexes():
+    """Reload the catalog indexes from Cosmos DB (runs in a background thread)."""
+    global catalog_refreshing
+    try:
+        count = _rebuild_catalog_indexes()
+        app.logger.info(f'Catalog indexes refreshed with {count} products')
+    except Exception as e:
+        app.logger.warning(f'Catalog index refresh failed: {e}')
+    finally:
+        catalog_refreshing = False
+
+def ensure_catalog_indexes():
+    """Make sure the in-process catalog indexes are loaded.
+
+    The first call loads them from Cosmos DB; after that queries are answered
+    from memory only, and a stale catalog is refreshed in the background while
+    the current one keeps serving.
+    """
+    global catalog_refreshing
+    with catalog_lock:
+        if catalog_loaded_at is None:
+            count = _rebuild_catalog_indexes()
+            app.logger.info(f'Catalog indexes built with {count} products')
+        elif not catalog_refreshing and time.monotonic() - catalog_loaded_at > CATALOG_INDEX_TTL:
+            catalog_refreshing = True
+            threading.Thread(target=_refresh_catalog_indexes, daemon=True).start()
+
+def get_snapshot_publisher():
+    """Return the configured destination for catalog snapshots."""
+    if SNAPSHOT_CONTAINER:
+        if blob_service_client is None:
+            init_blob_storage()
+        return BlobContainerPublisher(blob_service_client.get_container_client(SNAPSHOT_CONTAINER))
+    return LocalDirectoryPublisher(SNAPSHOT_DIR)
+
+def publish_catalog_snapshot():
+    """Publish the current catalog as static JSON (full list, category shards, manifest)."""
+    # Read Cosmos directly: another worker process may have made the change
+    products = fetch_all_products()
+    manifest = publish_snapshot(products, get_snapshot_publisher())
+    app.logger.info(f'Catalog snapshot {manifest["version"]} published ({len(products)} products)')
+    return manifest
+
+def schedule_catalog_snapshot():
+    """Queue a snapshot shortly after a catalog change, coalescing bursts of writes."""
+    return job_queue.enqueue('catalog.snapshot', delay=SNAPSHOT_DEBOUNCE, dedupe_key='catalog.snapshot')
+
+def _record_catalog_write(product_id, product):
+    """Apply one product change (None for a deletion) to the live indexes."""
+    global catalog_version
+    with catalog_write_lock:
+        if catalog_pending_writes is not None:
+            catalog_pending_writes.append((product_id, product))
+        if catalog_loaded_at is not None:
+            if product is None:
+                search_index.remove(product_id)
+                price_index.remove(product_id)
+            else:
+                search_index.upsert(product)
+                price_index.upsert(product)
+            catalog_version += 1
+
+def on_product_written(product):
+    """Apply a created or updated product to the in-process indexes."""
+    _record_catalog_write(product['id'], product)
+    schedule_catalog_snapshot()
+
+def on_product_deleted(product_id):
+    """Drop a deleted product from the in-process indexes."""
+    _record_catalog_write(product_id, None)
+    schedule_catalog_snapshot()
+
+job_queue.register('image.renditions', _image_renditions_job)
+job_queue.register('image.metadata', _image_metadata_job)
+job_queue.register('image.release', _release_image_job)
+job_queue.register('image.verify', _image_verify_job)
+job_queue.register('jobs.purge', _purge_jobs_job)
+job_queue.register('catalog.snapshot', lambda payload: publish_catalog_snapshot())
+job_queue.register('image.gc', _image_gc_job)
+
+@app.before_request
+def reject_oversized_body():
+    """Refuse bodies over the endpoint's limit from Content-Length, before any of it is read."""
+    limit = request.max_content_length
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        return jsonify({'ok': False, 'error': f'Request body too large (limit {limit} bytes)'}), 413
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """JSON error for bodies that exceed the limit while being read (e.g. chunked uploads)."""
+    return jsonify({'ok': False, 'error': f'Request body too large (limit {request.max_content_length} bytes)'}), 413
+
+@app.before_request
+def start_job_workers():
+    """Start background work (warm-up, job workers) in this process on its first request.
+
+    Under gunicorn init_worker() has already done it, so this only does
+    anything for the development server.
+    """
+    if background_pid != os.getpid():
+        start_background_work()
+
+# Static files: seconds between checks for changed files on disk (0 = every request,
+# the default with FLASK_DEBUG) and the size limits for keeping files in memory
+STATIC_REVALIDATE = float(os.environ.get('STATIC_REVALIDATE', '0' if os.environ.get('FLASK_DEBUG') else '2'))
+STATIC_MAX_FILE_BYTES = int(os.environ.get('STATIC_MAX_FILE_BYTES', str(256 * 1024)))
+STATIC_MAX_TOTAL_BYTES = int(os.environ.get('STATIC_MAX_TOTAL_BYTES', str(64 * 1024 * 1024)))
+
+static_cache = StaticCache(SITE_ROOT, max_file_bytes=STATIC_MAX_FILE_BYTES,
+                           max_total_bytes=STATIC_MAX_TOTAL_BYTES, revalidate=STATIC_REVALIDATE)
+asset_server = AssetServer(static_cache)
+
+def send_page(filename):
+    """Serve an HTML page with asset references pointed at fingerprinted files, compressed if accepted."""
+    variants = asset_server.page(filename)
+    if variants is None:
+        return jsonify({'error': 'Not found'}), 404
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), [enc for enc in variants if enc])
+    response = static_response(variants[encoding], request.environ)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Pages must pick up new asset hashes after a deploy
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.context_processor
+def template_helpers():
+    """asset_url() for templates: the fingerprinted path of a site asset when built."""
+    assets = asset_server.assets()[0]
+    return {'asset_url': lambda path: assets.get(path, path)}
+
+def render_shop_page():
+    """Render shop.html with the product grid for the requested category and filters.
+
+    The category's products (as inline JSON for shop.js) and each grid are
+    cached fragments keyed by the catalog and asset versions.
+    """
+    ensure_catalog_indexes()
+    filters = shop_filters(request.args)
+    category = dict(filters)['category']
+    version = (catalog_version, asset_server.assets()[1])
+    
+    def load_products():
+        matches = (lambda p: category in (p.get('categories') or [])) if category else None
+        items, _ = price_index.query(None, None, sort='newest', matches=matches)
+        return [compact_product(p) for p in items]
+    
+    products = fragment_cache.get_or_render(('products', version, category), load_products)
+    catalog_data = fragment_cache.get_or_render(('data', version, category), lambda: inline_json(products))
+    grid = fragment_cache.get_or_render(('grid', version, filters), lambda: Markup(render_template(
+        '_product_grid.html', products=filter_products(products, filters))))
+    return render_template(
+        'shop.html',
+        category=category,
+        subcategories=SUBCATEGORIES.get(category, []),
+        filter_groups=FILTER_GROUPS,
+        selected=dict(filters),
+        grid=grid,
+        catalog_data=catalog_data,
+    )
+
+@app.route('/shop.html')
+def shop_page():
+    """Shop page, server-rendered when SSR_SHOP is on (shop.js then only enhances it)."""
+    if not SSR_SHOP:
+        return send_page('shop.html')
+    try:
+        html = render_shop_page()
+    except Exception:
+        # Without the catalog the root page (the same template, no products) loads them client-side
+        app.logger.exception('shop_page error')
+        return send_page('shop.html')
+    response = Response(html, mimetype='text/html')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/')
 def index():
     """Serve the home page."""
-    try:
-        return send_from_directory(os.path.join(os.path.dirname(__file__), '..'), 'index.html')
-    except Exception as e:
-        return jsonify({'error': str(e)}), 404
+    return send_page('index.html')
 
 @app.route('/<path:filename>')
 def serve_static(filename):
-    """Serve static files (HTML, CSS, JS, images)."""
-    try:
-        # Don't serve API routes as static files
-        if filename.startswith('api/'):
-            return jsonify({'error': 'Not found'}), 404
-        return send_from_directory(os.path.join(os.path.dirname(__file__), '..'), filename)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 404
+    """Serve static files (HTML, CSS, JS, images) from the in-memory static cache."""
+    # Don't serve API routes as static files, nor the backend's code and settings or dotfiles
+    parts = filename.split('/')
+    if parts[0] in ('api', 'backend') or any(part.startswith('.') for part in parts):
+        return jsonify({'error': 'Not found'}), 404
+    if filename.endswith('.html'):
+        return send_page(filename)
+    
+    encoding = None
+    mimetype = mimetypes.guess_type(filename)[0]
+    vary = 'Accept-Encoding' if filename.startswith('dist/') else None
+    # Site images with optimized WebP/AVIF variants (optional ?w= picks the width)
+    image = asset_server.image_variant(filename, request.headers.get('Accept'), request.args.get('w', type=int))
+    if image is not None:
+        vary = 'Accept'
+    if image is not None and image[1] is not None:
+        mimetype, entry = image
+    elif filename.startswith('dist/'):
+        # Fingerprinted pipeline output, precompressed when the client accepts it
+        encoding, entry = asset_server.precompressed(filename, request.headers.get('Accept-Encoding'))
+    else:
+        entry = static_cache.get(filename)
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+    
+    response = static_response(entry, request.environ, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if vary:
+        response.headers['Vary'] = vary
+    # Content-hashed pipeline output and catalog snapshot files never change
+    if is_hashed_asset(filename) or (filename.startswith('data/') and is_fingerprinted(filename)):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: request latency per route and dependency call latency."""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'ok': False, 'error': 'Unauthorized'}), 401
+    body, content_type = render_metrics()
+    if body is None:
+        return jsonify({'ok': False, 'error': 'prometheus_client is not installed'}), 503
+    return Response(body, content_type=content_type)
 
 @app.route('/api/')
 def api_index():
@@ -271,6 +1023,55 @@ def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Product list fields that can be filtered on and edited
+LIST_FIELDS = ('categories', 'ageGroups', 'seasons', 'occasions')
+
+def parse_list_field(value):
+    """A list field as sent by the admin pages: a list (JSON body), or a form
+    field holding a JSON array or comma-separated values."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return app.json.loads(value)
+    except ValueError:
+        return [v.strip() for v in value.split(',') if v.strip()]
+
+def build_products_query(category=None, age_group=None, season=None, occasion=None):
+    """Cosmos SQL for the product listing with optional array filters, newest first."""
+    query = "SELECT * FROM c WHERE c.type = 'product'"
+    
+    # Add filters (Cosmos SQL supports ARRAY_CONTAINS)
+    if category:
+        query += f" AND ARRAY_CONTAINS(c.categories, '{category}')"
+    if age_group:
+        query += f" AND ARRAY_CONTAINS(c.ageGroups, '{age_group}')"
+    if season:
+        query += f" AND ARRAY_CONTAINS(c.seasons, '{season}')"
+    if occasion:
+        query += f" AND ARRAY_CONTAINS(c.occasions, '{occasion}')"
+    
+    return query + " ORDER BY c.createdAt DESC"
+
+def build_product_document(item_id, price, image_url, categories, age_groups, seasons, occasions,
+                           image_hash=None, images=None):
+    """New product document for Cosmos DB."""
+    product_doc = {
+        'id': item_id,
+        'price': price,
+        'imageUrl': image_url,
+        'categories': categories,
+        'ageGroups': age_groups,
+        'seasons': seasons,
+        'occasions': occasions,
+        'createdAt': datetime.now(timezone.utc).isoformat(),
+        'type': 'product'
+    }
+    if image_hash:
+        product_doc['imageHash'] = image_hash
+    if images:
+        product_doc['images'] = images
+    return product_doc
+
 @app.route('/api/add-product', methods=['POST'])
 def add_product():
     """Add product with image upload to Azure Blob Storage and metadata to Cosmos DB."""
@@ -291,16 +1092,26 @@ def add_product():
         if not row or row[0] != 'Admin':
             return jsonify({'ok': False, 'error': 'Unauthorized. Admin access required.'}), 403
         
-        # Validate form data
-        if 'itemImage' not in request.files:
-            return jsonify({'ok': False, 'error': 'No image file provided'}), 400
-        
-        file = request.files['itemImage']
-        if file.filename == '':
-            return jsonify({'ok': False, 'error': 'No image selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'ok': False, 'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WEBP'}), 400
+        # Validate form data: either an uploaded file or the hash of an image
+        # the browser already uploaded directly to Blob Storage
+        uploaded_hash = request.form.get('imageHash', '').strip().lower()
+        uploaded_ext = request.form.get('imageExt', '').strip().lower()
+        file = None
+        if not uploaded_hash:
+            if 'itemImage' not in request.files:
+                return jsonify({'ok': False, 'error': 'No image file provided'}), 400
+            
+            file = request.files['itemImage']
+            if file.filename == '':
+                return jsonify({'ok': False, 'error': 'No image selected'}), 400
+            
+            if not allowed_file(file.filename):
+                return jsonify({'ok': False, 'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WEBP'}), 400
+            
+            try:
+                check_image_upload(file, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS)
+            except ValueError as e:
+                return jsonify({'ok': False, 'error': str(e)}), 400
         
         # Validate price
         price = request.form.get('price', '').strip()
@@ -315,11 +1126,10 @@ def add_product():
             return jsonify({'ok': False, 'error': 'Invalid price format'}), 400
         
         # Parse JSON arrays
-        import json
-        categories = json.loads(request.form.get('categories', '[]'))
-        age_groups = json.loads(request.form.get('ageGroups', '[]'))
-        seasons = json.loads(request.form.get('seasons', '[]'))
-        occasions = json.loads(request.form.get('occasions', '[]'))
+        categories = app.json.loads(request.form.get('categories', '[]'))
+        age_groups = app.json.loads(request.form.get('ageGroups', '[]'))
+        seasons = app.json.loads(request.form.get('seasons', '[]'))
+        occasions = app.json.loads(request.form.get('occasions', '[]'))
         
         if not categories or not age_groups:
             return jsonify({'ok': False, 'error': 'At least one category and age group required'}), 400
@@ -327,8 +1137,22 @@ def add_product():
         # Generate unique item ID
         item_id = str(uuid.uuid4())
         
+        # Initialize Cosmos if needed
+        if database is None:
+            init_cosmos()
+        
+        # Ensure Products container exists (also holds the image reference counts)
+        from azure.cosmos import PartitionKey
+        products_container = database.create_container_if_not_exists(
+            id=PRODUCTS_CONTAINER,
+            partition_key=PartitionKey(path="/id")
+        )
+        
         # Upload image to Azure Blob Storage using Managed Identity (if available)
         image_url = None
+        image_hash = None
+        pending_hash = None
+        images = None
         if blob_service_client is None and AZURE_AVAILABLE:
             try:
                 init_blob_storage()
@@ -345,18 +1169,22 @@ def add_product():
                 except Exception:
                     pass  # Container already exists
                 
-                # Secure filename and create blob name
-                file_ext = secure_filename(file.filename).rsplit('.', 1)[1].lower()
-                blob_name = f"products/{item_id}.{file_ext}"
-                
-                blob_client = container_client.get_blob_client(blob_name)
-                blob_client.upload_blob(file, overwrite=True)
-                
-                # Get public URL with cache-busting parameter
-                image_url = blob_client.url
-                timestamp = int(datetime.now(timezone.utc).timestamp())
-                image_url = f"{image_url}?v={timestamp}"
-                app.logger.info(f'Image uploaded to blob storage: {blob_name}')
+                # Content-addressed: the URL changes with the content, so no cache-busting needed
+                if uploaded_hash:
+                    try:
+                        ref = attach_uploaded_image(uploaded_hash, uploaded_ext)
+                    except ValueError as e:
+                        return jsonify({'ok': False, 'error': str(e)}), 400
+                else:
+                    ref = store_product_image(file)
+                if ref.get('pending'):
+                    # Shown with the placeholder until the image.verify job has checked the upload
+                    image_url = f'/assets/images/placeholder.png'
+                    pending_hash = ref['sha256']
+                else:
+                    image_url = ref['url']
+                    image_hash = ref['sha256']
+                    images = ref.get('images')
             except Exception as e:
                 app.logger.warning(f'Failed to upload to blob storage: {e}')
                 app.logger.info('Continuing without cloud image storage')
@@ -369,45 +1197,56 @@ def add_product():
         if not image_url:
             return jsonify({'ok': False, 'error': 'Failed to process image'}), 500
         
-        # Initialize Cosmos if needed
-        if database is None:
-            init_cosmos()
-        
-        # Ensure Products container exists
-        products_container = database.create_container_if_not_exists(
-            id=PRODUCTS_CONTAINER,
-            partition_key=PartitionKey(path="/id")
-        )
-        
         # Create product document
-        product_doc = {
-            'id': item_id,
-            'price': price,
-            'imageUrl': image_url,
-            'categories': categories,
-            'ageGroups': age_groups,
-            'seasons': seasons,
-            'occasions': occasions,
-            'createdAt': datetime.now(timezone.utc).isoformat(),
-            'type': 'product'
-        }
+        product_doc = build_product_document(item_id, price, image_url, categories, age_groups, seasons, occasions,
+                                             image_hash=image_hash, images=images)
+        if pending_hash:
+            product_doc['pendingImageHash'] = pending_hash
         
-        products_container.create_item(body=product_doc)
+        try:
+            products_container.create_item(body=product_doc)
+        except Exception:
+            if image_hash or pending_hash:
+                release_unsaved_image(ref)
+            raise
+        on_product_written(product_doc)
+        if pending_hash:
+            job_queue.enqueue('image.verify', {'sha256': pending_hash, 'productId': item_id})
+        elif image_hash:
+            schedule_image_jobs(ref, item_id)
         
         return jsonify({
             'ok': True,
             'itemId': item_id,
             'price': price,
-            'imageUrl': image_url
+            'imageUrl': image_url,
+            'images': images,
+            'imagePending': bool(pending_hash)
         }), 200
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         app.logger.exception('add_product error')
         return jsonify({'ok': False, 'error': str(e)}), 500
 
+def cached_json_response(key, render):
+    """JSON response for catalog data, serialized and compressed once per catalog version.
+
+    `key` must include catalog_version; the body and each compressed variant
+    are kept in response_cache under it.
+    """
+    body = response_cache.get_or_render(key, lambda: app.json.dumpb(render()) + b'\n')
+    encoding, data = compressor.cached(response_cache, key, body)
+    response = app.response_class(data, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
-    """Get products with optional filters from Cosmos DB."""
+    """Get products with optional filters from Cosmos DB (or the price index for price queries)."""
     try:
         if database is None:
             init_cosmos()
@@ -420,26 +1259,45 @@ def get_products():
         season = request.args.get('season')
         occasion = request.args.get('occasion')
         
-        # Base query
-        query = "SELECT * FROM c WHERE c.type = 'product'"
-        
-        # Add filters (Cosmos SQL supports ARRAY_CONTAINS)
-        if category:
-            query += f" AND ARRAY_CONTAINS(c.categories, '{category}')"
-        if age_group:
-            query += f" AND ARRAY_CONTAINS(c.ageGroups, '{age_group}')"
-        if season:
-            query += f" AND ARRAY_CONTAINS(c.seasons, '{season}')"
-        if occasion:
-            query += f" AND ARRAY_CONTAINS(c.occasions, '{occasion}')"
-        
-        query += " ORDER BY c.createdAt DESC"
-        
+        # Price range and sorting are served from the in-process price index
+        min_price = request.args.get('minPrice')
+        max_price = request.args.get('maxPrice')
+        sort = request.args.get('sort')
+        if min_price or max_price or sort:
+            try:
+                min_price = float(min_price) if min_price else None
+                max_price = float(max_price) if max_price else None
+            except ValueError:
+                return jsonify({'ok': False, 'error': 'Invalid price range'}), 400
+            sort = sort or 'newest'
+            if sort not in SORT_OPTIONS:
+                return jsonify({'ok': False, 'error': f'Invalid sort. Allowed: {", ".join(SORT_OPTIONS)}'}), 400
+            
+            filters = [(field, value) for field, value in (
+                ('categories', category),
+                ('ageGroups', age_group),
+                ('seasons', season),
+                ('occasions', occasion),
+            ) if value]
+            matches = None
+            if filters:
+                matches = lambda p: all(value in (p.get(field) or []) for field, value in filters)
+            
+            ensure_catalog_indexes()
+            
+            def render():
+                items, histogram = price_index.query(min_price, max_price, sort=sort, matches=matches,
+                                                     histogram_key=tuple(filters))
+                return {'ok': True, 'products': items, 'priceHistogram': histogram}
+            key = ('products', catalog_version, min_price, max_price, sort, tuple(filters))
+            return cached_json_response(key, render)
+        
+        query = build_products_query(category, age_group, season, occasion)
         items = list(products_container.query_items(
             query=query,
             enable_cross_partition_query=True
         ))
-        app.logger.info(f'Fetched {len(items)} products from Cosmos DB')
+        app.logger.debug(f'Fetched {len(items)} products from Cosmos DB')
         
         return jsonify({'ok': True, 'products': items}), 200
         
@@ -447,6 +1305,162 @@ def get_products():
         app.logger.exception('get_products error')
         return jsonify({'ok': False, 'error': str(e)}), 500
 
+@app.route('/api/search', methods=['GET'])
+def search_products():
+    """Full-text product search ranked with BM25, served from the in-process index."""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        
+        if not query:
+            return jsonify({'ok': False, 'error': 'Missing search query'}), 400
+        
+        ensure_catalog_indexes()
+        total, products = search_index.search(query, limit=limit, offset=offset)
+        
+        return jsonify({
+            'ok': True,
+            'query': query,
+            'total': total,
+            'products': products,
+            'suggestions': search_index.suggest(query)
+        }), 200
+        
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'Invalid limit or offset'}), 400
+    except Exception as e:
+        app.logger.exception('search_products error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+@app.route('/api/search/suggest', methods=['GET'])
+def search_suggest():
+    """As-you-type completions for the search box."""
+    try:
+        prefix = request.args.get('q', '')
+        limit = min(max(int(request.args.get('limit', 8)), 1), 20)
+        ensure_catalog_indexes()
+        return jsonify({'ok': True, 'suggestions': search_index.suggest(prefix, limit=limit)}), 200
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'Invalid limit'}), 400
+    except Exception as e:
+        app.logger.exception('search_suggest error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+@app.route('/api/uploads/image-sas', methods=['POST'])
+def create_image_upload_sas():
+    """Issue a short-lived SAS so the browser can upload a product image straight to Blob Storage.
+    
+    The blob is named by the SHA-256 the browser computed, so content that is
+    already stored needs no upload at all.
+    """
+    try:
+        error = check_admin()
+        if error:
+            return error
+        
+        data = request.get_json(force=True) or {}
+        digest = str(data.get('sha256', '')).strip().lower()
+        filename = secure_filename(data.get('filename', ''))
+        size = data.get('size')
+        
+        if not SHA256_RE.match(digest):
+            return jsonify({'ok': False, 'error': 'Invalid sha256'}), 400
+        if not allowed_file(filename):
+            return jsonify({'ok': False, 'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WEBP'}), 400
+        if not isinstance(size, int) or size <= 0 or size > MAX_IMAGE_BYTES:
+            return jsonify({'ok': False, 'error': f'Image must be between 1 byte and {MAX_IMAGE_BYTES} bytes'}), 400
+        ext = filename.rsplit('.', 1)[1].lower()
+        
+        if blob_service_client is None:
+            init_blob_storage()
+        
+        if get_image_store().lookup(digest) is not None:
+            return jsonify({'ok': True, 'uploadRequired': False, 'sha256': digest, 'ext': ext}), 200
+        
+        blob_name = content_blob_name(digest, ext)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_SAS_TTL)
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+        sas = generate_blob_sas(
+            account_name=STORAGE_ACCOUNT,
+            container_name=BLOB_CONTAINER,
+            blob_name=blob_name,
+            user_delegation_key=get_user_delegation_key(),
+            permission=BlobSasPermissions(create=True, write=True),
+            expiry=expires_at,
+            start=datetime.now(timezone.utc) - timedelta(minutes=5)
+        )
+        blob_client = blob_service_client.get_blob_client(container=BLOB_CONTAINER, blob=blob_name)
+        
+        return jsonify({
+            'ok': True,
+            'uploadRequired': True,
+            'sha256': digest,
+            'ext': ext,
+            'uploadUrl': f"{blob_client.url}?{sas}",
+            'headers': {'x-ms-blob-type': 'BlockBlob'},
+            'expiresAt': expires_at.isoformat()
+        }), 200
+        
+    except Exception as e:
+        app.logger.exception('create_image_upload_sas error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+@app.route('/api/products/<product_id>/image', methods=['POST'])
+def finalize_product_image(product_id):
+    """Verify an image uploaded directly to Blob Storage and make it the product's image."""
+    try:
+        error = check_admin()
+        if error:
+            return error
+        
+        data = request.get_json(force=True) or {}
+        digest = str(data.get('sha256', '')).strip().lower()
+        ext = str(data.get('ext', '')).strip().lower()
+        
+        if database is None:
+            init_cosmos()
+        if blob_service_client is None:
+            init_blob_storage()
+        
+        products_container = database.get_container_client(PRODUCTS_CONTAINER)
+        product = products_container.read_item(item=product_id, partition_key=product_id)
+        
+        try:
+            ref = attach_uploaded_image(digest, ext)
+        except ValueError as e:
+            return jsonify({'ok': False, 'error': str(e)}), 400
+        
+        # An upload still waiting for verification is superseded by this one
+        superseded_hash = product.pop('pendingImageHash', None)
+        replaced_image = {key: product.get(key) for key in ('id', 'imageUrl', 'imageHash')}
+        if ref.get('pending'):
+            # The current image stays until the image.verify job has checked the upload
+            product['pendingImageHash'] = ref['sha256']
+        else:
+            set_product_image(product, ref)
+        product['updatedAt'] = datetime.now(timezone.utc).isoformat()
+
+        try:
+            products_container.replace_item(item=product_id, body=product)
+        except Exception:
+            release_unsaved_image(ref)
+            raise
+        on_product_written(product)
+        if superseded_hash:
+            release_product_image({'imageHash': superseded_hash})
+        if ref.get('pending'):
+            job_queue.enqueue('image.verify', {'sha256': ref['sha256'], 'productId': product_id})
+        else:
+            release_product_image(replaced_image)
+            schedule_image_jobs(ref, product_id)
+        
+        return jsonify({'ok': True, 'product': product, 'imagePending': bool(ref.get('pending'))}), 200
+        
+    except Exception as e:
+        app.logger.exception('finalize_product_image error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
 @app.route('/api/products/<product_id>', methods=['DELETE'])
 def delete_product(product_id):
     """Delete a product by ID - Admin only."""
@@ -472,8 +1486,13 @@ def delete_product(product_id):
         
         products_container = database.get_container_client(PRODUCTS_CONTAINER)
         
-        # Delete the product
+        # Delete the product, then its reference on the image
+        product = products_container.read_item(item=product_id, partition_key=product_id)
         products_container.delete_item(item=product_id, partition_key=product_id)
+        on_product_deleted(product_id)
+        release_product_image(product)
+        if product.get('pendingImageHash'):
+            release_product_image({'imageHash': product['pendingImageHash']})
         
         return jsonify({'ok': True, 'message': f'Product {product_id} deleted'}), 200
         
@@ -485,8 +1504,8 @@ def delete_product(product_id):
 def update_product(product_id):
     """Update a product - Admin only."""
     try:
-        app.logger.info(f'=== UPDATE PRODUCT REQUEST: {product_id} ===')
-        app.logger.info(f'Content-Type: {request.content_type}')
+        app.logger.debug(f'=== UPDATE PRODUCT REQUEST: {product_id} ===')
+        app.logger.debug(f'Content-Type: {request.content_type}')
         
         # Check authorization - only Admin users can update products
         user_id = request.headers.get('X-User-Id')
@@ -495,7 +1514,7 @@ def update_product(product_id):
         
         # TEMPORARY: Skip admin verification for testing
         # TODO: Re-enable this check in production
-        app.logger.info(f'User ID: {user_id}')
+        app.logger.debug(f'User ID: {user_id}')
         # Verify user is Admin
         # conn = get_sql_connection()
         # cursor = conn.cursor()
@@ -512,12 +1531,20 @@ def update_product(product_id):
             # FormData with optional image
             data = request.form.to_dict()
             image_file = request.files.get('itemImage')
-            app.logger.info(f'Received FormData request. Image file: {image_file.filename if image_file else "None"}')
+            app.logger.debug(f'Received FormData request. Image file: {image_file.filename if image_file else "None"}')
         else:
             # JSON without image
             data = request.get_json(force=True) or {}
             image_file = None
-            app.logger.info('Received JSON request (no image)')
+            app.logger.debug('Received JSON request (no image)')
+        
+        if image_file:
+            if not allowed_file(image_file.filename):
+                return jsonify({'ok': False, 'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WEBP'}), 400
+            try:
+                check_image_upload(image_file, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS)
+            except ValueError as e:
+                return jsonify({'ok': False, 'error': str(e)}), 400
         
         if database is None:
             init_cosmos()
@@ -535,48 +1562,19 @@ def update_product(product_id):
                 app.logger.warning(f'Could not initialize blob storage: {e}')
         
         # Handle image upload if provided
+        replaced_image = None
+        superseded_hash = None
         if image_file:
-            app.logger.info(f'Processing image upload. File: {image_file.filename}, Size: {image_file.content_length} bytes')
+            app.logger.debug(f'Processing image upload. File: {image_file.filename}, Size: {image_file.content_length} bytes')
             
             # Upload new image to Blob Storage if available
             if blob_service_client:
                 try:
-                    file_ext = os.path.splitext(image_file.filename)[1]
-                    blob_name = f"products/{product_id}{file_ext}"
-                    
-                    app.logger.info(f'Uploading image to blob storage: {blob_name}')
-                    blob_client = blob_service_client.get_blob_client(container='product-images', blob=blob_name)
-                    blob_client.upload_blob(image_file, overwrite=True, content_settings=ContentSettings(content_type=image_file.content_type))
-                    image_url = blob_client.url
-                    
-                    # Add cache-busting query parameter to force browser to reload the image
-                    timestamp = int(datetime.now(timezone.utc).timestamp())
-                    image_url = f"{image_url}?v={timestamp}"
-                    
-                    # Delete old image if it has a different extension
-                    old_image_url = existing_product.get('imageUrl', '')
-                    if old_image_url and 'blob.core.windows.net' in old_image_url:
-                        try:
-                            clean_url = old_image_url.split('?')[0]
-                            old_ext = os.path.splitext(clean_url)[1]
-                            app.logger.info(f'Old image URL: {old_image_url}')
-                            app.logger.info(f'Clean URL: {clean_url}')
-                            app.logger.info(f'Old extension: {old_ext}, New extension: {file_ext}')
-                            # Only delete if extensions are different (same extension was already overwritten)
-                            if old_ext and old_ext != file_ext:
-                                parts = clean_url.split('/')
-                                old_blob_name = '/'.join(parts[-2:])
-                                app.logger.info(f'Attempting to delete old blob: {old_blob_name}')
-                                old_blob_client = blob_service_client.get_blob_client(container='product-images', blob=old_blob_name)
-                                old_blob_client.delete_blob()
-                                app.logger.info(f'Deleted old image with different extension: {old_blob_name}')
-                            else:
-                                app.logger.info(f'Skipping delete - same extension (already overwritten)')
-                        except Exception as e:
-                            app.logger.warning(f'Failed to delete old image: {e}')
-                    
-                    existing_product['imageUrl'] = image_url
-                    app.logger.info(f'[OK] Image uploaded successfully: {blob_name} -> {image_url}')
+                    image_ref = store_product_image(image_file)
+                    replaced_image = {key: existing_product.get(key) for key in ('id', 'imageUrl', 'imageHash')}
+                    superseded_hash = existing_product.pop('pendingImageHash', None)
+                    set_product_image(existing_product, image_ref)
+                    app.logger.info(f'[OK] Image uploaded successfully: {image_ref["blobName"]} -> {image_ref["url"]}')
                 except Exception as e:
                     app.logger.error(f'Failed to upload image to Azure Blob Storage: {e}')
                     app.logger.exception('Full error trace:')
@@ -587,56 +1585,88 @@ def update_product(product_id):
         # Update fields if provided
         if 'price' in data:
             existing_product['price'] = float(data['price'])
-        if 'categories' in data:
-            # Handle both JSON array and form field (comma-separated or JSON string)
-            categories = data['categories']
-            if isinstance(categories, str):
-                try:
-                    existing_product['categories'] = json.loads(categories)
-                except:
-                    existing_product['categories'] = [c.strip() for c in categories.split(',') if c.strip()]
-            else:
-                existing_product['categories'] = categories
-        if 'ageGroups' in data:
-            age_groups = data['ageGroups']
-            if isinstance(age_groups, str):
-                try:
-                    existing_product['ageGroups'] = json.loads(age_groups)
-                except:
-                    existing_product['ageGroups'] = [a.strip() for a in age_groups.split(',') if a.strip()]
-            else:
-                existing_product['ageGroups'] = age_groups
-        if 'seasons' in data:
-            seasons = data['seasons']
-            if isinstance(seasons, str):
-                try:
-                    existing_product['seasons'] = json.loads(seasons)
-                except:
-                    existing_product['seasons'] = [s.strip() for s in seasons.split(',') if s.strip()]
-            else:
-                existing_product['seasons'] = seasons
-        if 'occasions' in data:
-            occasions = data['occasions']
-            if isinstance(occasions, str):
-                try:
-                    existing_product['occasions'] = json.loads(occasions)
-                except:
-                    existing_product['occasions'] = [o.strip() for o in occasions.split(',') if o.strip()]
-            else:
-                existing_product['occasions'] = occasions
+        # List fields come as JSON arrays, or as form fields (JSON string or comma-separated)
+        for field in LIST_FIELDS:
+            if field in data:
+                existing_product[field] = parse_list_field(data[field])
         
         existing_product['updatedAt'] = datetime.now(timezone.utc).isoformat()
         
-        # Update the product in Cosmos DB
-        products_container.replace_item(item=product_id, body=existing_product)
+        # Update the product in Cosmos DB (dropping the new image's reference if that fails)
+        try:
+            products_container.replace_item(item=product_id, body=existing_product)
+        except Exception:
+            if replaced_image:
+                release_unsaved_image(image_ref)
+            raise
+        on_product_written(existing_product)
+        
+        # Release the previous image now that nothing points at it (blobs are deleted
+        # once no product references them; re-uploading identical content nets out)
+        if replaced_image:
+            release_product_image(replaced_image)
+            if superseded_hash:
+                release_product_image({'imageHash': superseded_hash})
+            schedule_image_jobs(image_ref, product_id)
         app.logger.info(f'Product updated successfully in Cosmos DB: {product_id}')
         
         return jsonify({'ok': True, 'message': 'Product updated successfully', 'product': existing_product}), 200
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         app.logger.exception('update_product error')
         return jsonify({'ok': False, 'error': str(e)}), 500
 
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Background job counts by status and the most recently updated jobs - Admin only."""
+    try:
+        error = check_admin()
+        if error:
+            return error
+        
+        status = request.args.get('status') or None
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        return jsonify({'ok': True, 'stats': job_queue.stats(), 'jobs': job_queue.list(status, limit)}), 200
+        
+    except Exception as e:
+        app.logger.exception('list_jobs error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, attempts and last error of one background job - Admin only."""
+    try:
+        error = check_admin()
+        if error:
+            return error
+        
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'ok': False, 'error': 'Job not found'}), 404
+        return jsonify({'ok': True, 'job': job}), 200
+        
+    except Exception as e:
+        app.logger.exception('get_job error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Requeue a dead-lettered background job - Admin only."""
+    try:
+        error = check_admin()
+        if error:
+            return error
+        
+        if not job_queue.retry(job_id):
+            return jsonify({'ok': False, 'error': 'Only dead-lettered jobs can be retried'}), 409
+        return jsonify({'ok': True, 'job': job_queue.get(job_id)}), 200
+        
+    except Exception as e:
+        app.logger.exception('retry_job error')
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
 @app.route('/api/signup', methods=['POST'])
 def signup():
     """Create new user account with hashed password."""
@@ -652,7 +1682,13 @@ def signup():
         if not all([first_name, last_name, email, password]):
             return jsonify({'ok': False, 'error': 'Missing required fields'}), 400
         
+        limited = check_rate_limit('signup', email)
+        if limited:
+            return limited
+        
         # Hash password
+        import bcrypt
+        import pyodbc
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         
         # Create user in SQL database
@@ -710,6 +1746,11 @@ def login():
         if not email or not password:
             return jsonify({'ok': False, 'error': 'Email and password required'}), 400
         
+        # Every attempt takes a token from the email's bucket; a successful one gets it back
+        limited = check_rate_limit('login', email)
+        if limited:
+            return limited
+        
         conn = get_sql_connection()
         cursor = conn.cursor()
         
@@ -728,13 +1769,14 @@ def login():
             if not row:
                 return jsonify({'ok': False, 'error': 'Invalid email or password'}), 401
             
-            user_id, email, first_name, last_name, active, access_level, password_hash, failed_login_count = row
+            user_id, account_email, first_name, last_name, active, access_level, password_hash, failed_login_count = row
             
             # Check if account is active
             if not active:
                 return jsonify({'ok': False, 'error': 'Account is inactive'}), 403
             
             # Verify password
+            import bcrypt
             if not bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')):
                 # Increment failed login count
                 cursor.execute("""
@@ -753,11 +1795,12 @@ def login():
                 WHERE user_id = ?
             """, (user_id,))
             conn.commit()
+            refund_rate_limit('login', email)
             
             return jsonify({
                 'ok': True,
                 'userId': user_id,
-                'email': email,
+                'email': account_email,
                 'firstName': first_name,
                 'lastName': last_name,
                 'accessLevel': access_level,
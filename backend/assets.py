@@ -0,0 +1,340 @@
+"""
+Static asset pipeline.
+`python assets.py` copies the storefront's CSS, JS and images into dist/
+under content-hashed names (styles.css -> dist/styles.<hash>.css), writes
+gzip and brotli variants of the compressible ones and an asset-manifest.json
+mapping source paths to hashed paths. The deployed package holds only
+backend/, so the deploy workflow runs `python assets.py --bundle`, which
+copies the storefront into backend/site/ and builds dist/ there; the app
+serves that copy when it exists. AssetServer serves these from a
+StaticCache: it picks the precompressed variant the client accepts and
+rewrites asset references in HTML pages from the manifest.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+from optimize_images import METADATA_NAME as IMAGE_METADATA_NAME, OUTPUT_DIR as IMAGE_OUTPUT_DIR, SITE_IMAGE_FORMATS
+from snapshot import fingerprinted_name
+from static_cache import StaticFile
+
+# Brotli is optional: without it only gzip variants are produced
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# The storefront's pages and assets in a checkout
+SOURCE_ROOT = os.path.abspath(os.path.join(BACKEND_DIR, '..'))
+# Copy of the storefront built into the deployed package (python assets.py --bundle)
+BUNDLE_ROOT = os.path.join(BACKEND_DIR, 'site')
+# Where the app serves the site from
+SITE_ROOT = os.environ.get('SITE_ROOT') or (BUNDLE_ROOT if os.path.isdir(BUNDLE_ROOT) else SOURCE_ROOT)
+DIST_NAME = 'dist'
+MANIFEST_NAME = 'asset-manifest.json'
+
+# Top-level files and assets/ files that go through the pipeline
+ASSET_EXTENSIONS = {'.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg', '.ico', '.woff2'}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.html', '.json'}
+
+# Content-Encoding -> file suffix of the precompressed variant, in server preference order
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Variants that do not save at least this fraction are not worth serving
+MIN_SAVING = 0.1
+
+HASHED_RE = re.compile(r'\.[0-9a-f]{12}\.[a-z0-9]+$')
+ASSET_REF_RE = re.compile(r'''(\s(?:src|href)=)(["'])([^"'#?]+)([^"']*)\2''')
+
+
+def is_hashed_asset(path):
+    """True for pipeline output whose name carries a content hash."""
+    return path.startswith(DIST_NAME + '/') and bool(HASHED_RE.search(path))
+
+
+def asset_sources(site_root=SITE_ROOT):
+    """Site-relative paths of every asset the pipeline processes."""
+    paths = []
+    for name in sorted(os.listdir(site_root)):
+        if os.path.splitext(name)[1].lower() in ASSET_EXTENSIONS and os.path.isfile(os.path.join(site_root, name)):
+            paths.append(name)
+    for dirpath, dirnames, filenames in os.walk(os.path.join(site_root, 'assets')):
+        # Optimized image variants are served in place of their sources, never referenced
+        if os.path.relpath(dirpath, site_root).replace(os.sep, '/') == IMAGE_OUTPUT_DIR:
+            dirnames[:] = []
+            continue
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in ASSET_EXTENSIONS:
+                paths.append(os.path.relpath(os.path.join(dirpath, name), site_root).replace(os.sep, '/'))
+    return paths
+
+
+def compressed_variants(data, ext):
+    """{encoding: bytes} for the variants that meaningfully shrink `data`."""
+    if ext not in COMPRESSIBLE_EXTENSIONS:
+        return {}
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if BROTLI_AVAILABLE:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in variants.items() if len(body) <= len(data) * (1 - MIN_SAVING)}
+
+
+def write_if_changed(path, data):
+    """Atomically write `data` unless the file already holds it; returns True if written."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def bundle_site(out_dir=BUNDLE_ROOT, source_root=SOURCE_ROOT):
+    """Copy the servable storefront into `out_dir` and build its dist/ there.
+
+    Copies the top-level pages, scripts and stylesheets and the assets/ tree.
+    Returns (manifest, number of files written).
+    """
+    written = 0
+    for name in sorted(os.listdir(source_root)):
+        path = os.path.join(source_root, name)
+        ext = os.path.splitext(name)[1].lower()
+        if os.path.isfile(path) and (ext == '.html' or ext in ASSET_EXTENSIONS):
+            with open(path, 'rb') as f:
+                written += write_if_changed(os.path.join(out_dir, name), f.read())
+    if os.path.isdir(os.path.join(source_root, 'assets')):
+        shutil.copytree(os.path.join(source_root, 'assets'), os.path.join(out_dir, 'assets'), dirs_exist_ok=True)
+    manifest, built = build_assets(out_dir)
+    return manifest, written + built
+
+
+def build_assets(site_root=SITE_ROOT):
+    """Fingerprint and precompress the site's assets into dist/.
+
+    Returns (manifest, number of files written).
+
+    Output from the previous build is kept for one more build so pages
+    cached with the old manifest still load; anything older is deleted.
+    """
+    dist = os.path.join(site_root, DIST_NAME)
+    manifest_path = os.path.join(dist, MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = json.load(f)
+    except (FileNotFoundError, ValueError):
+        previous = {}
+
+    assets = {}
+    written = 0
+    for source in asset_sources(site_root):
+        with open(os.path.join(site_root, source), 'rb') as f:
+            data = f.read()
+        hashed = f'{DIST_NAME}/' + fingerprinted_name(source, hashlib.sha256(data).hexdigest())
+        assets[source] = hashed
+        target = os.path.join(site_root, hashed)
+        written += write_if_changed(target, data)
+        # Hashed names never change content, so existing variants are current
+        missing = [(encoding, suffix) for encoding, suffix in ENCODINGS if not os.path.exists(target + suffix)]
+        if missing:
+            variants = compressed_variants(data, os.path.splitext(source)[1].lower())
+            for encoding, suffix in missing:
+                if encoding in variants:
+                    written += write_if_changed(target + suffix, variants[encoding])
+
+    keep = set(assets.values()) | set(previous.get('assets', {}).values())
+    for dirpath, _, filenames in os.walk(dist):
+        for name in filenames:
+            path = os.path.relpath(os.path.join(dirpath, name), site_root).replace(os.sep, '/')
+            base = path
+            for _, suffix in ENCODINGS:
+                if base.endswith(suffix):
+                    base = base[:-len(suffix)]
+            if name != MANIFEST_NAME and base not in keep:
+                os.remove(os.path.join(dirpath, name))
+
+    manifest = {
+        'version': hashlib.sha256(json.dumps(assets, sort_keys=True).encode()).hexdigest()[:12],
+        'assets': assets,
+    }
+    write_if_changed(manifest_path, json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest, written
+
+
+def rewrite_html(html, assets):
+    """Point src/href attributes at hashed assets; other references are left alone."""
+    def replace(match):
+        prefix, quote, path, suffix = match.groups()
+        root = '/' if path.startswith('/') else ''
+        hashed = assets.get(path.lstrip('/').removeprefix('./'))
+        if hashed is None:
+            return match.group(0)
+        return f'{prefix}{quote}{root}{hashed}{suffix}{quote}'
+    return ASSET_REF_RE.sub(replace, html)
+
+
+def negotiate_encoding(accept_encoding, available, preference=None):
+    """Best of `available` content codings acceptable per an Accept-Encoding header, or None.
+
+    Ties in quality go to the first in `preference` (default: ENCODINGS order).
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    best = None
+    for encoding in preference or [enc for enc, _ in ENCODINGS]:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if encoding in available and quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def negotiate_image_type(accept, available):
+    """Best of `available` image content types the Accept header names explicitly, or None.
+
+    Wildcards do not count: browsers without WebP/AVIF support still send */*.
+    """
+    accepted = {}
+    for part in (accept or '').split(','):
+        media, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[media.strip().lower()] = quality
+    for content_type in SITE_IMAGE_FORMATS:
+        if content_type in available and accepted.get(content_type, 0) > 0:
+            return content_type
+    return None
+
+
+class AssetServer:
+    """Serves pipeline output from a StaticCache: rewritten HTML pages and precompressed files."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._manifest = ({}, None)
+        self._sources = ({}, None)
+        self._images = ({}, None)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def assets(self):
+        """(source path -> hashed path map, manifest ETag), reparsed when the manifest changes."""
+        entry = self.cache.get(f'{DIST_NAME}/{MANIFEST_NAME}')
+        if entry is None:
+            return {}, None
+        assets, etag = self._manifest
+        if etag != entry.etag:
+            try:
+                assets = json.loads(entry.read()).get('assets', {})
+            except ValueError:
+                assets = {}
+            self._manifest = (assets, entry.etag)
+        return self._manifest
+
+    def image_metadata(self):
+        """Site image metadata written by optimize_images.py (source path -> dimensions and variants)."""
+        entry = self.cache.get(f'{IMAGE_OUTPUT_DIR}/{IMAGE_METADATA_NAME}')
+        if entry is None:
+            return {}
+        images, etag = self._images
+        if etag != entry.etag:
+            try:
+                images = json.loads(entry.read())
+            except ValueError:
+                images = {}
+            self._images = (images, entry.etag)
+        return self._images[0]
+
+    def source_path(self, name):
+        """Source path of a fingerprinted dist/ file (or `name` itself for other paths)."""
+        assets, version = self.assets()
+        sources, built_from = self._sources
+        if built_from != version:
+            sources = {hashed: source for source, hashed in assets.items()}
+            self._sources = (sources, version)
+        return sources.get(name, name)
+
+    def image_variant(self, name, accept, width=None):
+        """(content type, StaticFile) of the best optimized variant of a site image.
+
+        Picks the best format the Accept header allows and the smallest width
+        covering `width` (the largest when not given). Returns (None, None)
+        when no variant is acceptable and None for images without variants.
+        """
+        image = self.image_metadata().get(self.source_path(name))
+        if image is None:
+            return None
+        content_type = negotiate_image_type(accept, image['variants'])
+        if content_type is None:
+            return None, None
+        variants = image['variants'][content_type]
+        variant = next((v for v in variants if width and v['width'] >= width), variants[-1])
+        return content_type, self.cache.get(variant['path'])
+
+    def page(self, name):
+        """{encoding or None: StaticFile} of an HTML page with rewritten references, or None if missing."""
+        entry = self.cache.get(name)
+        if entry is None:
+            return None
+        assets, version = self.assets()
+        key = (entry.etag, version)
+        cached = self._pages.get(name)
+        if cached is None or cached[0] != key:
+            body = rewrite_html(entry.read().decode('utf-8'), assets).encode('utf-8')
+            variants = {None: StaticFile.from_bytes(body, 'text/html', entry.mtime_ns)}
+            for encoding, compressed in compressed_variants(body, '.html').items():
+                variants[encoding] = StaticFile.from_bytes(compressed, 'text/html', entry.mtime_ns, f'-{encoding}')
+            cached = (key, variants)
+            with self._lock:
+                self._pages[name] = cached
+        return cached[1]
+
+    def precompressed(self, name, accept_encoding):
+        """(encoding, StaticFile) of the best variant of a dist/ file the client accepts.
+
+        Falls back to (None, the file itself), which is None when it does not exist.
+        """
+        variants = {enc: self.cache.get(name + suffix) for enc, suffix in ENCODINGS}
+        encoding = negotiate_encoding(accept_encoding, [enc for enc, entry in variants.items() if entry])
+        if encoding is None:
+            return None, self.cache.get(name)
+        return encoding, variants[encoding]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress the storefront assets.')
+    parser.add_argument('--bundle', action='store_true',
+                        help=f'copy the site into {os.path.relpath(BUNDLE_ROOT)}/ and build there (deploy packages)')
+    args = parser.parse_args()
+    manifest, written = bundle_site() if args.bundle else build_assets(SOURCE_ROOT)
+    print(f"Built {len(manifest['assets'])} assets ({written} files written), "
+          f"version {manifest['version']}{'' if BROTLI_AVAILABLE else ' - brotli not installed, gzip only'}")
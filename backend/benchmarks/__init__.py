@@ -0,0 +1,5 @@
+"""
+Benchmarks for the backend, run from backend/ with `python -m benchmarks.<name>`.
+fakes.py stands in for Cosmos DB, Blob Storage and SQL Server (with
+injected latency) so the app can be load tested without Azure.
+"""
@@ -0,0 +1,38 @@
+"""
+The app wired to the fakes, for load testing a real server:
+
+    LOADTEST_LATENCY=cosmos=6,sql=4 gunicorn -c gunicorn.conf.py benchmarks.fake_app:app
+    python -m benchmarks.loadtest --url http://localhost:8000
+
+Each worker gets its own copy of the in-memory Cosmos DB and Blob Storage
+fakes, and all workers share the SQLite file.
+"""
+import os
+import tempfile
+
+from benchmarks.fakes import FakeServices, Latency
+
+WORKDIR = os.environ.get('LOADTEST_DIR') or tempfile.mkdtemp(prefix='vancr-fake-app-')
+os.environ.setdefault('JOB_DB_PATH', os.path.join(WORKDIR, 'jobs.sqlite3'))
+os.environ.setdefault('SNAPSHOT_DIR', os.path.join(WORKDIR, 'data'))
+os.environ.setdefault('WARM_UP', '0')
+os.environ.setdefault('RATE_LIMIT', '0')  # every simulated client shares one address
+
+import app as backend  # noqa: E402
+
+services = FakeServices(WORKDIR, Latency.parse(os.environ.get('LOADTEST_LATENCY')),
+                        products=int(os.environ.get('LOADTEST_PRODUCTS', '500')),
+                        users=int(os.environ.get('LOADTEST_USERS', '50')))
+services.install(backend)
+
+_init_worker = backend.init_worker
+
+
+def init_worker():
+    # init_worker() drops the clients inherited from the master; put the fakes back
+    _init_worker()
+    services.install(backend)
+
+
+backend.init_worker = init_worker
+app = backend.app
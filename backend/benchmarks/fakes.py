@@ -0,0 +1,523 @@
+"""
+In-process stand-ins for the app's Azure dependencies.
+FakeCosmosContainer keeps documents in memory and answers the small subset of
+Cosmos SQL the app uses. FakeBlobServiceClient keeps blobs in memory, and
+FakeSqlDatabase is an SQLite file with the Users, User_Credentials and
+ContactSubmissions tables. Every call sleeps for the configured Latency
+first, so the app sees roughly the round trips it would see in Azure.
+install() points a loaded app module at them.
+"""
+import itertools
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import types
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Milliseconds per call when nothing else is configured (same-region Azure)
+DEFAULT_LATENCY_MS = {'cosmos': 6.0, 'blob': 12.0, 'sql': 4.0, 'sql_connect': 25.0}
+
+
+class Latency:
+    """Injected delay per dependency: a base time in ms with +/- `jitter` spread."""
+
+    def __init__(self, jitter=0.25, seed=None, **ms):
+        self.ms = {**DEFAULT_LATENCY_MS, **ms}
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec, jitter=0.25):
+        """Latency from "cosmos=8,blob=15,sql=5" (missing entries keep their default)."""
+        ms = {}
+        for item in (spec or '').split(','):
+            name, sep, value = item.partition('=')
+            if sep:
+                ms[name.strip()] = float(value)
+        return cls(jitter=jitter, **ms)
+
+    def wait(self, dependency):
+        base = self.ms.get(dependency, 0)
+        if base > 0:
+            time.sleep(base * (1 + self.jitter * (2 * self._random.random() - 1)) / 1000)
+
+
+class NotFound(Exception):
+    status_code = 404
+
+
+class Conflict(Exception):
+    status_code = 409
+
+
+# --- Cosmos DB ---
+
+_QUERY_RE = re.compile(
+    r'^\s*SELECT\s+(?:TOP\s+(?P<top>\d+)\s+)?\*\s+FROM\s+c'
+    r'(?:\s+WHERE\s+(?P<where>.*?))?'
+    r'(?:\s+ORDER\s+BY\s+c\.(?P<order>\w+)(?:\s+(?P<direction>ASC|DESC))?)?\s*$',
+    re.IGNORECASE | re.DOTALL)
+_COMPARE_RE = re.compile(r'^c\.(\w+)\s*(=|!=|>=|<=|>|<)\s*(.+)$')
+_FUNCTION_RE = re.compile(r'^(NOT\s+)?(ARRAY_CONTAINS|IS_DEFINED)\(c\.(\w+)(?:\s*,\s*(.+))?\)$', re.IGNORECASE)
+
+_OPERATORS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>=': lambda a, b: a is not None and a >= b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '<': lambda a, b: a is not None and a < b,
+}
+
+
+def _literal(token, parameters):
+    token = token.strip()
+    if token.startswith('@'):
+        return parameters[token]
+    if token.startswith("'") and token.endswith("'"):
+        return token[1:-1]
+    if token.lower() in ('true', 'false'):
+        return token.lower() == 'true'
+    return float(token) if '.' in token else int(token)
+
+
+def _condition(text, parameters):
+    """Predicate for one WHERE term (c.f = x, ARRAY_CONTAINS(c.f, x), IS_DEFINED(c.f))."""
+    text = text.strip()
+    match = _FUNCTION_RE.match(text)
+    if match:
+        negate, function, field, argument = match.groups()
+        if function.upper() == 'IS_DEFINED':
+            test = lambda doc: field in doc  # noqa: E731
+        else:
+            value = _literal(argument, parameters)
+            test = lambda doc: value in (doc.get(field) or [])  # noqa: E731
+        return (lambda doc: not test(doc)) if negate else test
+    match = _COMPARE_RE.match(text)
+    if match:
+        field, operator, value = match.groups()
+        value = _literal(value, parameters)
+        return lambda doc: _OPERATORS[operator](doc.get(field), value)
+    raise NotImplementedError(f'Unsupported condition in fake Cosmos query: {text}')
+
+
+def run_query(documents, query, parameters=None):
+    """Evaluate the subset of Cosmos SQL used by the app over a list of documents."""
+    match = _QUERY_RE.match(query)
+    if not match:
+        raise NotImplementedError(f'Unsupported fake Cosmos query: {query}')
+    parameters = {p['name']: p['value'] for p in parameters or []}
+    where = match.group('where')
+    conditions = [_condition(term, parameters) for term in re.split(r'\s+AND\s+', where, flags=re.I)] if where else []
+    results = [doc for doc in documents if all(test(doc) for test in conditions)]
+    if match.group('order'):
+        field = match.group('order')
+        results.sort(key=lambda doc: (doc.get(field) is not None, doc.get(field) or ''),
+                     reverse=(match.group('direction') or '').upper() == 'DESC')
+    if match.group('top'):
+        results = results[:int(match.group('top'))]
+    return results
+
+
+class FakeCosmosContainer:
+    def __init__(self, name, latency):
+        self.id = name
+        self.latency = latency
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, body):
+        doc = dict(body)
+        doc['_ts'] = int(time.time())
+        doc['_etag'] = uuid.uuid4().hex
+        return doc
+
+    def query_items(self, query, parameters=None, **kwargs):
+        self.latency.wait('cosmos')
+        with self._lock:
+            documents = [dict(doc) for doc in self._documents.values()]
+        return iter(run_query(documents, query, parameters))
+
+    def read_item(self, item, partition_key=None, **kwargs):
+        self.latency.wait('cosmos')
+        with self._lock:
+            if item not in self._documents:
+                raise NotFound(f'Entity with the specified id does not exist: {item}')
+            return dict(self._documents[item])
+
+    def create_item(self, body, **kwargs):
+        self.latency.wait('cosmos')
+        with self._lock:
+            if body['id'] in self._documents:
+                raise Conflict(f'Entity with the specified id already exists: {body["id"]}')
+            self._documents[body['id']] = self._stamp(body)
+            return dict(self._documents[body['id']])
+
+    def upsert_item(self, body, **kwargs):
+        self.latency.wait('cosmos')
+        with self._lock:
+            self._documents[body['id']] = self._stamp(body)
+            return dict(self._documents[body['id']])
+
+    def replace_item(self, item, body, **kwargs):
+        self.latency.wait('cosmos')
+        with self._lock:
+            if item not in self._documents:
+                raise NotFound(f'Entity with the specified id does not exist: {item}')
+            self._documents[item] = self._stamp(body)
+            return dict(self._documents[item])
+
+    def delete_item(self, item, partition_key=None, **kwargs):
+        self.latency.wait('cosmos')
+        with self._lock:
+            if self._documents.pop(item, None) is None:
+                raise NotFound(f'Entity with the specified id does not exist: {item}')
+
+    def seed(self, documents):
+        """Load documents without latency."""
+        with self._lock:
+            for doc in documents:
+                self._documents[doc['id']] = self._stamp(doc)
+
+
+class FakeCosmosDatabase:
+    def __init__(self, latency):
+        self.latency = latency
+        self._containers = {}
+        self._lock = threading.Lock()
+
+    def get_container_client(self, name):
+        with self._lock:
+            if name not in self._containers:
+                self._containers[name] = FakeCosmosContainer(name, self.latency)
+            return self._containers[name]
+
+    def create_container_if_not_exists(self, id, **kwargs):
+        self.latency.wait('cosmos')
+        return self.get_container_client(id)
+
+
+# --- Blob Storage ---
+
+class _Download:
+    def __init__(self, data):
+        self._data = data
+
+    def readall(self):
+        return self._data
+
+    def chunks(self):
+        yield self._data
+
+
+class _BlobProperties(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.blob_name = name
+        self.url = f'{container.url}/{name}'
+
+    def upload_blob(self, data, overwrite=False, **kwargs):
+        return self.container.upload_blob(self.blob_name, data, overwrite=overwrite, **kwargs)
+
+    def stage_block(self, block_id, data, **kwargs):
+        self.container.latency.wait('blob')
+        with self.container._lock:
+            self.container._blocks.setdefault(self.blob_name, {})[block_id] = bytes(data)
+
+    def commit_block_list(self, block_list, **kwargs):
+        self.container.latency.wait('blob')
+        with self.container._lock:
+            staged = self.container._blocks.pop(self.blob_name, {})
+            ids = [getattr(block, 'id', block) for block in block_list]
+            self.container._store(self.blob_name, b''.join(staged[i] for i in ids), kwargs)
+
+    def download_blob(self, offset=None, length=None, **kwargs):
+        self.container.latency.wait('blob')
+        data = self.container._get(self.blob_name)['data']
+        start = offset or 0
+        return _Download(data[start:start + length] if length is not None else data[start:])
+
+    def get_blob_properties(self, **kwargs):
+        self.container.latency.wait('blob')
+        blob = self.container._get(self.blob_name)
+        return _BlobProperties(name=self.blob_name, size=len(blob['data']), etag=blob['etag'],
+                               last_modified=blob['last_modified'])
+
+    def exists(self, **kwargs):
+        self.container.latency.wait('blob')
+        return self.blob_name in self.container._blobs
+
+    def delete_blob(self, **kwargs):
+        self.container.delete_blob(self.blob_name, **kwargs)
+
+
+class FakeBlobContainer:
+    def __init__(self, name, account_url, latency):
+        self.container_name = name
+        self.url = f'{account_url}/{name}'
+        self.latency = latency
+        self._blobs = {}
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _store(self, name, data, kwargs):
+        if hasattr(data, 'read'):
+            data = data.read()
+        self._blobs[name] = {'data': bytes(data), 'etag': uuid.uuid4().hex,
+                             'last_modified': datetime.now(timezone.utc), 'metadata': kwargs.get('metadata')}
+
+    def _get(self, name):
+        with self._lock:
+            if name not in self._blobs:
+                raise NotFound(f'The specified blob does not exist: {name}')
+            return self._blobs[name]
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        self.latency.wait('blob')
+        with self._lock:
+            if name in self._blobs and not overwrite:
+                raise Conflict(f'The specified blob already exists: {name}')
+            self._store(name, data, kwargs)
+        return FakeBlobClient(self, name)
+
+    def delete_blob(self, name, **kwargs):
+        self.latency.wait('blob')
+        with self._lock:
+            if self._blobs.pop(name, None) is None:
+                raise NotFound(f'The specified blob does not exist: {name}')
+
+    def list_blobs(self, name_starts_with=None, **kwargs):
+        self.latency.wait('blob')
+        with self._lock:
+            names = sorted(self._blobs)
+            blobs = [_BlobProperties(name=n, size=len(self._blobs[n]['data']),
+                                     last_modified=self._blobs[n]['last_modified'])
+                     for n in names if not name_starts_with or n.startswith(name_starts_with)]
+        return iter(blobs)
+
+
+class FakeBlobServiceClient:
+    def __init__(self, account_url, latency):
+        self.url = account_url
+        self.latency = latency
+        self._containers = {}
+        self._lock = threading.Lock()
+
+    def get_container_client(self, name):
+        with self._lock:
+            if name not in self._containers:
+                self._containers[name] = FakeBlobContainer(name, self.url, self.latency)
+            return self._containers[name]
+
+    def get_user_delegation_key(self, key_start_time, key_expiry_time, **kwargs):
+        self.latency.wait('blob')
+        return types.SimpleNamespace(signed_start=key_start_time, signed_expiry=key_expiry_time, value='fake')
+
+    def close(self):
+        pass
+
+
+# --- SQL Server ---
+
+SQL_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Users (
+    user_id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    first_name TEXT,
+    last_name TEXT,
+    phone TEXT UNIQUE,
+    active INTEGER NOT NULL DEFAULT 1,
+    access_level TEXT NOT NULL DEFAULT 'Standard',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TEXT
+);
+CREATE TABLE IF NOT EXISTS User_Credentials (
+    user_id TEXT PRIMARY KEY REFERENCES Users(user_id),
+    password_hash TEXT NOT NULL,
+    failed_login_count INTEGER NOT NULL DEFAULT 0,
+    last_login_at TEXT
+);
+CREATE TABLE IF NOT EXISTS ContactSubmissions (
+    SubmissionId TEXT PRIMARY KEY,
+    Subject TEXT,
+    Email TEXT,
+    Phone TEXT,
+    Message TEXT,
+    ActionTaken TEXT,
+    CreatedAt TEXT DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+
+class _SqlCursor:
+    def __init__(self, cursor, latency):
+        self._cursor = cursor
+        self._latency = latency
+
+    def execute(self, sql, params=()):
+        self._latency.wait('sql')
+        self._cursor.execute(sql, params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class _SqlConnection:
+    def __init__(self, connection, latency):
+        self._connection = connection
+        self._latency = latency
+
+    def cursor(self):
+        return _SqlCursor(self._connection.cursor(), self._latency)
+
+    def commit(self):
+        self._latency.wait('sql')
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class FakeSqlDatabase:
+    """SQLite file with the app's SQL Server tables; connect() behaves like pyodbc.connect()."""
+
+    def __init__(self, path, latency):
+        self.path = path
+        self.latency = latency
+        with sqlite3.connect(path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SQL_SCHEMA)
+
+    def connect(self):
+        self.latency.wait('sql_connect')
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.create_function('GETUTCDATE', 0, lambda: datetime.now(timezone.utc).isoformat())
+        conn.create_function('GETDATE', 0, lambda: datetime.now().isoformat())
+        return _SqlConnection(conn, self.latency)
+
+    def add_users(self, users, password_hash):
+        """Insert (user_id, email, first name, last name, access level) rows sharing one password hash."""
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany('INSERT OR IGNORE INTO Users (user_id, email, first_name, last_name, access_level) '
+                             'VALUES (?, ?, ?, ?, ?)', users)
+            conn.executemany('INSERT OR IGNORE INTO User_Credentials (user_id, password_hash) VALUES (?, ?)',
+                             [(user[0], password_hash) for user in users])
+
+
+def fake_pyodbc_module():
+    """Module with the pyodbc names the app uses, mapped to sqlite3 (when pyodbc is not installed)."""
+    module = types.ModuleType('pyodbc')
+    module.Error = sqlite3.Error
+    module.IntegrityError = sqlite3.IntegrityError
+    module.drivers = lambda: []
+    return module
+
+
+# --- Seed data ---
+
+CATEGORIES = ('Girls', 'Boys', 'Baby', 'Accessories', 'Footwear')
+AGE_GROUPS = ('Newborn', 'Infant', 'Toddler', 'Preschool', 'Kids')
+SEASONS = ('Spring', 'Summer', 'Fall', 'Winter', 'All Season')
+OCCASIONS = ('Casual', 'Formal', 'Party', 'Traditional', 'Everyday')
+WORDS = ('cotton', 'floral', 'denim', 'striped', 'linen', 'party', 'winter', 'summer', 'soft', 'classic',
+         'organic', 'printed', 'knit', 'embroidered', 'festive', 'school', 'comfy', 'bright', 'pastel', 'woolen')
+
+
+def make_products(count, seed=0):
+    """`count` product documents shaped like the ones add_product writes."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    products = []
+    for i in range(count):
+        categories = [rng.choice(CATEGORIES)]
+        products.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'type': 'product',
+            'itemName': ' '.join(rng.sample(WORDS, 3)).title(),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(12)),
+            'price': round(rng.uniform(199, 4999), 0),
+            'imageUrl': '/assets/images/placeholder.png',
+            'categories': categories,
+            'ageGroups': rng.sample(AGE_GROUPS, rng.randint(1, 2)),
+            'seasons': rng.sample(SEASONS, rng.randint(1, 2)),
+            'occasions': rng.sample(OCCASIONS, rng.randint(1, 2)),
+            'createdAt': (now - timedelta(minutes=i * 37)).isoformat(),
+        })
+    return products
+
+
+def make_users(count, admins=1):
+    """(user_id, email, first name, last name, access level) rows: loadtest-<n>@example.com."""
+    return [(str(uuid.UUID(int=n + 1)), f'loadtest-{n}@example.com', 'Load', f'Tester {n}',
+             'Admin' if n < admins else 'Standard') for n in range(count)]
+
+
+class FakeServices:
+    """The fakes for one app process, plus the seed data the load mix draws from."""
+
+    def __init__(self, workdir, latency, products=500, users=50, password='loadtest-password'):
+        import bcrypt
+
+        self.latency = latency
+        self.cosmos = FakeCosmosDatabase(latency)
+        self.blob = FakeBlobServiceClient('https://fake.blob.core.windows.net', latency)
+        self.sql = FakeSqlDatabase(f'{workdir}/fake-sql.sqlite3', latency)
+        self.products = make_products(products)
+        self.users = make_users(users)
+        self.password = password
+        self._signups = itertools.count()
+        # One hash for every seeded user: hashing is deliberately slow
+        self.sql.add_users(self.users, bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'))
+
+    def install(self, backend):
+        """Point a loaded app module at the fakes (call again after a gunicorn fork resets clients)."""
+        from metrics import instrument
+
+        if 'pyodbc' not in sys.modules:
+            try:
+                import pyodbc  # noqa: F401
+            except ImportError:
+                sys.modules['pyodbc'] = fake_pyodbc_module()
+        database = self.cosmos
+        products = database.get_container_client(backend.PRODUCTS_CONTAINER)
+        if not products._documents:
+            products.seed(self.products)
+        backend.database = instrument(database, 'cosmos')
+        backend.container = backend.database.get_container_client(backend.CONTAINER_NAME)
+        backend.blob_service_client = instrument(self.blob, 'blob')
+        backend.get_sql_connection = lambda: instrument(self.sql.connect(), 'sql')
+
+    def new_signup_email(self):
+        return f'signup-{uuid.uuid4().hex[:12]}-{next(self._signups)}@example.com'
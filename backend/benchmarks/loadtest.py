@@ -0,0 +1,350 @@
+"""
+End-to-end load test.
+`python -m benchmarks.loadtest` boots the app in this process against the
+fakes (with injected latency). It then sends a mix of browse, filter, login,
+signup, contact and admin-edit requests at a fixed arrival rate. Requests are
+sent on schedule whether or not earlier ones have finished, so a slow server
+shows up as latency instead of as fewer requests. The report gives
+throughput and p50/p95/p99 latency per endpoint. `--out` saves it as JSON
+and `--compare` checks a run against a saved baseline. `--url` sends the
+same mix to a running server instead, e.g. gunicorn serving
+benchmarks.fake_app:app.
+"""
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+# Share of requests per scenario
+DEFAULT_MIX = {'browse': 50, 'filter': 20, 'login': 10, 'signup': 3, 'contact': 7, 'admin_edit': 10}
+
+SEARCH_TERMS = ('cotton', 'floral dress', 'denim', 'party', 'winter jacket', 'organic', 'school', 'soft knit')
+
+
+def parse_mix(spec):
+    """{'browse': 50, ...} from "browse=50,login=10" (scenarios left out are not run)."""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# --- Scenarios: each returns (endpoint label, method, path, headers, JSON body) ---
+
+def browse(services, rng):
+    from benchmarks.fakes import CATEGORIES
+    choice = rng.random()
+    if choice < 0.4:
+        return 'GET /api/products', 'GET', '/api/products', {}, None
+    if choice < 0.8:
+        query = urlencode({'category': rng.choice(CATEGORIES)}) if rng.random() < 0.7 else ''
+        return 'GET /shop.html', 'GET', '/shop.html' + (f'?{query}' if query else ''), {}, None
+    prefix = rng.choice(SEARCH_TERMS)[:rng.randint(2, 4)]
+    return 'GET /api/search/suggest', 'GET', f'/api/search/suggest?{urlencode({"q": prefix})}', {}, None
+
+
+def filter_(services, rng):
+    from benchmarks.fakes import AGE_GROUPS, CATEGORIES, SEASONS
+    choice = rng.random()
+    if choice < 0.4:
+        query = {'category': rng.choice(CATEGORIES), 'ageGroup': rng.choice(AGE_GROUPS)}
+        if rng.random() < 0.5:
+            query['season'] = rng.choice(SEASONS)
+        return 'GET /api/products?filters', 'GET', f'/api/products?{urlencode(query)}', {}, None
+    if choice < 0.7:
+        low = rng.choice((0, 500, 1000, 2000))
+        query = {'minPrice': low, 'maxPrice': low + rng.choice((500, 1000, 3000)),
+                 'sort': rng.choice(('price_asc', 'price_desc', 'newest'))}
+        return 'GET /api/products?price', 'GET', f'/api/products?{urlencode(query)}', {}, None
+    return 'GET /api/search', 'GET', f'/api/search?{urlencode({"q": rng.choice(SEARCH_TERMS)})}', {}, None
+
+
+def login(services, rng):
+    user = rng.choice(services.users)
+    password = services.password if rng.random() < 0.9 else 'wrong-password'
+    return 'POST /api/login', 'POST', '/api/login', {}, {'email': user[1], 'password': password}
+
+
+def signup(services, rng):
+    body = {'firstName': 'Load', 'lastName': 'Tester', 'email': services.new_signup_email(),
+            'password': services.password}
+    return 'POST /api/signup', 'POST', '/api/signup', {}, body
+
+
+def contact(services, rng):
+    body = {'email': f'visitor{rng.randint(1, 10000)}@example.com', 'subject': 'Order question',
+            'message': 'When will my order ship? ' * rng.randint(1, 10)}
+    return 'POST /api/save-contact', 'POST', '/api/save-contact', {}, body
+
+
+def admin_edit(services, rng):
+    product = rng.choice(services.products)
+    admin = next(user for user in services.users if user[4] == 'Admin')
+    body = {'price': round(rng.uniform(199, 4999), 0), 'seasons': product['seasons']}
+    return ('PUT /api/products/<id>', 'PUT', f'/api/products/{product["id"]}',
+            {'X-User-Id': admin[0]}, body)
+
+
+SCENARIOS = {
+    'browse': browse,
+    'filter': filter_,
+    'login': login,
+    'signup': signup,
+    'contact': contact,
+    'admin_edit': admin_edit,
+}
+
+
+# --- Clients ---
+
+class InProcessClient:
+    """Calls the Flask app through its test client (one per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=body)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a running server over keep-alive connections (one per thread)."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.netloc
+        self.https = parts.scheme == 'https'
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, headers, body):
+        headers = dict(headers)
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        conn = self._connection()
+        try:
+            conn.request(method, self.prefix + path, body=data, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+# --- Running and reporting ---
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_load(client, services, mix, rate, duration, concurrency=64, seed=1):
+    """Send requests at `rate` per second for `duration` seconds; returns the per-request samples."""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    total = int(rate * duration)
+    plan = [SCENARIOS[name](services, rng) for name in rng.choices(names, weights, k=total)]
+    samples = []
+    lock = threading.Lock()
+
+    def send(scheduled, request):
+        label, method, path, headers, body = request
+        started = time.perf_counter()
+        try:
+            status = client.request(method, path, headers, body)
+            error = status >= 500
+        except Exception as e:
+            status, error = type(e).__name__, True
+        finished = time.perf_counter()
+        with lock:
+            samples.append((label, scheduled, started, finished, status, error))
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, request in enumerate(plan):
+            scheduled = began + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, scheduled, request)
+    return samples, time.perf_counter() - began
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint throughput, error rate and latency percentiles (ms, measured from the scheduled send time)."""
+    by_label = {}
+    for sample in samples:
+        by_label.setdefault(sample[0], []).append(sample)
+    by_label['TOTAL'] = samples
+
+    report = {}
+    for label, rows in sorted(by_label.items()):
+        latency = sorted((finished - scheduled) * 1000 for _, scheduled, _, finished, _, _ in rows)
+        service = [(finished - started) * 1000 for _, _, started, finished, _, _ in rows]
+        errors = sum(1 for row in rows if row[5])
+        statuses = {}
+        for row in rows:
+            statuses[str(row[4])] = statuses.get(str(row[4]), 0) + 1
+        report[label] = {
+            'requests': len(rows),
+            'throughput': round(len(rows) / elapsed, 2),
+            'errors': errors,
+            'errorRate': round(errors / len(rows), 4),
+            'p50': round(percentile(latency, 50), 2),
+            'p95': round(percentile(latency, 95), 2),
+            'p99': round(percentile(latency, 99), 2),
+            'max': round(latency[-1], 2),
+            'meanService': round(sum(service) / len(service), 2),
+            'statuses': statuses,
+        }
+    return report
+
+
+def format_report(report):
+    lines = [f"{'endpoint':<28} {'reqs':>6} {'req/s':>7} {'err%':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+    for label, row in report.items():
+        if label == 'TOTAL':
+            continue
+        lines.append(_report_line(label, row))
+    lines.append(_report_line('TOTAL', report['TOTAL']))
+    return '\n'.join(lines)
+
+
+def _report_line(label, row):
+    return (f"{label:<28} {row['requests']:>6} {row['throughput']:>7.1f} {row['errorRate'] * 100:>6.1f} "
+            f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f} {row['max']:>8.1f}")
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing p95 changes against a baseline report; (lines, regressed)."""
+    lines, regressed = [], False
+    for label, row in report.items():
+        before = baseline.get(label)
+        if not before:
+            continue
+        change = (row['p95'] - before['p95']) / before['p95'] if before['p95'] else 0
+        worse = change > tolerance or row['errorRate'] > before['errorRate'] + 0.01
+        regressed |= worse
+        lines.append(f"{label:<28} p95 {before['p95']:>8.1f} -> {row['p95']:>8.1f} ms ({change:+.0%})"
+                     f"{'  REGRESSION' if worse else ''}")
+    return lines, regressed
+
+
+def boot_app(workdir, latency, products, users):
+    """Import the app configured for a local run and install the fakes; returns (app module, services)."""
+    os.environ.setdefault('JOB_DB_PATH', os.path.join(workdir, 'jobs.sqlite3'))
+    os.environ.setdefault('SNAPSHOT_DIR', os.path.join(workdir, 'data'))
+    os.environ.setdefault('WARM_UP', '0')
+    os.environ.setdefault('RATE_LIMIT', '0')  # every simulated client shares one address
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as backend
+    from benchmarks.fakes import FakeServices
+
+    services = FakeServices(workdir, latency, products=products, users=users)
+    services.install(backend)
+    return backend, services
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from benchmarks.fakes import Latency
+
+    parser = argparse.ArgumentParser(description='Load test the app against local fakes of its Azure services.')
+    parser.add_argument('--rate', type=float, default=50, help='requests per second (default %(default)s)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load (default %(default)s)')
+    parser.add_argument('--mix', help=f'scenario weights (default {",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items())})')
+    parser.add_argument('--latency', help='injected ms per call, e.g. cosmos=6,blob=12,sql=4,sql_connect=25')
+    parser.add_argument('--jitter', type=float, default=0.25, help='latency spread, +/- fraction (default %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=64, help='requests in flight at most (default %(default)s)')
+    parser.add_argument('--products', type=int, default=500, help='seeded catalog size (default %(default)s)')
+    parser.add_argument('--users', type=int, default=50, help='seeded user accounts (default %(default)s)')
+    parser.add_argument('--url', help='load a running server instead of the in-process app')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='save the report as JSON')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare with a saved report')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='p95 increase counted as a regression')
+    args = parser.parse_args()
+
+    latency = Latency.parse(args.latency, args.jitter)
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory(prefix='vancr-loadtest-') as workdir:
+        if args.url:
+            # Same seed data as benchmarks.fake_app, for picking users and products
+            from benchmarks.fakes import FakeServices
+            services = FakeServices(workdir, latency, products=args.products, users=args.users)
+            client = HttpClient(args.url)
+        else:
+            backend, services = boot_app(workdir, latency, args.products, args.users)
+            client = InProcessClient(backend.app)
+        # One request per endpoint first, so one-time work (catalog indexes) is not measured
+        warmup = random.Random(0)
+        for name in mix:
+            client.request(*SCENARIOS[name](services, warmup)[1:])
+
+        samples, elapsed = run_load(client, services, mix, args.rate, args.duration, args.concurrency, args.seed)
+        report = summarize(samples, elapsed)
+        print(format_report(report))
+
+    result = {
+        'at': datetime.now(timezone.utc).isoformat(),
+        'commit': current_commit(),
+        'python': sys.version.split()[0],
+        'config': {'rate': args.rate, 'duration': args.duration, 'mix': mix, 'latencyMs': latency.ms,
+                   'jitter': args.jitter, 'concurrency': args.concurrency, 'products': args.products,
+                   'users': args.users, 'target': args.url or 'in-process'},
+        'endpoints': report,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            lines, regressed = compare(report, json.load(f)['endpoints'], args.tolerance)
+        print('\n'.join(lines))
+        if regressed:
+            sys.exit(1)
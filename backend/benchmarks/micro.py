@@ -0,0 +1,281 @@
+"""
+Micro-benchmarks of CPU-bound request hot paths.
+`python -m benchmarks.micro` times the Cosmos query building of
+get_products, the product documents of add_product, the list-field parsing
+of update_product, JSON responses of 1k/10k/50k products (plus the stdlib
+and orjson providers side by side), response compression per coding and
+bcrypt password checks. Each benchmark is calibrated to a minimum sample time,
+warmed up and sampled repeatedly with the garbage collector off. The
+report gives min, median and spread per call. `--save` writes a baseline and
+`--compare` exits non-zero when a median is more than `--tolerance` slower
+than the baseline.
+"""
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# (name, factory returning the function to time, minimum seconds per sample)
+BENCHMARKS = []
+
+
+def benchmark(name, min_time=0.05):
+    def register(factory):
+        BENCHMARKS.append((name, factory, min_time))
+        return factory
+    return register
+
+
+def _loop(func, loops):
+    started = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - started
+
+
+def measure(func, min_time=0.05, samples=15, warmup=3):
+    """Seconds per call: {'min', 'median', 'mean', 'stdev', 'loops', 'samples'}."""
+    loops = 1
+    while _loop(func, loops) < min_time and loops < 1 << 24:
+        loops *= 2
+    for _ in range(warmup):
+        _loop(func, loops)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        timings = [_loop(func, loops) / loops for _ in range(samples)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'loops': loops,
+        'samples': samples,
+    }
+
+
+def cosmos_documents(count):
+    """Products as Cosmos DB returns them (with the system properties)."""
+    from benchmarks.fakes import make_products
+    documents = make_products(count)
+    for i, doc in enumerate(documents):
+        doc.update({'_rid': f'AbCdEf{i:010d}==', '_self': f'dbs/AbCd==/colls/AbCdEf=/docs/AbCdEf{i:010d}==/',
+                    '_etag': f'"0000{i:08x}-0000-0d00-0000-65a1b2c30000"', '_attachments': 'attachments/',
+                    '_ts': 1700000000 + i})
+    return documents
+
+
+def load_app():
+    os.environ.setdefault('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'vancr-micro-jobs.sqlite3'))
+    os.environ.setdefault('WARM_UP', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as backend
+    return backend
+
+
+@benchmark('get_products: build query (4 filters)')
+def bench_products_query():
+    backend = load_app()
+    return lambda: backend.build_products_query('Girls', 'Toddler', 'Summer', 'Party')
+
+
+@benchmark('add_product: build document')
+def bench_product_document():
+    backend = load_app()
+    images = {'thumb': 'https://example/t.webp', 'medium': 'https://example/m.webp'}
+    return lambda: backend.build_product_document(
+        'id', 499.0, 'https://example/i.jpg', ['Girls'], ['Toddler', 'Kids'], ['Summer'], ['Party'],
+        image_hash='ab' * 32, images=images)
+
+
+@benchmark('update_product: parse list fields (form)')
+def bench_parse_form_fields():
+    backend = load_app()
+    data = {'categories': '["Girls", "Dresses"]', 'ageGroups': 'Toddler, Kids',
+            'seasons': '["Summer"]', 'occasions': 'Party, Casual, Everyday'}
+
+    def parse():
+        product = {}
+        for field in backend.LIST_FIELDS:
+            if field in data:
+                product[field] = backend.parse_list_field(data[field])
+        return product
+    return parse
+
+
+def _jsonify_products(count):
+    backend = load_app()
+    products = cosmos_documents(count)
+
+    def respond():
+        with backend.app.app_context():
+            return backend.jsonify({'ok': True, 'products': products}).get_data()
+    return respond
+
+
+@benchmark('jsonify 1k products')
+def bench_json_1k():
+    return _jsonify_products(1000)
+
+
+@benchmark('jsonify 10k products', min_time=0.2)
+def bench_json_10k():
+    return _jsonify_products(10000)
+
+
+@benchmark('jsonify 50k products', min_time=0.5)
+def bench_json_50k():
+    return _jsonify_products(50000)
+
+
+def _provider_dumps(fast, count):
+    from flask.json.provider import DefaultJSONProvider
+    from json_provider import FastJSONProvider
+    backend = load_app()
+    provider = (FastJSONProvider if fast else DefaultJSONProvider)(backend.app)
+    payload = {'ok': True, 'products': cosmos_documents(count)}
+
+    def respond():
+        with backend.app.app_context():
+            return provider.response(payload).get_data()
+    return respond
+
+
+@benchmark('json provider: stdlib 10k products', min_time=0.2)
+def bench_stdlib_provider_10k():
+    return _provider_dumps(False, 10000)
+
+
+@benchmark('json provider: orjson 10k products', min_time=0.2)
+def bench_fast_provider_10k():
+    return _provider_dumps(True, 10000)
+
+
+def _provider_loads(fast):
+    from flask.json.provider import DefaultJSONProvider
+    from json_provider import FastJSONProvider
+    backend = load_app()
+    provider = (FastJSONProvider if fast else DefaultJSONProvider)(backend.app)
+    body = json.dumps({'id': 'x', 'price': 499, 'categories': ['Girls', 'Dresses'], 'ageGroups': ['Toddler'],
+                       'seasons': ['Summer'], 'occasions': ['Party', 'Casual'], 'imageUrl': 'https://example/i.jpg'})
+    return lambda: provider.loads(body)
+
+
+@benchmark('json provider: stdlib parse product body')
+def bench_stdlib_provider_loads():
+    return _provider_loads(False)
+
+
+@benchmark('json provider: orjson parse product body')
+def bench_fast_provider_loads():
+    return _provider_loads(True)
+
+
+def _compress_products(encoding):
+    from compression import DYNAMIC_LEVELS, compress, supported_encodings
+    from json_provider import FastJSONProvider
+    if encoding not in supported_encodings():
+        raise ValueError(f'{encoding} is not installed')
+    backend = load_app()
+    body = FastJSONProvider(backend.app).dumpb({'ok': True, 'products': cosmos_documents(1000)})
+    return lambda: compress(body, encoding, DYNAMIC_LEVELS[encoding])
+
+
+@benchmark('compress 1k products: gzip')
+def bench_compress_gzip():
+    return _compress_products('gzip')
+
+
+@benchmark('compress 1k products: br')
+def bench_compress_br():
+    return _compress_products('br')
+
+
+@benchmark('compress 1k products: zstd')
+def bench_compress_zstd():
+    return _compress_products('zstd')
+
+
+@benchmark('bcrypt checkpw (cost 12)', min_time=0.5)
+def bench_bcrypt():
+    import bcrypt
+    hashed = bcrypt.hashpw(b'correct horse battery staple', bcrypt.gensalt(12))
+    return lambda: bcrypt.checkpw(b'correct horse battery staple', hashed)
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing median changes against a baseline; (lines, regressed)."""
+    lines, regressed = [], False
+    for name, row in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        ratio = row['median'] / before['median']
+        worse = ratio > 1 + tolerance
+        regressed |= worse
+        lines.append(f"{name:<44} {_format_time(before['median']):>10} -> {_format_time(row['median']):>10} "
+                     f"({ratio:.2f}x){'  REGRESSION' if worse else ''}")
+    return lines, regressed
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of request hot paths.')
+    parser.add_argument('filter', nargs='*', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--samples', type=int, default=15, help='timed samples per benchmark (default %(default)s)')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed samples first (default %(default)s)')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare medians with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='slowdown counted as a regression')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'benchmark':<44} {'min':>10} {'median':>10} {'stdev':>8} {'loops':>7}")
+    for name, factory, min_time in BENCHMARKS:
+        if args.filter and not any(f.lower() in name.lower() for f in args.filter):
+            continue
+        try:
+            func = factory()
+        except (ImportError, ValueError) as e:
+            print(f'{name:<44} skipped: {e}')
+            continue
+        stats = measure(func, min_time, args.samples, args.warmup)
+        results[name] = stats
+        spread = stats['stdev'] / stats['median'] * 100 if stats['median'] else 0
+        print(f"{name:<44} {_format_time(stats['min']):>10} {_format_time(stats['median']):>10} "
+              f"{spread:>7.1f}% {stats['loops']:>7}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'at': datetime.now(timezone.utc).isoformat(), 'commit': current_commit(),
+                       'python': sys.version.split()[0], 'results': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            lines, regressed = compare(results, json.load(f)['results'], args.tolerance)
+        print('\n'.join(lines))
+        if regressed:
+            sys.exit(1)
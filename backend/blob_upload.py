@@ -0,0 +1,82 @@
+"""
+Chunked, parallel blob uploads from a stream.
+Reads the source in fixed-size blocks, stages them concurrently with a bounded
+number in flight, hashes the content on the fly and commits the block list at
+the end, so memory stays at roughly block_size * max_concurrency whatever the
+size of the upload.
+"""
+import base64
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+
+# For blobs whose name changes whenever their content does
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _block_id(index):
+    # Block ids must be base64 and all the same length within a blob
+    return base64.b64encode(f'{index:08d}'.encode()).decode()
+
+
+def _read_block(stream, size):
+    """Read up to `size` bytes, looping over short reads from network streams."""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def upload_stream(blob_client, stream, content_settings,
+                  block_size=DEFAULT_BLOCK_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Upload `stream` to `blob_client`, overwriting any existing blob.
+
+    Content that fits in one block goes up as a single Put Blob. Larger content
+    is staged as blocks in parallel and committed in order. The MD5 of the whole
+    content is computed while reading and stored as the blob's Content-MD5.
+    Returns (size in bytes, hex MD5).
+    """
+    from azure.storage.blob import BlobBlock
+
+    md5 = hashlib.md5(usedforsecurity=False)
+    first = _read_block(stream, block_size)
+    md5.update(first)
+
+    if len(first) < block_size:
+        content_settings.content_md5 = bytearray(md5.digest())
+        blob_client.upload_blob(first, overwrite=True, content_settings=content_settings)
+        return len(first), md5.hexdigest()
+
+    block_ids = []
+    size = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = set()
+        data = first
+        while data:
+            if len(pending) >= max_concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            block_id = _block_id(len(block_ids))
+            block_ids.append(block_id)
+            size += len(data)
+            # Run in a copy of this context so the block uploads are traced under the request
+            pending.add(executor.submit(contextvars.copy_context().run, blob_client.stage_block,
+                                        block_id, data, length=len(data)))
+            data = _read_block(stream, block_size)
+            md5.update(data)
+        for future in wait(pending).done:
+            future.result()
+
+    content_settings.content_md5 = bytearray(md5.digest())
+    blob_client.commit_block_list([BlobBlock(block_id=b) for b in block_ids],
+                                  content_settings=content_settings)
+    return size, md5.hexdigest()
@@ -0,0 +1,165 @@
+"""
+On-the-fly compression of dynamic responses.
+compress_responses(app, compressor) compresses a response when three things hold:
+- its content type is on the compressor's allowlist
+- it is at least `min_size` bytes
+- the client accepts one of the configured codings (zstd, brotli or gzip)
+
+Bodies held in memory are compressed in one go. Streamed bodies are
+compressed chunk by chunk as they are sent and are never buffered whole.
+Bodies that only change with the catalog version are compressed once per
+coding with Compressor.cached(), which stores the result next to the
+uncompressed body in the response cache.
+"""
+import zlib
+
+from flask import request
+
+from assets import negotiate_encoding
+
+# Both codings are optional: without them responses fall back to gzip
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Server preference when the client accepts several codings equally: at the
+# per-request levels zstd matches brotli's size in a fraction of the CPU time
+DEFAULT_ENCODINGS = ('zstd', 'br', 'gzip')
+DEFAULT_CONTENT_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'text/csv',
+                         'text/javascript', 'application/javascript', 'image/svg+xml')
+# Smaller bodies gain too little to pay for the CPU time and the framing
+DEFAULT_MIN_SIZE = 1024
+
+# Levels for responses compressed per request (fast) and for cached bodies (compressed once)
+DYNAMIC_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+CACHED_LEVELS = {'br': 9, 'zstd': 12, 'gzip': 9}
+
+
+def supported_encodings():
+    """Content codings that can be produced with the installed libraries."""
+    return {'gzip'} | ({'br'} if BROTLI_AVAILABLE else set()) | ({'zstd'} if ZSTD_AVAILABLE else set())
+
+
+class StreamCompressor:
+    """Incremental compressor: compress() returns what is ready, flush() everything
+    given so far (the output stays decodable), finish() ends the stream."""
+
+    def __init__(self, encoding, level):
+        if encoding == 'gzip':
+            c = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self.compress, self.finish = c.compress, c.flush
+            self.flush = lambda: c.flush(zlib.Z_SYNC_FLUSH)
+        elif encoding == 'br' and BROTLI_AVAILABLE:
+            c = brotli.Compressor(quality=level)
+            self.compress, self.flush, self.finish = c.process, c.flush, c.finish
+        elif encoding == 'zstd' and ZSTD_AVAILABLE:
+            c = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress, self.finish = c.compress, c.flush
+            self.flush = lambda: c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            raise ValueError(f'Unsupported content coding: {encoding}')
+
+
+def compress(data, encoding, level):
+    """`data` compressed with a content coding in one go."""
+    compressor = StreamCompressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_chunks(chunks, encoding, level, close=None):
+    """Compress an iterable of byte chunks as it is consumed.
+
+    Each chunk is flushed so a slow stream still reaches the client as it is
+    produced. `close` (the original response body) is closed afterwards.
+    """
+    compressor = StreamCompressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if chunk:
+                data = compressor.compress(chunk) + compressor.flush()
+                if data:
+                    yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(close, 'close'):
+            close.close()
+
+
+class Compressor:
+    """Which responses get compressed, with which codings and levels."""
+
+    def __init__(self, encodings=DEFAULT_ENCODINGS, min_size=DEFAULT_MIN_SIZE,
+                 content_types=DEFAULT_CONTENT_TYPES, levels=None, cached_levels=None):
+        supported = supported_encodings()
+        self.encodings = [enc for enc in encodings if enc in supported]
+        self.min_size = min_size
+        self.content_types = frozenset(content_types)
+        self.levels = {**DYNAMIC_LEVELS, **(levels or {})}
+        self.cached_levels = {**CACHED_LEVELS, **(cached_levels or {})}
+
+    def negotiate(self, accept_encoding):
+        """Coding to use for a request's Accept-Encoding header, or None."""
+        return negotiate_encoding(accept_encoding, self.encodings, self.encodings)
+
+    def applies_to(self, response):
+        """True if a response may be compressed (the request headers aside)."""
+        return (bool(self.encodings)
+                and response.mimetype in self.content_types
+                and 200 <= response.status_code < 300 and response.status_code not in (204, 206)
+                and 'Content-Encoding' not in response.headers
+                and not response.direct_passthrough
+                and 'no-transform' not in response.headers.get('Cache-Control', ''))
+
+    def compress_response(self, response):
+        """after_request hook: compress the response if it qualifies."""
+        if not self.applies_to(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        length = response.content_length
+        if length is not None and length < self.min_size:
+            return response
+        encoding = self.negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+        if response.is_streamed:
+            original = response.response
+            response.response = compress_chunks(response.iter_encoded(), encoding, level, close=original)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            response.set_data(compress(body, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Accept-Ranges', None)
+        # Byte-for-byte different, same content: like nginx, keep the tag but weaken it
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def cached(self, cache, key, body):
+        """(encoding, bytes) of a cached body for the current request.
+
+        Compressed variants are kept in `cache` under (key, encoding), so a body
+        whose key includes the catalog version is compressed once per coding.
+        """
+        encoding = self.negotiate(request.headers.get('Accept-Encoding')) if len(body) >= self.min_size else None
+        if encoding is None:
+            return None, body
+        return encoding, cache.get_or_render(
+            (key, encoding), lambda: compress(body, encoding, self.cached_levels[encoding]))
+
+
+def compress_responses(app, compressor):
+    """Compress the app's responses per `compressor`."""
+    app.after_request(compressor.compress_response)
@@ -0,0 +1,104 @@
+"""
+Production gunicorn profile (startup.txt runs `gunicorn -c gunicorn.conf.py app:app`).
+Workers are sized from CPU count and available memory, each running a few
+threads because requests mostly wait on Cosmos DB, Blob Storage and SQL.
+The app is preloaded in the master so workers fork with every module
+already imported. Worker hooks give every process its own Azure clients
+and background job threads and drain them on exit. Workers write
+Prometheus samples to a shared directory so /metrics covers all of them,
+and share rate limit buckets through a SQLite file. Every setting can be
+overridden with the GUNICORN_* environment variables below.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def _available_memory_mb():
+    """MemAvailable from /proc/meminfo (Linux), or None when unknown."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _worker_count():
+    cpus = multiprocessing.cpu_count()
+    by_cpu = 2 * cpus + 1
+    memory = _available_memory_mb()
+    if memory is None:
+        return by_cpu
+    # Each worker holds the catalog indexes, static cache and upload buffers
+    by_memory = memory // int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', '256'))
+    return max(1, min(by_cpu, by_memory))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers = int(os.environ.get('GUNICORN_WORKERS') or os.environ.get('WEB_CONCURRENCY') or _worker_count())
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Import the app once in the master; workers share its pages copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Uploads can take a while on slow connections; idle keep-alive connections
+# wait in the poller without holding a thread
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '75'))
+
+# Recycle workers to bound slow memory growth; jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+# Heartbeat files on tmpfs so a slow disk cannot make workers look hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Shared Prometheus sample directory; must be set before the app (and
+# prometheus_client) is imported, and is emptied when the master starts
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f'vancr-metrics-{os.environ.get("PORT", "8000")}'))
+
+# Login and signup rate limit buckets shared by the workers; with in-memory buckets
+# each worker would allow the full limit, multiplying it by the worker count
+if workers > 1:
+    os.environ.setdefault('RATE_LIMIT_DB', os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f'vancr-ratelimit-{os.environ.get("PORT", "8000")}.sqlite3'))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    server.log.info(f'Serving with {workers} workers x {threads} threads '
+                    f'(cpus={multiprocessing.cpu_count()}, available memory={_available_memory_mb()} MB)')
+
+
+def post_fork(server, worker):
+    # Clients must not be shared across processes: open this worker's own
+    import app
+    app.init_worker()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown_worker()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
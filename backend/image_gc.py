@@ -0,0 +1,196 @@
+"""
+Garbage collection of orphaned product image blobs.
+Lists the product-images container and the image references held by
+product documents in parallel, then deletes blobs no product points at:
+content-addressed images (images/<sha256>.<ext> plus renditions) whose
+hash no product uses, and legacy products/<id>.<ext> uploads whose URL no
+product uses. Blobs modified within the grace period are never touched, so
+uploads that are still being attached to a product are safe. Dry run by
+default; run `python image_gc.py --delete` to remove orphans.
+"""
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from image_store import CONTENT_PREFIX, REF_TYPE, ref_id
+
+LEGACY_PREFIX = 'products/'
+
+# Default age a blob must reach before it can be collected
+DEFAULT_GRACE_SECONDS = 7 * 24 * 3600
+
+# Orphans itemised in a report (totals always cover all of them)
+REPORT_LIMIT = 200
+
+CONTENT_KEY_RE = re.compile(rf'^{re.escape(CONTENT_PREFIX)}([0-9a-f]{{64}})(?:[./]|$)')
+
+
+def blob_key(name):
+    """Group key of a blob: ('content', sha256) for an image and its renditions,
+    ('legacy', name) for products/ uploads, None for anything else."""
+    match = CONTENT_KEY_RE.match(name)
+    if match:
+        return 'content', match.group(1)
+    if name.startswith(LEGACY_PREFIX):
+        return 'legacy', name
+    return None
+
+
+def blob_name_from_url(url, container):
+    """Blob name within `container` addressed by a blob URL, or None for other URLs."""
+    if not url or 'blob.core.windows.net' not in url:
+        return None
+    path = unquote(urlparse(url).path).lstrip('/')
+    prefix = f'{container}/'
+    return path[len(prefix):] if path.startswith(prefix) else None
+
+
+def referenced_keys(products_container, container):
+    """Blob group keys referenced by any document with an imageUrl, imageHash or pendingImageHash."""
+    keys = set()
+    for doc in products_container.query_items(
+        query="SELECT c.imageUrl, c.imageHash, c.pendingImageHash FROM c "
+              "WHERE IS_DEFINED(c.imageUrl) OR IS_DEFINED(c.imageHash) OR IS_DEFINED(c.pendingImageHash)",
+        enable_cross_partition_query=True
+    ):
+        for digest in (doc.get('imageHash'), doc.get('pendingImageHash')):
+            if digest:
+                keys.add(('content', digest))
+        name = blob_name_from_url(doc.get('imageUrl'), container)
+        if name:
+            key = blob_key(name)
+            if key:
+                keys.add(key)
+    return keys
+
+
+def recent_refs(products_container, cutoff):
+    """Hashes whose reference document changed after `cutoff` (an upload may be in flight)."""
+    return {doc['sha256'] for doc in products_container.query_items(
+        query="SELECT c.sha256 FROM c WHERE c.type = @type AND c._ts >= @cutoff",
+        parameters=[{'name': '@type', 'value': REF_TYPE}, {'name': '@cutoff', 'value': int(cutoff)}],
+        enable_cross_partition_query=True
+    )}
+
+
+def scan_blobs(container_client):
+    """Group every collectable blob by key: {key: [names, bytes, newest modification time]}."""
+    groups = {}
+    unknown = 0
+    for blob in container_client.list_blobs():
+        key = blob_key(blob.name)
+        if key is None:
+            unknown += 1
+            continue
+        group = groups.setdefault(key, [[], 0, 0.0])
+        group[0].append(blob.name)
+        group[1] += blob.size or 0
+        group[2] = max(group[2], blob.last_modified.timestamp())
+    return groups, unknown
+
+
+def _delete_ref(products_container, digest):
+    """Delete a hash's reference document unless a product took it in the meantime."""
+    from azure.core import MatchConditions
+    from azure.cosmos import exceptions
+
+    try:
+        ref = products_container.read_item(item=ref_id(digest), partition_key=ref_id(digest))
+    except exceptions.CosmosResourceNotFoundError:
+        return True
+    if ref.get('refCount', 0) > 0:
+        return False
+    try:
+        products_container.delete_item(item=ref['id'], partition_key=ref['id'],
+                                       etag=ref['_etag'], match_condition=MatchConditions.IfNotModified)
+    except exceptions.CosmosAccessConditionFailedError:
+        return False
+    except exceptions.CosmosResourceNotFoundError:
+        pass
+    return True
+
+
+def collect_orphans(container_client, products_container, grace_seconds=DEFAULT_GRACE_SECONDS,
+                    delete=False, logger=None):
+    """Find (and with `delete`, remove) orphaned image blobs; returns a report dict.
+
+    The container listing and the reference query run in parallel. Only
+    compact group keys are held for references; blobs are grouped so an
+    image and its renditions are judged and deleted together.
+    """
+    started = time.time()
+    cutoff = started - grace_seconds
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        listing = executor.submit(scan_blobs, container_client)
+        referenced = executor.submit(referenced_keys, products_container, container_client.container_name)
+        in_flight = executor.submit(recent_refs, products_container, cutoff)
+        groups, unknown = listing.result()
+        referenced = referenced.result()
+        in_flight = in_flight.result()
+
+    report = {
+        'dryRun': not delete,
+        'graceSeconds': grace_seconds,
+        'scannedBlobs': sum(len(names) for names, _, _ in groups.values()),
+        'scannedBytes': sum(size for _, size, _ in groups.values()),
+        'unknownBlobs': unknown,
+        'referencedImages': len(referenced),
+        'recentSkipped': 0,
+        'orphanImages': 0,
+        'orphanBlobs': 0,
+        'orphanBytes': 0,
+        'deletedBlobs': 0,
+        'orphans': [],
+    }
+    for key, (names, size, modified) in sorted(groups.items()):
+        if key in referenced:
+            continue
+        kind, value = key
+        if modified >= cutoff or (kind == 'content' and value in in_flight):
+            report['recentSkipped'] += 1
+            continue
+        report['orphanImages'] += 1
+        report['orphanBlobs'] += len(names)
+        report['orphanBytes'] += size
+        if len(report['orphans']) < REPORT_LIMIT:
+            report['orphans'].append({
+                'key': value,
+                'blobs': len(names),
+                'bytes': size,
+                'lastModified': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(modified)),
+            })
+        if not delete:
+            continue
+        try:
+            if kind == 'content' and not _delete_ref(products_container, value):
+                continue
+            for name in names:
+                container_client.delete_blob(name)
+                report['deletedBlobs'] += 1
+        except Exception as e:
+            if logger:
+                logger.warning(f'Image GC could not delete {value}: {e}')
+
+    report['seconds'] = round(time.time() - started, 2)
+    if logger:
+        logger.info(
+            f"Image GC ({'dry run' if not delete else 'delete'}): {report['scannedBlobs']} blobs scanned, "
+            f"{report['orphanImages']} orphaned images ({report['orphanBytes']} bytes), "
+            f"{report['deletedBlobs']} blobs deleted in {report['seconds']}s"
+        )
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Find and delete orphaned product image blobs.')
+    parser.add_argument('--delete', action='store_true', help='delete orphans (default is a dry-run report)')
+    parser.add_argument('--grace-hours', type=float, default=DEFAULT_GRACE_SECONDS / 3600,
+                        help='only collect blobs older than this (default %(default)s)')
+    args = parser.parse_args()
+
+    from app import collect_orphaned_images
+    print(json.dumps(collect_orphaned_images(delete=args.delete, grace_seconds=args.grace_hours * 3600), indent=2))
@@ -0,0 +1,246 @@
+"""
+Content-addressed product image storage.
+Images are stored once per distinct content under their SHA-256
+(images/<sha256>.<ext>, renditions under images/<sha256>/), uploaded with
+immutable cache headers and shared between products. A reference document
+per image in Cosmos DB counts how many products use it; the blobs are
+removed when the last product lets go. Images the browser uploads directly
+are registered as pending and only verified (hashed and size-checked) by a
+background job, so their bytes never pass through a request worker.
+"""
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+
+from blob_upload import upload_stream, DEFAULT_BLOCK_SIZE, DEFAULT_MAX_CONCURRENCY, IMMUTABLE_CACHE_CONTROL
+from images import IMAGE_CONTENT_TYPES, SNIFF_BYTES, sniff_image_type
+
+CONTENT_PREFIX = 'images/'
+REF_TYPE = 'imageRef'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Verified uploads up to this size are read back into memory, larger ones into a temporary file
+VERIFY_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def content_hash(stream):
+    """SHA-256 of a seekable stream, leaving it rewound."""
+    sha = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        sha.update(chunk)
+    stream.seek(0)
+    return sha.hexdigest()
+
+
+def content_blob_name(digest, ext):
+    return f"{CONTENT_PREFIX}{digest}.{ext}"
+
+
+def ref_id(digest):
+    return f"image-{digest}"
+
+
+class ImageStore:
+    """Deduplicating image store over a blob container plus refcount documents."""
+
+    def __init__(self, container_client, refs_container,
+                 block_size=DEFAULT_BLOCK_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.container_client = container_client
+        self.refs = refs_container
+        self.block_size = block_size
+        self.max_concurrency = max_concurrency
+
+    def put(self, file, ext, render=None):
+        """Store an uploaded file and take a reference on it; returns the reference document.
+
+        The content is uploaded (and `render(digest, stream)` called to build the
+        renditions map) only when no blob with the same hash exists yet. The
+        reference is taken once the blob is in place, so a failed upload leaves
+        no count behind. Raises ValueError when the content is not an accepted image.
+        """
+        from azure.cosmos import exceptions
+        from azure.storage.blob import ContentSettings
+
+        kind = sniff_image_type(file.stream.read(SNIFF_BYTES))
+        if kind is None:
+            raise ValueError('Uploaded file is not a PNG, JPEG, GIF or WEBP image')
+        digest = content_hash(file.stream)
+        existing = self.lookup(digest)
+        # A pending direct upload is unverified: replace it with the bytes in hand
+        pending = existing is not None and existing.get('pending')
+        if existing is not None and not pending and self.container_client.get_blob_client(existing['blobName']).exists():
+            try:
+                return self._incr(digest, 1)
+            except exceptions.CosmosResourceNotFoundError:
+                pass  # Released to zero and deleted meanwhile: store it again
+
+        blob_name = content_blob_name(digest, ext)
+        blob_client = self.container_client.get_blob_client(blob_name)
+        # The type the bytes actually have, not the one the client declared
+        settings = ContentSettings(content_type=IMAGE_CONTENT_TYPES[kind], cache_control=IMMUTABLE_CACHE_CONTROL)
+        upload_stream(blob_client, file.stream, settings,
+                      block_size=self.block_size, max_concurrency=self.max_concurrency)
+        operations = [
+            {'op': 'set', 'path': '/blobName', 'value': blob_name},
+            {'op': 'set', 'path': '/url', 'value': blob_client.url},
+        ]
+        if pending:
+            operations.append({'op': 'set', 'path': '/pending', 'value': False})
+        if render is not None:
+            file.stream.seek(0)
+            images = render(digest, file.stream)
+            if images:
+                operations.append({'op': 'set', 'path': '/images', 'value': images})
+        operations.append({'op': 'incr', 'path': '/refCount', 'value': 1})
+        self._ensure_ref(digest)
+        return self.refs.patch_item(item=ref_id(digest), partition_key=ref_id(digest),
+                                    patch_operations=operations)
+
+    def lookup(self, digest):
+        """Reference document of a stored image, or None if the content is unknown."""
+        from azure.cosmos import exceptions
+
+        try:
+            ref = self.refs.read_item(item=ref_id(digest), partition_key=ref_id(digest))
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        return ref if ref.get('blobName') else None
+
+    def attach(self, digest, ext, max_bytes):
+        """Take a reference on an image uploaded straight to images/<digest>.<ext> by the browser.
+
+        Content that is already stored is simply referenced again. A new blob is
+        only checked for existence and size here, without reading it, and is
+        registered with `pending` set: the caller must not expose it until
+        verify() has hashed it. Raises ValueError when the upload is missing
+        or too large.
+        """
+        from azure.core.exceptions import ResourceNotFoundError
+
+        existing = self.lookup(digest)
+        if existing is not None:
+            return self._incr(digest, 1)
+
+        blob_name = content_blob_name(digest, ext)
+        blob_client = self.container_client.get_blob_client(blob_name)
+        try:
+            properties = blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            raise ValueError('Uploaded image not found')
+        if properties.size == 0 or properties.size > max_bytes:
+            blob_client.delete_blob()
+            raise ValueError(f'Image must be between 1 byte and {max_bytes} bytes')
+
+        self._ensure_ref(digest)
+        return self.refs.patch_item(item=ref_id(digest), partition_key=ref_id(digest), patch_operations=[
+            {'op': 'set', 'path': '/blobName', 'value': blob_name},
+            {'op': 'set', 'path': '/url', 'value': blob_client.url},
+            {'op': 'set', 'path': '/size', 'value': properties.size},
+            {'op': 'set', 'path': '/pending', 'value': True},
+            {'op': 'incr', 'path': '/refCount', 'value': 1},
+        ])
+
+    def verify(self, digest, check):
+        """Verify a pending direct upload; returns its reference document, now exposable.
+
+        Meant for a background job. The blob is read back once, pinned to its
+        etag, so the browser's SHA-256 is never taken on trust, and
+        `check(stream)` (size and dimension limits, returning the image type)
+        runs before anything decodes it. A blob that fails either is deleted
+        and its reference emptied, and ValueError is raised. A verified blob
+        gets immutable HTTP headers and loses its `pending` flag.
+        """
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceNotFoundError
+        from azure.storage.blob import ContentSettings
+
+        ref = self.lookup(digest)
+        if ref is None:
+            raise ValueError('Uploaded image not found')
+        if not ref.get('pending'):
+            return ref
+
+        blob_client = self.container_client.get_blob_client(ref['blobName'])
+        try:
+            properties = blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            self._reject(digest, blob_client)
+            raise ValueError('Uploaded image not found')
+        # Pinned to the etag so the bytes checked are the bytes registered; a
+        # blob rewritten meanwhile raises ResourceModifiedError and is retried
+        unchanged = {'etag': properties.etag, 'match_condition': MatchConditions.IfNotModified}
+        with tempfile.SpooledTemporaryFile(max_size=VERIFY_SPOOL_BYTES) as spool:
+            blob_client.download_blob(**unchanged).readinto(spool)
+            try:
+                if content_hash(spool) != digest:
+                    raise ValueError('Uploaded image does not match its SHA-256')
+                kind = check(spool)
+            except ValueError:
+                self._reject(digest, blob_client)
+                raise
+
+        blob_client.set_http_headers(content_settings=ContentSettings(
+            content_type=IMAGE_CONTENT_TYPES[kind],
+            cache_control=IMMUTABLE_CACHE_CONTROL,
+        ), **unchanged)
+        return self.update(digest, pending=False, size=properties.size)
+
+    def update(self, digest, **fields):
+        """Set fields (renditions map, metadata) on a stored image's reference document."""
+        return self.refs.patch_item(item=ref_id(digest), partition_key=ref_id(digest), patch_operations=[
+            {'op': 'set', 'path': f'/{name}', 'value': value} for name, value in fields.items()
+        ])
+
+    def release(self, digest):
+        """Drop one reference; deletes the image and its renditions when none remain."""
+        from azure.core import MatchConditions
+        from azure.cosmos import exceptions
+
+        try:
+            ref = self._incr(digest, -1)
+        except exceptions.CosmosResourceNotFoundError:
+            return False
+        if ref.get('refCount', 0) > 0:
+            return False
+        try:
+            # Only delete if nobody took a new reference in the meantime
+            self.refs.delete_item(item=ref['id'], partition_key=ref['id'],
+                                  etag=ref['_etag'], match_condition=MatchConditions.IfNotModified)
+        except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+            return False
+        for blob in self.container_client.list_blobs(name_starts_with=f"{CONTENT_PREFIX}{digest}"):
+            self.container_client.delete_blob(blob.name)
+        return True
+
+    def _reject(self, digest, blob_client):
+        """Delete a direct upload that failed verification.
+
+        The reference document stays, since products still hold counts on it,
+        but loses its blob name, so lookup() treats the content as unknown again.
+        """
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            blob_client.delete_blob()
+        except ResourceNotFoundError:
+            pass
+        self.update(digest, blobName='', pending=False)
+
+    def _ensure_ref(self, digest):
+        from azure.cosmos import exceptions
+
+        try:
+            self.refs.create_item(body={
+                'id': ref_id(digest),
+                'type': REF_TYPE,
+                'sha256': digest,
+                'refCount': 0,
+                'createdAt': datetime.now(timezone.utc).isoformat(),
+            })
+        except exceptions.CosmosResourceExistsError:
+            pass
+
+    def _incr(self, digest, delta):
+        return self.refs.patch_item(item=ref_id(digest), partition_key=ref_id(digest),
+                                    patch_operations=[{'op': 'incr', 'path': '/refCount', 'value': delta}])
@@ -0,0 +1,224 @@
+"""
+Product image derivative pipeline.
+Resizes an uploaded product photo into thumbnail, card and zoom renditions
+in WebP and JPEG, stores them under predictable blob names and returns a
+srcset-ready map for the product document.
+"""
+import importlib.util
+import io
+import os
+import struct
+
+from blob_upload import IMMUTABLE_CACHE_CONTROL
+
+# Pillow is optional: without it products keep only the original upload. It is
+# imported where pixels are decoded, so the header helpers stay cheap to import
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+# Rendition name -> maximum width in pixels
+#   thumb: 60px admin table thumbnail at 2x
+#   card:  2in storefront product card at 2x
+#   zoom:  2.5x hover zoom on the card
+DERIVATIVE_WIDTHS = {
+    'thumb': 120,
+    'card': 400,
+    'zoom': 1200,
+}
+
+# Output format -> (file extension, content type, encoder options)
+DERIVATIVE_FORMATS = {
+    'webp': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+# Leading bytes identifying each accepted upload format
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+IMAGE_CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+# Bytes needed to identify an image by its header
+SNIFF_BYTES = 16
+
+
+def sniff_image_type(header):
+    """Image format from the first bytes of a file ('png', 'jpeg', 'gif', 'webp'), or None."""
+    for signature, kind in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return kind
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+# JPEG start-of-frame markers (the frame header carries the dimensions)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_dimensions(stream):
+    """(width, height) from a JPEG's frame header, seeking past the segments before it."""
+    stream.seek(2)
+    while True:
+        marker = stream.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        while code == 0xFF:
+            # Fill bytes before a marker
+            byte = stream.read(1)
+            if not byte:
+                return None
+            code = byte[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD8:
+            continue
+        length = stream.read(2)
+        if len(length) < 2:
+            return None
+        if code in JPEG_SOF_MARKERS:
+            frame = stream.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        stream.seek(struct.unpack('>H', length)[0] - 2, os.SEEK_CUR)
+
+
+def image_dimensions(source):
+    """(width, height) of a PNG, GIF, WEBP or JPEG given as bytes or a seekable file object, or None.
+
+    Only the container headers are read; no pixel data is decoded and Pillow
+    is not needed. JPEG dimensions sit after the metadata segments (EXIF,
+    ICC profiles, thumbnails), which are skipped by seeking over them, so a
+    file object is never read whole. The stream is left rewound.
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    try:
+        stream.seek(0)
+        header = stream.read(32)
+        kind = sniff_image_type(header)
+        if kind == 'png':
+            if len(header) >= 24 and header[12:16] == b'IHDR':
+                return struct.unpack('>II', header[16:24])
+        elif kind == 'gif':
+            if len(header) >= 10:
+                return struct.unpack('<HH', header[6:10])
+        elif kind == 'webp':
+            chunk = header[12:16]
+            if chunk == b'VP8 ' and len(header) >= 30:
+                width, height = struct.unpack('<HH', header[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L' and len(header) >= 25:
+                bits = int.from_bytes(header[21:25], 'little')
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X' and len(header) >= 30:
+                return int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1
+        elif kind == 'jpeg':
+            return _jpeg_dimensions(stream)
+        return None
+    finally:
+        stream.seek(0)
+
+
+# Bytes of the file head that normally contain an image's dimensions
+INFO_BYTES = 256 * 1024
+
+
+def read_image_info(head):
+    """Format and dimensions of an image from its first bytes (pixel data is not decoded)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(head)) as image:
+        return {'format': image.format.lower(), 'width': image.width, 'height': image.height}
+
+
+def derivative_blob_name(key, size, fmt):
+    """Blob name of one rendition, e.g. images/<sha256>/card.webp."""
+    return f"images/{key}/{size}.{DERIVATIVE_FORMATS[fmt][0]}"
+
+
+def _flatten(image):
+    """RGB copy of the image, with transparency composited onto white."""
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_derivatives(source):
+    """Render every rendition of an image given as bytes or a seekable file object.
+
+    Returns a list of (size, fmt, width, height, bytes). Renditions are never
+    upscaled; a small original yields fewer distinct widths.
+    """
+    from PIL import Image, ImageOps
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        source = _flatten(original)
+
+    rendered = []
+    for size, max_width in DERIVATIVE_WIDTHS.items():
+        image = source
+        if source.width > max_width:
+            height = max(1, round(source.height * max_width / source.width))
+            image = source.resize((max_width, height), Image.LANCZOS)
+        for fmt, (_, _, options) in DERIVATIVE_FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt.upper(), **options)
+            rendered.append((size, fmt, image.width, image.height, buffer.getvalue()))
+    return rendered
+
+
+def build_image_map(renditions):
+    """Product-document map of rendition URLs plus ready-made srcset strings.
+
+    `renditions` is a list of (size, fmt, width, height, url).
+    """
+    images = {}
+    srcset = {}
+    for size, fmt, width, height, url in renditions:
+        entry = images.setdefault(size, {'width': width, 'height': height})
+        entry[fmt] = url
+        srcset.setdefault(fmt, {})[width] = url
+    images['srcset'] = {
+        fmt: ', '.join(f"{url} {width}w" for width, url in sorted(by_width.items()))
+        for fmt, by_width in srcset.items()
+    }
+    return images
+
+
+def upload_derivatives(container_client, key, source):
+    """Render and upload every rendition of `source`; returns the product `images` map.
+
+    `key` is the content hash of the original, so rendition blobs never change
+    once written and are uploaded with immutable cache headers.
+    """
+    from azure.storage.blob import ContentSettings
+    renditions = []
+    for size, fmt, width, height, body in render_derivatives(source):
+        blob_client = container_client.get_blob_client(derivative_blob_name(key, size, fmt))
+        blob_client.upload_blob(
+            body, overwrite=True,
+            content_settings=ContentSettings(
+                content_type=DERIVATIVE_FORMATS[fmt][1],
+                cache_control=IMMUTABLE_CACHE_CONTROL,
+            ),
+        )
+        renditions.append((size, fmt, width, height, blob_client.url))
+    return build_image_map(renditions)
@@ -0,0 +1,283 @@
+"""
+Lightweight durable background job queue.
+Jobs are rows in a local SQLite file shared by every gunicorn worker process
+and claimed by worker threads with a lease, so post-request work (image
+renditions, blob cleanup, metadata extraction, snapshot publishing) survives
+restarts. A worker only records the outcome of a job while it still holds the
+lease, so a job reclaimed after its lease expired is not finished twice.
+Failed jobs are retried with exponential backoff and dead-lettered after
+`max_attempts`.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+DEAD = 'dead'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    lease_until REAL,
+    dedupe_key TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status);
+"""
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    return job
+
+
+class JobQueue:
+    """SQLite-backed job queue with in-process worker threads."""
+
+    def __init__(self, path, workers=2, max_attempts=5, backoff=2.0,
+                 lease_seconds=300, poll_interval=1.0, logger=None):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.handlers = {}
+        self._wake = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connect(self):
+        # The file and schema are created on first use, not when the app is imported
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA busy_timeout = 30000')
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _conn(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def register(self, name, handler):
+        """Register `handler(payload)` for jobs called `name`; raising marks the attempt failed."""
+        self.handlers[name] = handler
+
+    def enqueue(self, name, payload=None, delay=0, dedupe_key=None, max_attempts=None):
+        """Queue a job and return its id.
+
+        With `dedupe_key`, a job that is already queued under the same key is
+        reused (its start is pushed back by `delay`), which coalesces bursts.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe_key is not None:
+                row = conn.execute(
+                    'SELECT id FROM jobs WHERE dedupe_key = ? AND status = ?', (dedupe_key, QUEUED)
+                ).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE jobs SET run_at = ?, payload = ?, updated_at = ? WHERE id = ?',
+                                 (now + delay, json.dumps(payload or {}), now, row['id']))
+                    conn.execute('COMMIT')
+                    return row['id']
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                'INSERT INTO jobs (id, name, payload, status, max_attempts, run_at, dedupe_key, created_at, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, name, json.dumps(payload or {}), QUEUED, max_attempts or self.max_attempts,
+                 now + delay, dedupe_key, now, now)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def ensure(self, name, payload=None, delay=0, dedupe_key=None):
+        """Queue a job unless one under `dedupe_key` is already queued or running.
+
+        Unlike `enqueue`, an existing job keeps its start time, which suits
+        recurring jobs that re-queue themselves.
+        """
+        dedupe_key = dedupe_key or name
+        row = self._conn().execute(
+            'SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)', (dedupe_key, QUEUED, RUNNING)
+        ).fetchone()
+        if row is not None:
+            return row['id']
+        return self.enqueue(name, payload, delay=delay, dedupe_key=dedupe_key)
+
+    def get(self, job_id):
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _row_to_job(row)
+
+    def list(self, status=None, limit=50):
+        if status:
+            rows = self._conn().execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?', (status, limit))
+        else:
+            rows = self._conn().execute('SELECT * FROM jobs ORDER BY updated_at DESC LIMIT ?', (limit,))
+        return [_row_to_job(r) for r in rows]
+
+    def stats(self):
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        return {r['status']: r['n'] for r in rows}
+
+    def retry(self, job_id):
+        """Requeue a dead-lettered job with a fresh attempt budget."""
+        now = time.time()
+        cur = self._conn().execute(
+            'UPDATE jobs SET status = ?, attempts = 0, run_at = ?, lease_until = NULL, updated_at = ?'
+            ' WHERE id = ? AND status = ?', (QUEUED, now, now, job_id, DEAD))
+        with self._wake:
+            self._wake.notify()
+        return cur.rowcount == 1
+
+    def purge(self, older_than):
+        """Delete finished jobs last updated more than `older_than` seconds ago."""
+        cur = self._conn().execute('DELETE FROM jobs WHERE status = ? AND updated_at < ?',
+                                   (DONE, time.time() - older_than))
+        return cur.rowcount
+
+    def _claim(self):
+        """Lease the next runnable job (including ones whose lease expired)."""
+        now = time.time()
+        lease_until = now + self.lease_seconds
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE (status = ? AND run_at <= ?) OR (status = ? AND lease_until < ?)'
+                ' ORDER BY run_at LIMIT 1', (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ?'
+                    ' WHERE id = ?', (RUNNING, lease_until, now, row['id']))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        job = _row_to_job(row)
+        job['attempts'] += 1
+        job['status'] = RUNNING
+        job['lease_until'] = lease_until
+        return job
+
+    def _finish(self, job, error=None):
+        """Record a job's outcome; returns False (and changes nothing) if its lease was lost."""
+        now = time.time()
+        held = ' WHERE id = ? AND status = ? AND lease_until = ?'
+        lease = (job['id'], RUNNING, job['lease_until'])
+        if error is None:
+            cur = self._conn().execute(
+                'UPDATE jobs SET status = ?, lease_until = NULL, last_error = NULL, updated_at = ?' + held,
+                (DONE, now) + lease)
+        elif job['attempts'] >= job['max_attempts']:
+            cur = self._conn().execute(
+                'UPDATE jobs SET status = ?, lease_until = NULL, last_error = ?, updated_at = ?' + held,
+                (DEAD, error, now) + lease)
+        else:
+            delay = self.backoff ** job['attempts']
+            cur = self._conn().execute(
+                'UPDATE jobs SET status = ?, run_at = ?, lease_until = NULL, last_error = ?, updated_at = ?' + held,
+                (QUEUED, now + delay, error, now) + lease)
+        if cur.rowcount == 0 and self.logger:
+            self.logger.warning(f"Job {job['name']} {job['id']} lost its lease before finishing; outcome dropped")
+        return cur.rowcount == 1
+
+    def run_pending(self):
+        """Run one runnable job in the calling thread; returns False when none was ready."""
+        job = self._claim()
+        if job is None:
+            return False
+        handler = self.handlers.get(job['name'])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job['name']}")
+            handler(job['payload'])
+        except Exception as e:
+            error = f'{e.__class__.__name__}: {e}'
+            if self.logger:
+                self.logger.warning(f"Job {job['name']} {job['id']} attempt {job['attempts']} failed: {error}")
+            self._finish(job, error + '\n' + traceback.format_exc(limit=5))
+        else:
+            self._finish(job)
+        return True
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                if self.run_pending():
+                    continue
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f'Job worker error: {e}')
+            with self._wake:
+                self._wake.wait(self.poll_interval)
+
+    def start(self):
+        """Start worker threads in this process (restarting them after a fork).
+
+        Returns True when threads were started, False if they were already running.
+        """
+        with self._start_lock:
+            if self._pid == os.getpid() or self.workers <= 0:
+                return False
+            self._pid = os.getpid()
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            return True
+
+    def stop(self, timeout=10):
+        """Stop worker threads, letting running jobs finish for up to `timeout` seconds."""
+        self._stopping = True
+        with self._wake:
+            self._wake.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+        self._pid = None
@@ -0,0 +1,82 @@
+"""
+Fast JSON for Flask responses and request bodies.
+FastJSONProvider (registered as app.json) serializes with orjson when it is
+installed and falls back to the stdlib json module otherwise. Both paths
+produce the same JSON: compact, keys in document order, datetimes as ISO 8601.
+Cosmos DB results (dict/list subclasses, paged iterators), sets, Decimals and
+UUIDs are handled too.
+"""
+import dataclasses
+import decimal
+import uuid
+from collections.abc import Iterable, Mapping
+from datetime import date, datetime, time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def json_default(obj):
+    """Serializable form of values neither orjson nor json handle natively."""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset)) or isinstance(obj, Iterable) and not isinstance(obj, (str, bytes)):
+        # Sets and Cosmos ItemPaged results
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using orjson, with the stdlib as a fallback."""
+
+    default = staticmethod(json_default)
+    sort_keys = False
+    ensure_ascii = False
+
+    def _indent(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self._indent():
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # orjson has no equivalent for other json.dumps arguments (cls, indent=8, ...)
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        if not ORJSON_AVAILABLE:
+            # Same layout as orjson: indented in debug mode, compact otherwise
+            return super().dumps(obj, **({'indent': 2} if self._indent() else {'separators': (',', ':')}))
+        return orjson.dumps(obj, default=json_default, option=self._options()).decode('utf-8')
+
+    def dumpb(self, obj):
+        """Serialize to UTF-8 bytes (what responses are made of)."""
+        if not ORJSON_AVAILABLE:
+            return self.dumps(obj).encode('utf-8')
+        return orjson.dumps(obj, default=json_default, option=self._options())
+
+    def loads(self, s, **kwargs):
+        if not ORJSON_AVAILABLE or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj) + b'\n', mimetype=self.mimetype)
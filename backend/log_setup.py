@@ -0,0 +1,186 @@
+"""
+Logging pipeline.
+Records are filtered and tagged with the request ID on the calling thread,
+then queued to a listener thread that formats them (one JSON object per
+line by default) and writes them out, so log I/O stays off the request
+thread. Repeated DEBUG records from the same call site are rate limited
+(INFO too when opted in), with a count of suppressed records added to the
+next one that gets through. DEBUG records can also be sampled. Levels are set per logger from config,
+e.g. LOG_LEVELS="azure=WARNING,jobs=DEBUG".
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import tracing
+
+# Records waiting for the listener thread; past this they are dropped (and counted)
+DEFAULT_QUEUE_SIZE = 10000
+
+# Loggers that are chatty at INFO (the Azure SDK logs every HTTP request)
+DEFAULT_LEVELS = {'azure': 'WARNING', 'urllib3': 'WARNING'}
+
+# LogRecord attributes that are not extra fields
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def parse_levels(spec):
+    """{'azure': 'WARNING', ...} from "azure=WARNING,jobs=DEBUG"."""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, request ID, message and extra fields."""
+
+    def format(self, record):
+        request_id = getattr(record, 'request_id', '-')
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'requestId': request_id if request_id != '-' else None,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most `limit` records below `max_level` through per call site per `window` seconds."""
+
+    def __init__(self, limit, window=60.0, max_level=logging.DEBUG):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.max_level = max_level
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno > self.max_level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._sites.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.limit:
+                self._sites[key] = (started, count, suppressed + 1)
+                return False
+            self._sites[key] = (started, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keeps a random `rate` fraction of DEBUG records."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """QueueHandler with its own listener thread, restarted in each forked process."""
+
+    def __init__(self, handlers, maxsize=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.targets = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's listener thread does not exist in the child
+        self.queue = queue.Queue(self.maxsize)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def _start(self):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+                self._listener.start()
+
+    def prepare(self, record):
+        # Merge args and render the traceback here; formatting is left to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._listener is None:
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out queued records and stop the listener thread."""
+        with self._listener_lock:
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener = None
+
+
+def configure_logging(level='INFO', levels=None, fmt='json', rate_limit=20, rate_window=60.0,
+                      debug_sample=1.0, stream=None, rate_level='DEBUG'):
+    """Route all logging through one AsyncHandler on the root logger; returns the handler.
+
+    Only records at or below `rate_level` (DEBUG by default) are rate limited
+    per call site.
+    """
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s %(name)s [%(request_id)s]: %(message)s'))
+
+    handler = AsyncHandler([output])
+    handler.addFilter(SampleFilter(debug_sample))
+    handler.addFilter(RateLimitFilter(rate_limit, rate_window, logging.getLevelName(rate_level.upper())))
+    handler.addFilter(tracing.RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, logger_level in {**DEFAULT_LEVELS, **(levels or {})}.items():
+        logging.getLogger(name).setLevel(logger_level)
+    atexit.register(handler.stop)
+    return handler
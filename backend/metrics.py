@@ -0,0 +1,206 @@
+"""
+Request and dependency latency metrics in Prometheus format.
+Every request is timed per route, and calls to Cosmos DB, Blob Storage and
+SQL Server are timed per operation by wrapping their clients (instrument()).
+Both go to histograms served from /metrics. Under gunicorn,
+PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py) makes every worker write
+its samples to a shared directory, and /metrics adds them up across workers.
+Dependency calls are also child spans of the request's trace (tracing.py).
+Without prometheus_client installed, recording is a no-op.
+"""
+import functools
+import os
+import time
+
+import tracing
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# Upper bounds in seconds: fast cache hits up to slow uploads
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Time to produce a response, by route',
+        ('method', 'route', 'status'), buckets=LATENCY_BUCKETS)
+    DEPENDENCY_LATENCY = Histogram(
+        'dependency_call_duration_seconds', 'Time spent in calls to Cosmos DB, Blob Storage and SQL Server',
+        ('dependency', 'operation', 'outcome'), buckets=LATENCY_BUCKETS)
+
+
+def multiprocess_dir():
+    """The shared sample directory when running in multiprocess mode, else None."""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    return path if path and os.path.isdir(path) else None
+
+
+def observe_request(method, route, status, seconds):
+    if PROMETHEUS_AVAILABLE:
+        REQUEST_LATENCY.labels(method, route, str(status)).observe(seconds)
+
+
+def observe_dependency(dependency, operation, seconds, ok=True):
+    if PROMETHEUS_AVAILABLE:
+        DEPENDENCY_LATENCY.labels(dependency, operation, 'ok' if ok else 'error').observe(seconds)
+
+
+def timed(dependency, operation, func, *args, **kwargs):
+    """Call func(*args, **kwargs), recording its latency and whether it raised."""
+    with tracing.span(f'{dependency} {operation}', kind='client', dependency=dependency):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            observe_dependency(dependency, operation, time.perf_counter() - started, ok=False)
+            raise
+        observe_dependency(dependency, operation, time.perf_counter() - started)
+        return result
+
+
+def track(dependency, operation=None):
+    """Decorator form of timed(); the operation defaults to the function name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return timed(dependency, operation or func.__name__, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _TimedIterable:
+    """Lazily paged results (query_items, list_blobs): timed while they are consumed."""
+
+    def __init__(self, iterable, dependency, operation):
+        self._iterable = iterable
+        self._dependency = dependency
+        self._operation = operation
+
+    def __iter__(self):
+        started_ns = time.time_ns()
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield from self._iterable
+            ok = True
+        finally:
+            observe_dependency(self._dependency, self._operation, time.perf_counter() - started, ok)
+            tracing.add_span(f'{self._dependency} {self._operation}', started_ns, kind='client',
+                             error=None if ok else 'failed or not consumed', dependency=self._dependency)
+
+    def __getattr__(self, name):
+        return getattr(self._iterable, name)
+
+
+# Per dependency: methods returning child clients to wrap as well, methods whose
+# results are paged lazily, and (when not None) the only methods that are timed
+DEPENDENCIES = {
+    'cosmos': {
+        'children': {'get_database_client', 'get_container_client',
+                     'create_database_if_not_exists', 'create_container_if_not_exists'},
+        'paged': {'query_items', 'read_all_items', 'query_items_change_feed', 'list_containers'},
+        'timed': None,
+    },
+    'blob': {
+        'children': {'get_container_client', 'get_blob_client'},
+        'paged': {'list_blobs', 'list_blob_names', 'list_containers'},
+        'timed': None,
+    },
+    'sql': {
+        'children': {'cursor'},
+        'paged': set(),
+        'timed': {'execute', 'executemany', 'commit', 'rollback'},
+    },
+}
+
+
+class Instrumented:
+    """Proxy for a dependency client that times its method calls.
+
+    Attributes pass through unchanged; child clients it hands out (a Cosmos
+    container, a blob client, an SQL cursor) are wrapped too, so code using
+    the proxy needs no changes.
+    """
+
+    def __init__(self, target, dependency):
+        self._target = target
+        self._dependency = dependency
+        self._rules = DEPENDENCIES[dependency]
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        rules = self._rules
+        if name in rules['children']:
+            @functools.wraps(attr)
+            def child(*args, **kwargs):
+                # get_*_client only builds an object locally; anything else is a round trip
+                if name.startswith('get_') or name == 'cursor':
+                    result = attr(*args, **kwargs)
+                else:
+                    result = timed(self._dependency, name, attr, *args, **kwargs)
+                return Instrumented(result, self._dependency)
+            return child
+        if name in rules['paged']:
+            @functools.wraps(attr)
+            def paged(*args, **kwargs):
+                return _TimedIterable(attr(*args, **kwargs), self._dependency, name)
+            return paged
+        if rules['timed'] is not None and name not in rules['timed']:
+            return attr
+        return functools.partial(timed, self._dependency, name, attr)
+
+    def __iter__(self):
+        # SQL cursors are iterated for their rows
+        return iter(self._target)
+
+    def __repr__(self):
+        return f'Instrumented({self._target!r})'
+
+
+def instrument(client, dependency):
+    """Wrap a Cosmos DB ('cosmos'), Blob Storage ('blob') or pyodbc ('sql') client."""
+    if client is None or isinstance(client, Instrumented):
+        return client
+    return Instrumented(client, dependency)
+
+
+def instrument_app(app):
+    """Time every request of a Flask app by route (the URL rule, not the raw path)."""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+        return response
+
+
+def render_metrics():
+    """(body, content type) of the Prometheus text exposition, summed across workers."""
+    if not PROMETHEUS_AVAILABLE:
+        return None, None
+    path = multiprocess_dir()
+    if path:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=path)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live samples (gunicorn child_exit hook)."""
+    if PROMETHEUS_AVAILABLE and multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
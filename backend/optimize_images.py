@@ -0,0 +1,140 @@
+"""
+Offline optimizer for the site's bundled images.
+`python optimize_images.py` converts the PNG/JPEG files in assets/images to
+WebP and AVIF at several widths under assets/images/optimized/, and writes
+images.json with the dimensions and variants of every source. The static
+server uses it to answer requests for the originals with the best format
+the browser accepts. Commit the output; unchanged sources are skipped.
+"""
+import hashlib
+import json
+import os
+
+from images import PIL_AVAILABLE
+
+SITE_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+SOURCE_DIR = 'assets/images'
+OUTPUT_DIR = 'assets/images/optimized'
+METADATA_NAME = 'images.json'
+
+SOURCE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+# Output widths in pixels (never upscaled; the original width is always included)
+SITE_IMAGE_WIDTHS = (320, 640, 1280)
+
+# Content type -> (file extension, Pillow format, encoder options), best first
+SITE_IMAGE_FORMATS = {
+    'image/avif': ('avif', 'AVIF', {'quality': 50, 'speed': 4}),
+    'image/webp': ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+}
+
+
+def output_widths(width):
+    """Widths to render for an image `width` pixels wide."""
+    widths = [w for w in SITE_IMAGE_WIDTHS if w < width]
+    widths.append(min(width, SITE_IMAGE_WIDTHS[-1]))
+    return widths
+
+
+def avif_available():
+    """True when Pillow can encode AVIF.
+
+    Checked on demand: listing Pillow's formats loads every plugin, which
+    would slow down importing the app (assets.py imports this module).
+    """
+    if not PIL_AVAILABLE:
+        return False
+    from PIL import Image
+    # AVIF needs Pillow built with libavif or the pillow-avif-plugin package
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    return '.avif' in Image.registered_extensions()
+
+
+def optimize_image(site_root, source, formats):
+    """Render every variant of one source image; returns its metadata entry."""
+    from PIL import Image, ImageOps
+
+    stem = os.path.splitext(os.path.basename(source))[0]
+    with Image.open(os.path.join(site_root, source)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.mode == 'LA' or 'transparency' in image.info else 'RGB')
+
+    variants = {}
+    for width in output_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for content_type in formats:
+            ext, fmt, options = SITE_IMAGE_FORMATS[content_type]
+            path = f"{OUTPUT_DIR}/{stem}-{width}.{ext}"
+            resized.save(os.path.join(site_root, path), format=fmt, **options)
+            variants.setdefault(content_type, []).append({
+                'width': width,
+                'height': height,
+                'path': path,
+                'bytes': os.path.getsize(os.path.join(site_root, path)),
+            })
+    return {'width': image.width, 'height': image.height, 'variants': variants}
+
+
+def optimize_site_images(site_root=SITE_ROOT, force=False):
+    """Optimize every source image whose content changed since the last run; returns the metadata."""
+    os.makedirs(os.path.join(site_root, OUTPUT_DIR), exist_ok=True)
+    metadata_path = os.path.join(site_root, OUTPUT_DIR, METADATA_NAME)
+    try:
+        with open(metadata_path, encoding='utf-8') as f:
+            previous = json.load(f)
+    except (FileNotFoundError, ValueError):
+        previous = {}
+
+    avif = avif_available()
+    formats = [t for t in SITE_IMAGE_FORMATS if t != 'image/avif' or avif]
+    metadata = {}
+    for name in sorted(os.listdir(os.path.join(site_root, SOURCE_DIR))):
+        source = f'{SOURCE_DIR}/{name}'
+        if os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+            continue
+        with open(os.path.join(site_root, source), 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        entry = previous.get(source)
+        if not force and entry and entry.get('sha256') == digest and set(entry['variants']) == set(formats):
+            metadata[source] = entry
+            continue
+        entry = optimize_image(site_root, source, formats)
+        entry['sha256'] = digest
+        entry['bytes'] = os.path.getsize(os.path.join(site_root, source))
+        metadata[source] = entry
+
+    # Drop outputs of sources that were removed or renamed
+    current = {v['path'] for entry in metadata.values() for vs in entry['variants'].values() for v in vs}
+    for name in os.listdir(os.path.join(site_root, OUTPUT_DIR)):
+        if name != METADATA_NAME and f'{OUTPUT_DIR}/{name}' not in current:
+            os.remove(os.path.join(site_root, OUTPUT_DIR, name))
+
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    return metadata
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert bundled site images to WebP/AVIF at several widths.')
+    parser.add_argument('--force', action='store_true', help='re-encode every image, not only changed ones')
+    args = parser.parse_args()
+    if not PIL_AVAILABLE:
+        raise SystemExit('Pillow is required: pip install Pillow')
+
+    metadata = optimize_site_images(force=args.force)
+    original = sum(entry['bytes'] for entry in metadata.values())
+    for content_type in SITE_IMAGE_FORMATS:
+        largest = sum(entry['variants'][content_type][-1]['bytes']
+                      for entry in metadata.values() if content_type in entry['variants'])
+        if largest:
+            print(f'{content_type}: {largest} bytes at full width vs {original} bytes of originals')
+    if not avif_available():
+        print('AVIF encoder not available (pip install pillow-avif-plugin) - WebP only')
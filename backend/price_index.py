@@ -0,0 +1,171 @@
+"""
+Sorted price index over the product catalog.
+Serves price-range filtering (bisect lookups), price/newest ordering and
+price histograms for slider UIs without querying Cosmos DB. Products are also
+kept in creation order, so 'newest' over most of the catalog needs no sort.
+"""
+import bisect
+import threading
+
+SORT_OPTIONS = ('newest', 'price_asc', 'price_desc')
+
+HISTOGRAM_BUCKETS = 10
+
+# Histograms remembered per filter set (see PriceIndex.query); cleared when full
+HISTOGRAM_CACHE_ENTRIES = 256
+
+# 'newest' walks the whole date order instead of sorting the selection once the
+# selection holds more than this fraction of the catalog
+NEWEST_WALK_FRACTION = 0.25
+
+
+def product_created(product):
+    """Sortable creation time of a product document ('' when missing)."""
+    return product.get('createdAt') or ''
+
+
+def product_price(product):
+    """Numeric price of a product document (0 when missing or malformed)."""
+    try:
+        return float(product.get('price') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PriceIndex:
+    """Product ids kept in ascending price order with a parallel price array for bisect."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.docs = {}        # product id -> product document
+        self._entries = []    # sorted (price, product id)
+        self._prices = []     # prices parallel to _entries
+        self._by_date = []    # sorted (createdAt, product id)
+        self._version = 0     # bumped on every change; validates cached histograms
+        self._histograms = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def rebuild(self, products):
+        """Replace the whole index with the given product documents."""
+        with self._lock:
+            self.docs = {p['id']: p for p in products}
+            self._entries = sorted((product_price(p), pid) for pid, p in self.docs.items())
+            self._prices = [price for price, _ in self._entries]
+            self._by_date = sorted((product_created(p), pid) for pid, p in self.docs.items())
+            self._version += 1
+
+    def upsert(self, product):
+        """Add or move a single product."""
+        with self._lock:
+            self._remove(product['id'])
+            entry = (product_price(product), product['id'])
+            pos = bisect.bisect_left(self._entries, entry)
+            self._entries.insert(pos, entry)
+            self._prices.insert(pos, entry[0])
+            bisect.insort(self._by_date, (product_created(product), product['id']))
+            self.docs[product['id']] = product
+            self._version += 1
+
+    def remove(self, product_id):
+        """Drop a product from the index."""
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        product = self.docs.pop(product_id, None)
+        if product is None:
+            return
+        self._version += 1
+        pos = bisect.bisect_left(self._entries, (product_price(product), product_id))
+        if pos < len(self._entries) and self._entries[pos][1] == product_id:
+            del self._entries[pos]
+            del self._prices[pos]
+        entry = (product_created(product), product_id)
+        pos = bisect.bisect_left(self._by_date, entry)
+        if pos < len(self._by_date) and self._by_date[pos] == entry:
+            del self._by_date[pos]
+
+    def _slice(self, min_price=None, max_price=None):
+        lo = 0 if min_price is None else bisect.bisect_left(self._prices, min_price)
+        hi = len(self._prices) if max_price is None else bisect.bisect_right(self._prices, max_price)
+        return self._entries[lo:hi]
+
+    def query(self, min_price=None, max_price=None, sort='newest', matches=None, histogram_key=None):
+        """Products in [min_price, max_price] passing `matches`, in the requested order.
+
+        Returns (products, histogram). The price range is bisected first and
+        `matches` only runs on that slice. The histogram covers every product
+        passing `matches` regardless of the price bounds, so a slider can show
+        the full range. With bounds set that takes a pass over the catalog, so
+        it is cached under `histogram_key` (which must identify `matches`)
+        until the index changes.
+        """
+        with self._lock:
+            selected = self._slice(min_price, max_price)
+            if matches is not None:
+                selected = [e for e in selected if matches(self.docs[e[1]])]
+            if min_price is None and max_price is None:
+                histogram = price_histogram([price for price, _ in selected])
+            else:
+                histogram = self._histogram(matches, histogram_key)
+
+            if sort == 'newest':
+                products = self._newest(selected)
+            else:
+                products = [self.docs[pid] for _, pid in selected]
+
+        if sort == 'price_desc':
+            products.reverse()
+        return products, histogram
+
+    def _histogram(self, matches, key):
+        if matches is None:
+            key = ()
+        cached = self._histograms.get(key) if key is not None else None
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        histogram = price_histogram([price for price, pid in self._entries
+                                     if matches is None or matches(self.docs[pid])])
+        if key is not None:
+            if len(self._histograms) >= HISTOGRAM_CACHE_ENTRIES:
+                self._histograms.clear()
+            self._histograms[key] = (self._version, histogram)
+        return histogram
+
+    def _newest(self, selected):
+        """Documents of `selected` entries, newest first."""
+        if len(selected) > len(self._by_date) * NEWEST_WALK_FRACTION:
+            # Most of the catalog: read it in date order rather than sorting
+            ids = {pid for _, pid in selected}
+            return [self.docs[pid] for _, pid in reversed(self._by_date) if pid in ids]
+        products = [self.docs[pid] for _, pid in selected]
+        products.sort(key=lambda p: (product_created(p), p['id']), reverse=True)
+        return products
+
+
+def price_histogram(prices, buckets=HISTOGRAM_BUCKETS):
+    """Equal-width histogram over an ascending list of prices."""
+    if not prices:
+        return {'min': None, 'max': None, 'buckets': []}
+    low, high = prices[0], prices[-1]
+    if high == low:
+        return {'min': low, 'max': high, 'buckets': [{'min': low, 'max': high, 'count': len(prices)}]}
+    width = (high - low) / buckets
+    edges = [low + width * i for i in range(buckets)] + [high]
+    counts = []
+    start = 0
+    for i in range(buckets):
+        # Last bucket is closed on the right so the maximum price is counted
+        end = len(prices) if i == buckets - 1 else bisect.bisect_left(prices, edges[i + 1], start)
+        counts.append(end - start)
+        start = end
+    return {
+        'min': low,
+        'max': high,
+        'buckets': [
+            {'min': round(edges[i], 2), 'max': round(edges[i + 1], 2), 'count': counts[i]}
+            for i in range(buckets)
+        ],
+    }
@@ -0,0 +1,234 @@
+"""
+Token-bucket rate limiting.
+A Limit of "5/300" allows a burst of 5 requests and refills one token every
+60 seconds (5 per 300 s). RateLimiter checks a request against several named
+buckets at once, e.g. one per client IP and one per target email. The request
+is let through only when every bucket has a token, and takes one from each
+in the same atomic step. Otherwise it gets the seconds until it may retry,
+and no bucket is charged. A token can be refunded once the outcome is known,
+so only some outcomes (e.g. failed logins) count against a bucket; taking it
+first means concurrent requests cannot all pass on the same token.
+
+Buckets live in a store:
+- MemoryStore keeps them in the worker process.
+- SQLiteStore keeps them in a file shared by every gunicorn worker on the host,
+  like the job queue.
+Any object with the same acquire() and refund() methods (e.g. one backed by
+Redis) can be plugged in instead.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    full_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rate_buckets_full ON rate_buckets (full_at);
+"""
+
+
+class Limit:
+    """`capacity` requests per `period` seconds, with bursts of up to `capacity`."""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def __repr__(self):
+        return f'Limit({self.capacity}/{self.period:g}s)'
+
+
+def parse_limit(value):
+    """Limit from "requests/seconds" (e.g. "5/300"), or None for "0" or ""."""
+    value = (value or '').strip()
+    if value in ('', '0'):
+        return None
+    capacity, _, period = value.partition('/')
+    capacity, period = int(capacity), float(period or 1)
+    if capacity <= 0 or period <= 0:
+        return None
+    return Limit(capacity, period)
+
+
+def client_address(remote_addr, forwarded_for=None, trusted_proxies=0):
+    """The client's IP address, taken from X-Forwarded-For behind `trusted_proxies` proxies.
+
+    Each trusted proxy appends the address it saw, so the client is the entry
+    that many places from the right; entries to its left can be forged.
+    App Service appends "ip:port", so ports are dropped.
+    """
+    address = remote_addr
+    hops = [hop.strip() for hop in (forwarded_for or '').split(',') if hop.strip()]
+    if trusted_proxies > 0 and len(hops) >= trusted_proxies:
+        address = hops[-trusted_proxies]
+    if address and address.startswith('['):
+        return address[1:].partition(']')[0]
+    if address and address.count(':') == 1:
+        return address.partition(':')[0]
+    return address
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    """Tokens after refilling a bucket last updated at `updated`."""
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryStore:
+    """Buckets in this process, least recently used dropped past `max_keys`."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, buckets, now=None):
+        """Take a token from each (key, capacity, rate) bucket if all have one.
+
+        Returns 0 when taken, else the seconds until they would all have one.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = []
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels.append(_refill(tokens, updated, capacity, rate, now))
+            retry_after = max([(1 - tokens) / rate for tokens, (_, _, rate) in zip(levels, buckets)] + [0.0])
+            if retry_after > 0:
+                return retry_after
+            for tokens, (key, _, _) in zip(levels, buckets):
+                self._buckets[key] = (tokens - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+    def refund(self, buckets, now=None):
+        """Give a token back to each (key, capacity, rate) bucket, up to its capacity."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for key, capacity, rate in buckets:
+                if key in self._buckets:
+                    tokens, updated = self._buckets[key]
+                    self._buckets[key] = (min(capacity, _refill(tokens, updated, capacity, rate, now) + 1), now)
+
+
+class SQLiteStore:
+    """Buckets in a SQLite file shared by the worker processes on a host."""
+
+    # Full buckets are deleted on every this many acquires
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        self._schema_ready = False
+
+    def _connect(self):
+        # The file and schema are created on first use, not when the app is imported
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 5000')
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _conn(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def acquire(self, buckets, now=None):
+        """Take a token from each (key, capacity, rate) bucket if all have one.
+
+        Returns 0 when taken, else the seconds until they would all have one.
+        """
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, capacity, rate in buckets:
+                row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+                tokens, updated = row or (capacity, now)
+                levels.append(_refill(tokens, updated, capacity, rate, now))
+            retry_after = max([(1 - tokens) / rate for tokens, (_, _, rate) in zip(levels, buckets)] + [0.0])
+            if retry_after <= 0:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                    [(key, tokens - 1, now, now + (capacity - tokens + 1) / rate)
+                     for tokens, (key, capacity, rate) in zip(levels, buckets)])
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM rate_buckets WHERE full_at < ?', (now,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return max(retry_after, 0.0)
+
+    def refund(self, buckets, now=None):
+        """Give a token back to each (key, capacity, rate) bucket, up to its capacity."""
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for key, capacity, rate in buckets:
+                row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    continue
+                tokens = min(capacity, _refill(row[0], row[1], capacity, rate, now) + 1)
+                conn.execute('UPDATE rate_buckets SET tokens = ?, updated = ?, full_at = ? WHERE key = ?',
+                             (tokens, now, now + (capacity - tokens) / rate, key))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+class RateLimiter:
+    """Named limits checked together against a store."""
+
+    def __init__(self, store, limits):
+        self.store = store
+        self.limits = {name: limit for name, limit in limits.items() if limit is not None}
+
+    def check(self, *keys):
+        """Seconds until a request may retry (0 = allowed and charged) for (limit name, key) pairs.
+
+        Pairs whose limit is disabled or whose key is empty are ignored. Keys
+        are hashed, so stores never hold addresses or emails.
+        """
+        buckets = self._buckets(keys)
+        if not buckets:
+            return 0.0
+        return self.store.acquire(buckets)
+
+    def refund(self, *keys):
+        """Give back the tokens a check() took for (limit name, key) pairs."""
+        buckets = self._buckets(keys)
+        if buckets:
+            self.store.refund(buckets)
+
+    def _buckets(self, keys):
+        buckets = []
+        for name, key in keys:
+            limit = self.limits.get(name)
+            if limit is None or not key:
+                continue
+            digest = hashlib.sha256(f'{name}\0{key}'.encode('utf-8')).hexdigest()[:32]
+            buckets.append((f'{name}:{digest}', limit.capacity, limit.rate))
+        return buckets
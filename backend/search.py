@@ -0,0 +1,504 @@
+"""
+In-process full-text search over the product catalog.
+Inverted index with BM25 ranking plus a prefix trie for as-you-type suggestions.
+Everything lives in worker memory so queries never touch Cosmos DB.
+"""
+import bisect
+import functools
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+
+# Fields indexed for each product document, with a per-field term weight
+INDEXED_FIELDS = {
+    'itemName': 3,
+    'subCategory': 2,
+    'categories': 2,
+    'description': 1,
+    'ageGroups': 1,
+    'seasons': 1,
+    'occasions': 1,
+}
+
+# BM25 tuning constants
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Cached impact lists (one per query term or group of alternative terms) and result counts
+IMPACT_CACHE_SIZE = 1024
+# Ranks the threshold algorithm walks before scoring the remaining contenders directly
+MAX_THRESHOLD_DEPTH = 3000
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'for', 'in', 'is', 'it', 'of', 'on', 'or',
+    'the', 'to', 'with', 'by', 'at', 'as', 'be', 'this', 'that',
+}
+
+# Multi-word apparel phrases collapsed to a single token before splitting
+PHRASES = (
+    (re.compile(r"\bt[\s\-]?shirts?\b"), 'tshirt'),
+    (re.compile(r"\bnight[\s\-]?suits?\b"), 'nightsuit'),
+    (re.compile(r"\btrack[\s\-]?suits?\b"), 'tracksuit'),
+    (re.compile(r"\bswim[\s\-]?wear\b"), 'swimwear'),
+    (re.compile(r"\bfoot[\s\-]?wear\b"), 'footwear'),
+    (re.compile(r"\bbody[\s\-]?suits?\b"), 'bodysuit'),
+)
+# Text without these cannot contain a phrase
+PHRASE_HINT_RE = re.compile(r"shirt|suit|wear")
+
+# Apparel synonyms mapped onto the canonical stem
+SYNONYMS = {
+    'tee': 'tshirt',
+    'top': 'tshirt',
+    'pyjama': 'pajama',
+    'trouser': 'pant',
+    'jogger': 'pant',
+    'frock': 'dress',
+    'gown': 'dress',
+    'onesie': 'romper',
+    'sneaker': 'shoe',
+    'trainer': 'shoe',
+    'cap': 'hat',
+    'infant': 'baby',
+    'newborn': 'baby',
+}
+
+# Words that the suffix rules would mangle
+STEM_EXCEPTIONS = {
+    'dress': 'dress',
+    'dresses': 'dress',
+    'shorts': 'short',
+    'jeans': 'jean',
+    'pants': 'pant',
+    'leggings': 'legging',
+    'tights': 'tight',
+    'clothes': 'cloth',
+    'clothing': 'cloth',
+    'kids': 'kid',
+    'children': 'kid',
+    'child': 'kid',
+    'accessories': 'accessory',
+    'glass': 'glass',
+    'glasses': 'glass',
+    'bus': 'bus',
+    'casual': 'casual',
+    'formal': 'formal',
+    'traditional': 'traditional',
+    'wear': 'wear',
+    'swimwear': 'swimwear',
+    'footwear': 'footwear',
+    'spring': 'spring',
+    'evening': 'evening',
+    'wedding': 'wedding',
+    'legging': 'legging',
+    'sleeping': 'sleep',
+}
+
+
+@functools.lru_cache(maxsize=65536)
+def stem(word):
+    """Light suffix-stripping stemmer tuned for apparel vocabulary."""
+    if word in STEM_EXCEPTIONS:
+        word = STEM_EXCEPTIONS[word]
+    elif len(word) > 4 and word.endswith('ies'):
+        word = word[:-3] + 'y'
+    elif len(word) > 4 and word.endswith(('ches', 'shes', 'xes', 'sses')):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+    elif len(word) > 5 and word.endswith('ing'):
+        word = word[:-3]
+    elif len(word) > 4 and word.endswith('ed'):
+        word = word[:-2]
+    return SYNONYMS.get(word, word)
+
+
+def words(text):
+    """Split text into lower-cased surface words (phrases collapsed, stopwords dropped)."""
+    text = text.lower()
+    if PHRASE_HINT_RE.search(text):
+        for pattern, replacement in PHRASES:
+            text = pattern.sub(replacement, text)
+    return [w for w in TOKEN_RE.findall(text) if w not in STOPWORDS]
+
+
+def tokenize(text):
+    """Tokenize and stem text into index terms."""
+    return [stem(w) for w in words(text)]
+
+
+def _field_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ' '.join(str(v) for v in value if v is not None)
+    return str(value)
+
+
+class PrefixTrie:
+    """Trie of surface words with document counts for ranked completions."""
+
+    def __init__(self):
+        self.root = {}
+        self.counts = {}
+
+    def add(self, word, delta=1):
+        count = self.counts.get(word, 0) + delta
+        if count > 0:
+            # The trie only changes when a word first appears or last disappears
+            if word not in self.counts:
+                node = self.root
+                for ch in word:
+                    node = node.setdefault(ch, {})
+                node['$'] = True
+            self.counts[word] = count
+        elif word in self.counts:
+            del self.counts[word]
+            node = self.root
+            for ch in word:
+                node = node.get(ch)
+                if node is None:
+                    return
+            node.pop('$', None)
+
+    def complete(self, prefix, limit=8, max_visit=2000):
+        """Return up to `limit` words starting with `prefix`, most frequent first."""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        found = []
+        stack = [(prefix, node)]
+        visited = 0
+        while stack and visited < max_visit:
+            word, node = stack.pop()
+            visited += 1
+            for ch, child in node.items():
+                if ch == '$':
+                    found.append((self.counts[word], word))
+                else:
+                    stack.append((word + ch, child))
+        return [w for _, w in heapq.nlargest(limit, found, key=lambda f: (f[0], -len(f[1])))]
+
+
+def _threshold_top_k(impacts, k, max_depth=MAX_THRESHOLD_DEPTH):
+    """Exact top k of summed per-group impacts, best first (ties broken by product id).
+
+    Fagin's threshold algorithm: rankings are walked in lock-step and the walk
+    stops once the k-th best score beats anything still unseen, so common terms
+    rarely require scoring every matching product. Flat score distributions can
+    push that point deep. After `max_depth` ranks, the walk gives way to a
+    direct scan of one ranking's prefix. An unseen product scores at most the
+    current rank's score in every other group, so to reach the k-th best score
+    it needs a known minimum in each group. Only the shortest ranking prefix
+    above that minimum is scored.
+    """
+    lookups = [entry.scores.get for entry in impacts]
+    heap = []
+    seen = set()
+
+    def consider(product_id):
+        seen.add(product_id)
+        score = 0.0
+        for lookup in lookups:
+            score += lookup(product_id, 0.0)
+        if len(heap) < k:
+            heapq.heappush(heap, (score, product_id))
+        elif (score, product_id) > heap[0]:
+            heapq.heapreplace(heap, (score, product_id))
+
+    depth = 0
+    while True:
+        # Every product not seen yet is at or below `depth` in each ranking
+        bounds = [-entry.negated[depth] if depth < len(entry.ranked) else 0.0 for entry in impacts]
+        threshold = 0.0
+        for bound in bounds:
+            threshold += bound
+        if not threshold or (len(heap) >= k and heap[0][0] > threshold):
+            # Strictly above: an unseen product could still tie and win on its id
+            break
+        if depth >= max_depth:
+            floor = heap[0][0] if len(heap) >= k else 0.0
+            margin = 1e-9 * threshold
+            candidates = None
+            for entry, bound in zip(impacts, bounds):
+                needed = floor - (threshold - bound) - margin
+                if needed > 0:
+                    prefix = entry.ranked[depth:bisect.bisect_right(entry.negated, -needed)]
+                    if candidates is None or len(prefix) < len(candidates):
+                        candidates = prefix
+            if candidates is None:
+                candidates = [pid for entry in impacts for pid in entry.ranked[depth:]]
+            for product_id in candidates:
+                if product_id not in seen:
+                    consider(product_id)
+            break
+        for entry in impacts:
+            if depth < len(entry.ranked):
+                product_id = entry.ranked[depth]
+                if product_id not in seen:
+                    consider(product_id)
+        depth += 1
+    return [(pid, score) for score, pid in sorted(heap, reverse=True)]
+
+
+def _idf(n_docs, df):
+    return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+class _Impacts:
+    """BM25 scores of one term, or the best of alternative terms, for each matching product.
+
+    `stats` are the collection statistics the scores were computed with
+    (document count, total length, the terms' document frequencies). `ranked`
+    lists product ids by descending score and `negated` their negated scores
+    (ascending), so writes can move a single product with bisect instead of
+    re-sorting.
+    """
+
+    __slots__ = ('terms', 'stats', 'avg_len', 'idfs', 'scores', 'ranked', 'negated')
+
+    def __init__(self, terms, stats):
+        n_docs, total_len, dfs = stats
+        self.terms = terms
+        self.stats = stats
+        self.avg_len = total_len / n_docs
+        self.idfs = tuple(_idf(n_docs, df) for df in dfs)
+        self.scores = {}
+        self.ranked = []
+        self.negated = []
+
+    def move(self, product_id, score):
+        """Set (or with None, drop) one product's score, keeping the ranking sorted."""
+        old = self.scores.pop(product_id, None)
+        if old is not None:
+            lo = bisect.bisect_left(self.negated, -old)
+            i = self.ranked.index(product_id, lo, bisect.bisect_right(self.negated, -old, lo))
+            del self.ranked[i]
+            del self.negated[i]
+        if score is not None:
+            self.scores[product_id] = score
+            i = bisect.bisect_right(self.negated, -score)
+            self.negated.insert(i, -score)
+            self.ranked.insert(i, product_id)
+
+    def score(self, doc_terms, doc_len):
+        """Score of a product with these weighted term frequencies, or None if it does not match."""
+        best = None
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / self.avg_len)
+        for term, idf in zip(self.terms, self.idfs):
+            tf = doc_terms.get(term)
+            if tf:
+                score = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                if best is None or score > best:
+                    best = score
+        return best
+
+
+class SearchIndex:
+    """Incrementally maintained BM25 inverted index over product documents."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.docs = {}          # product id -> product document
+        self._postings = {}     # term -> {product id: weighted term frequency}
+        self._doc_terms = {}    # product id -> {term: weighted term frequency}
+        self._doc_words = {}    # product id -> set of surface words (for the trie)
+        self._doc_len = {}      # product id -> weighted document length
+        self._total_len = 0
+        self._impacts = OrderedDict()   # sorted term tuple -> _Impacts, least recently used first
+        self._impact_keys = {}          # term -> keys of the cached impacts that include it
+        self._totals = OrderedDict()    # impact keys of a query -> number of matching products
+        self.trie = PrefixTrie()
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, products):
+        """New index over the given product documents (the caller swaps it in)."""
+        index = cls()
+        for product in products:
+            index._add(product)
+        return index
+
+    def upsert(self, product):
+        """Add or re-index a single product document."""
+        with self._lock:
+            touched = self._remove(product['id']) | self._add(product)
+            self._update_impacts(product['id'], touched)
+
+    def remove(self, product_id):
+        """Drop a product from the index."""
+        with self._lock:
+            self._update_impacts(product_id, self._remove(product_id))
+
+    def _add(self, product):
+        """Index a product; returns its terms."""
+        product_id = product['id']
+        terms = {}
+        surface = set()
+        length = 0
+        for field, weight in INDEXED_FIELDS.items():
+            for word in words(_field_text(product.get(field))):
+                surface.add(word)
+                term = stem(word)
+                terms[term] = terms.get(term, 0) + weight
+                length += weight
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[product_id] = tf
+        for word in surface:
+            self.trie.add(word)
+        self.docs[product_id] = product
+        self._doc_terms[product_id] = terms
+        self._doc_words[product_id] = surface
+        self._doc_len[product_id] = length
+        self._total_len += length
+        return terms.keys()
+
+    def _remove(self, product_id):
+        """Unindex a product; returns the terms it had."""
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return set()
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self._postings[term]
+        for word in self._doc_words.pop(product_id, ()):
+            self.trie.add(word, -1)
+        self._total_len -= self._doc_len.pop(product_id, 0)
+        self.docs.pop(product_id, None)
+        return set(terms)
+
+    def _update_impacts(self, product_id, terms):
+        """Re-score one written product in the cached impacts of the terms it had or has.
+
+        Only possible while the write left the entry's statistics unchanged;
+        otherwise the entry is dropped.
+        """
+        keys = set()
+        for term in terms:
+            keys.update(self._impact_keys.get(term, ()))
+        doc_terms = self._doc_terms.get(product_id)
+        for key in keys:
+            entry = self._impacts[key]
+            if entry.stats != self._stats(key):
+                # Every score changed with the statistics: re-scored on its next use
+                self._drop_impacts(key)
+            else:
+                entry.move(product_id, entry.score(doc_terms, self._doc_len[product_id]) if doc_terms else None)
+        if terms:
+            for key in [key for key, (_, key_terms) in self._totals.items() if not key_terms.isdisjoint(terms)]:
+                del self._totals[key]
+
+    def _stats(self, terms):
+        """Collection statistics BM25 scores of `terms` depend on; equal stats mean equal scores."""
+        return len(self.docs), self._total_len, tuple(len(self._postings.get(term, ())) for term in terms)
+
+    def _drop_impacts(self, key):
+        self._impacts.pop(key)
+        for term in key:
+            keys = self._impact_keys.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._impact_keys[term]
+
+    def _group_impacts(self, terms):
+        """Impacts of alternative terms (a word and its completions): the best score wins.
+
+        Cached per group and kept up to date on writes; None when nothing matches.
+        """
+        key = tuple(sorted(terms))
+        stats = self._stats(key)
+        entry = self._impacts.get(key)
+        if entry is not None:
+            # Writes keep an entry's rankings current while the statistics are unchanged
+            # (edits that keep lengths and term counts); anything else re-scores it
+            if entry.stats == stats:
+                self._impacts.move_to_end(key)
+                return entry if entry.scores else None
+            self._drop_impacts(key)
+        if not any(term in self._postings for term in key):
+            return None
+
+        entry = _Impacts(key, stats)
+        scores = entry.scores
+        doc_len = self._doc_len
+        avg_len = entry.avg_len
+        for term, idf in zip(key, entry.idfs):
+            for product_id, tf in self._postings.get(term, {}).items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[product_id] / avg_len)
+                score = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                if score > scores.get(product_id, 0):
+                    scores[product_id] = score
+        entry.ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        entry.negated = [-scores[product_id] for product_id in entry.ranked]
+
+        self._impacts[key] = entry
+        for term in key:
+            self._impact_keys.setdefault(term, set()).add(key)
+        while len(self._impacts) > IMPACT_CACHE_SIZE:
+            self._drop_impacts(next(iter(self._impacts)))
+        return entry
+
+    def _total(self, impacts):
+        """Number of products matching any of the groups, cached until a write touches their terms."""
+        key = tuple(entry.terms for entry in impacts)
+        cached = self._totals.get(key)
+        if cached is not None:
+            self._totals.move_to_end(key)
+            return cached[0]
+        total = len(set().union(*(entry.scores for entry in impacts)))
+        self._totals[key] = (total, frozenset(term for entry in impacts for term in entry.terms))
+        while len(self._totals) > IMPACT_CACHE_SIZE:
+            self._totals.popitem(last=False)
+        return total
+
+    def search(self, query, limit=20, offset=0):
+        """Rank products for `query` with BM25; the last query word also matches as a prefix."""
+        query_words = words(query)
+        if not query_words:
+            return 0, []
+        with self._lock:
+            if not self.docs:
+                return 0, []
+
+            # Complete the word being typed so "dre" already finds dresses
+            term_groups = [{stem(w)} for w in query_words[:-1]]
+            last = query_words[-1]
+            expansions = {stem(last)}
+            expansions.update(stem(w) for w in self.trie.complete(last, limit=5))
+            term_groups.append(expansions)
+
+            impacts = [i for i in (self._group_impacts(group) for group in term_groups) if i]
+            if not impacts:
+                return 0, []
+
+            if len(impacts) == 1:
+                # Single term group: the cached ranking already is the answer
+                entry = impacts[0]
+                total = len(entry.ranked)
+                top = [(pid, entry.scores[pid]) for pid in entry.ranked[offset:offset + limit]]
+            else:
+                total = self._total(impacts)
+                top = _threshold_top_k(impacts, offset + limit)[offset:]
+            return total, [dict(self.docs[pid], score=round(score, 4)) for pid, score in top]
+
+    def suggest(self, prefix, limit=8):
+        """As-you-type completions for the last word of `prefix`."""
+        typed = words(prefix)
+        if not typed or prefix[-1:].isspace():
+            return []
+        head = ' '.join(typed[:-1])
+        with self._lock:
+            completions = self.trie.complete(typed[-1], limit=limit)
+        return [f"{head} {c}".strip() for c in completions]
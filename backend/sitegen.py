@@ -0,0 +1,192 @@
+"""
+Static site generator for the GitHub Pages storefront.
+`python sitegen.py` reads the catalog once and writes a publishable copy of
+the site to _site/: the static pages and assets, a fully rendered shop page
+per category (shop.html for everything, shop-<slug>.html per category, with
+the products inlined for shop.js), the data/ JSON shards from snapshot.py and
+a sitemap.xml. Rebuilds are incremental: a category page is only re-rendered
+when its products (or the templates) changed since the previous build.
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from markupsafe import Markup
+
+from assets import SOURCE_ROOT, asset_sources, write_if_changed
+from snapshot import LocalDirectoryPublisher, category_slug, compact_product, publish_snapshot
+from storefront import FILTER_GROUPS, SUBCATEGORIES, filter_products, inline_json, shop_filters
+
+DEFAULT_OUT_DIR = os.path.join(SOURCE_ROOT, '_site')
+STATE_NAME = '.sitegen.json'
+
+# Pages that belong in the sitemap (admin and account pages are left out)
+PUBLIC_PAGES = ('index.html', 'catalog.html', 'about.html', 'contact.html', 'privacy.html', 'terms.html')
+
+# Site files copied as they are, besides the pipeline's assets
+EXTRA_FILES = ('CNAME',)
+
+# The root shop.html (served by GitHub Pages and as the app's fallback) is rendered from the template
+CLIENT_PAGE_NAME = 'shop.html'
+CLIENT_PAGE_NOTE = 'Generated from backend/templates/shop.html by `python sitegen.py --shop-page`; edit the template.'
+
+
+class _NoArgs(dict):
+    def getlist(self, name):
+        return []
+
+
+def category_page_name(category):
+    return f'shop-{category_slug(category)}.html' if category else 'shop.html'
+
+
+def template_version(env):
+    """Hash of the shop templates, so template edits re-render every page."""
+    sha = hashlib.sha256()
+    for name in ('base.html', 'shop.html', '_product_grid.html'):
+        source, _, _ = env.loader.get_source(env, name)
+        sha.update(source.encode('utf-8'))
+    return sha.hexdigest()[:12]
+
+
+def render_category_page(env, category, products):
+    """Static shop page for one category (None for all products)."""
+    asset_url = lambda path: path  # noqa: E731 - published next to the pages, unfingerprinted
+    filters = shop_filters(_NoArgs(category=category or ''))
+    grid = env.get_template('_product_grid.html').render(
+        products=filter_products(products, filters), asset_url=asset_url)
+    return env.get_template('shop.html').render(
+        category=category,
+        subcategories=SUBCATEGORIES.get(category, []),
+        filter_groups=FILTER_GROUPS,
+        selected=dict(filters),
+        grid=Markup(grid),
+        catalog_data=inline_json(products),
+        rendered='static',
+        asset_url=asset_url,
+    )
+
+
+def render_client_page(env):
+    """Shop page without products, for shop.js to load them: the repo root's shop.html."""
+    html = env.get_template('shop.html').render(
+        category=None,
+        subcategories=[],
+        filter_groups=FILTER_GROUPS,
+        selected={name: () for name, _, _ in FILTER_GROUPS},
+        grid=None,
+        catalog_data=None,
+        asset_url=lambda path: path,
+    )
+    return html + f'\n<!-- {CLIENT_PAGE_NOTE} -->\n'
+
+
+def build_sitemap(base_url, pages):
+    """sitemap.xml for {page name: last modification date}."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for name, lastmod in sorted(pages.items()):
+        path = '' if name == 'index.html' else name
+        lines.append(f'  <url><loc>{escape(base_url.rstrip("/") + "/" + path)}</loc>'
+                     f'<lastmod>{lastmod}</lastmod></url>')
+    lines.append('</urlset>')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def build_site(products, env, out_dir=DEFAULT_OUT_DIR, site_root=SOURCE_ROOT, base_url=None, force=False):
+    """Write the static storefront to `out_dir`; returns a report of what changed."""
+    state_path = os.path.join(out_dir, STATE_NAME)
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    previous_pages = state.get('pages', {})
+    today = datetime.now(timezone.utc).date().isoformat()
+    report = {'copied': 0, 'rendered': [], 'unchanged': 0, 'removed': []}
+
+    # Static pages and assets
+    sources = [name for name in sorted(os.listdir(site_root)) if name.endswith('.html') and name != CLIENT_PAGE_NAME]
+    sources += asset_sources(site_root)
+    sources += [name for name in EXTRA_FILES if os.path.exists(os.path.join(site_root, name))]
+    for source in sources:
+        with open(os.path.join(site_root, source), 'rb') as f:
+            report['copied'] += write_if_changed(os.path.join(out_dir, source), f.read())
+
+    # One page per category, re-rendered only when its products or the templates changed
+    compact = sorted((compact_product(p) for p in products), key=lambda p: p.get('createdAt') or '', reverse=True)
+    by_category = {None: compact}
+    for p in compact:
+        for category in p['categories']:
+            by_category.setdefault(category, []).append(p)
+    templates = template_version(env)
+    pages = {}
+    for category, items in sorted(by_category.items(), key=lambda kv: kv[0] or ''):
+        name = category_page_name(category)
+        digest = hashlib.sha256((templates + json.dumps(items, sort_keys=True)).encode('utf-8')).hexdigest()
+        previous = previous_pages.get(name, {})
+        path = os.path.join(out_dir, name)
+        if not force and previous.get('sha256') == digest and os.path.exists(path):
+            pages[name] = previous
+            report['unchanged'] += 1
+            continue
+        write_if_changed(path, render_category_page(env, category, items).encode('utf-8'))
+        pages[name] = {'sha256': digest, 'lastmod': today, 'category': category}
+        report['rendered'].append(name)
+    for name in set(previous_pages) - set(pages):
+        if os.path.exists(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))
+        report['removed'].append(name)
+
+    # Product JSON shards (skips unchanged files itself)
+    manifest = publish_snapshot(products, LocalDirectoryPublisher(os.path.join(out_dir, 'data')))
+    report['catalogVersion'] = manifest['version']
+
+    if base_url:
+        sitemap_pages = {name: info['lastmod'] for name, info in pages.items()}
+        for name in PUBLIC_PAGES:
+            if os.path.exists(os.path.join(site_root, name)):
+                mtime = os.path.getmtime(os.path.join(site_root, name))
+                sitemap_pages[name] = datetime.fromtimestamp(mtime, timezone.utc).date().isoformat()
+        write_if_changed(os.path.join(out_dir, 'sitemap.xml'), build_sitemap(base_url, sitemap_pages))
+
+    state = {'builtAt': datetime.now(timezone.utc).isoformat(), 'templates': templates, 'pages': pages}
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    return report
+
+
+def default_base_url(site_root=SOURCE_ROOT):
+    """https://<CNAME> when the site has a custom domain."""
+    try:
+        with open(os.path.join(site_root, 'CNAME'), encoding='utf-8') as f:
+            domain = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return f'https://{domain}' if domain else None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the static storefront for GitHub Pages.')
+    parser.add_argument('--out', default=DEFAULT_OUT_DIR, help='output directory (default %(default)s)')
+    parser.add_argument('--base-url', default=default_base_url(), help='site URL for sitemap.xml (default from CNAME)')
+    parser.add_argument('--force', action='store_true', help='re-render every page')
+    parser.add_argument('--clean', action='store_true', help='delete the output directory first')
+    parser.add_argument('--shop-page', action='store_true',
+                        help=f'only regenerate the site root\'s {CLIENT_PAGE_NAME} from the template')
+    args = parser.parse_args()
+
+    if args.shop_page:
+        from app import app
+        write_if_changed(os.path.join(SOURCE_ROOT, CLIENT_PAGE_NAME), render_client_page(app.jinja_env).encode('utf-8'))
+        raise SystemExit(0)
+    if args.clean:
+        shutil.rmtree(args.out, ignore_errors=True)
+    from app import app, fetch_all_products
+    report = build_site(fetch_all_products(), app.jinja_env, out_dir=args.out, base_url=args.base_url, force=args.force)
+    print(json.dumps(report, indent=2))
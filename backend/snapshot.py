@@ -0,0 +1,197 @@
+"""
+Static catalog snapshot publisher.
+Writes the compact catalog that shop.js falls back to (data/products.json),
+per-category shards and a manifest with content hashes to a local directory
+or a Blob Storage container, so the storefront keeps working without Flask.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+
+# Hashed file names never change content, so they can be cached forever
+from blob_upload import IMMUTABLE_CACHE_CONTROL
+# Stable names (products.json, manifest.json) must be revalidated quickly
+SHORT_CACHE_CONTROL = 'public, max-age=60, must-revalidate'
+
+MANIFEST_NAME = 'manifest.json'
+
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{12}\.json$')
+
+
+def is_fingerprinted(path):
+    """True for snapshot files whose name carries a content hash."""
+    return bool(FINGERPRINT_RE.search(path))
+
+
+def category_slug(category):
+    """File-name friendly category key ("Baby Girl" -> "baby-girl")."""
+    return re.sub(r'[^a-z0-9]+', '-', category.lower()).strip('-') or 'uncategorized'
+
+
+def compact_product(p):
+    """Product in the normalized shape shop.js builds from /api/products."""
+    age_groups = [ag.split('(')[0].strip() if '(' in ag else ag for ag in (p.get('ageGroups') or [])]
+    categories = p.get('categories') or []
+    seasons = p.get('seasons') or []
+    occasions = p.get('occasions') or []
+    return {
+        'id': p['id'],
+        'name': p.get('itemName') or f"{'/'.join(categories) if categories else 'Item'} - ₹{p.get('price') or 0}",
+        'image': p.get('imageUrl'),
+        'images': p.get('images'),
+        'price': p.get('price') or 0,
+        'description': p.get('description') or '',
+        'mainCategory': categories[0] if categories else 'Uncategorized',
+        'categories': categories,
+        'subCategory': p.get('subCategory') or '',
+        'ageGroup': age_groups[0] if age_groups else '',
+        'ageGroups': age_groups,
+        'season': seasons[0] if seasons else '',
+        'seasons': seasons,
+        'occasion': occasions[0] if occasions else '',
+        'occasions': occasions,
+        'createdAt': p.get('createdAt'),
+    }
+
+
+def _encode(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def build_snapshot(products):
+    """Render the snapshot files as {relative path: bytes}, keyed by their stable names."""
+    items = sorted((compact_product(p) for p in products),
+                   key=lambda p: p.get('createdAt') or '', reverse=True)
+    files = {'products.json': _encode(items)}
+    shards = {}
+    for item in items:
+        for category in item['categories'] or ['Uncategorized']:
+            shards.setdefault(category_slug(category), []).append(item)
+    for slug, shard in sorted(shards.items()):
+        files[f'categories/{slug}.json'] = _encode(shard)
+    return files
+
+
+def fingerprinted_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{digest[:12]}{ext}'
+
+
+class LocalDirectoryPublisher:
+    """Writes snapshot files under a directory (e.g. the site's data/ folder)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.root, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data, cache_control):
+        # Cache headers are applied by whatever serves the directory
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, name):
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+
+class BlobContainerPublisher:
+    """Uploads snapshot files to a Blob Storage container with cache headers."""
+
+    def __init__(self, container_client, prefix=''):
+        self.container_client = container_client
+        self.prefix = prefix
+
+    def read(self, name):
+        try:
+            return self.container_client.download_blob(self.prefix + name).readall()
+        except Exception:
+            return None
+
+    def write(self, name, data, cache_control):
+        from azure.storage.blob import ContentSettings
+        self.container_client.upload_blob(
+            self.prefix + name, data, overwrite=True,
+            content_settings=ContentSettings(
+                content_type='application/json; charset=utf-8',
+                cache_control=cache_control,
+            ),
+        )
+
+    def delete(self, name):
+        try:
+            self.container_client.delete_blob(self.prefix + name)
+        except Exception:
+            pass
+
+
+def publish_snapshot(products, publisher):
+    """Publish the catalog snapshot and return the new manifest.
+
+    Each file is written once under its content hash (immutable caching) and
+    once under its stable name for clients like shop.js that hard-code it.
+    Unchanged files are skipped. Hashed files replaced by the previous publish
+    are deleted one generation later, so clients holding the old manifest still
+    find them.
+    """
+    previous = {}
+    raw = publisher.read(MANIFEST_NAME)
+    if raw:
+        try:
+            previous = json.loads(raw)
+        except ValueError:
+            previous = {}
+    previous_files = previous.get('files', {})
+
+    files = build_snapshot(products)
+    manifest_files = {}
+    for name, data in files.items():
+        digest = hashlib.sha256(data).hexdigest()
+        hashed = fingerprinted_name(name, digest)
+        manifest_files[name] = {'path': hashed, 'sha256': digest, 'bytes': len(data)}
+        if previous_files.get(name, {}).get('sha256') == digest:
+            continue
+        publisher.write(hashed, data, IMMUTABLE_CACHE_CONTROL)
+        publisher.write(name, data, SHORT_CACHE_CONTROL)
+
+    current_paths = {f['path'] for f in manifest_files.values()}
+    for path in previous.get('retired', []):
+        if path not in current_paths:
+            publisher.delete(path)
+    for name in set(previous_files) - set(manifest_files):
+        publisher.delete(name)
+
+    manifest = {
+        'version': manifest_files['products.json']['sha256'][:12],
+        'generatedAt': datetime.now(timezone.utc).isoformat(),
+        'productCount': len(products),
+        'files': manifest_files,
+        'retired': sorted({f['path'] for f in previous_files.values()} - current_paths),
+    }
+    publisher.write(MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'), SHORT_CACHE_CONTROL)
+    return manifest
+
+
+if __name__ == '__main__':
+    # Publish a snapshot on demand (e.g. after bulk edits or from a scheduled job)
+    from app import publish_catalog_snapshot
+    manifest = publish_catalog_snapshot()
+    print(json.dumps(manifest, indent=2))
@@ -0,0 +1,133 @@
+"""
+Startup timing report.
+`python startup_report.py` imports the app in a fresh interpreter under
+`python -X importtime`, prints the slowest modules (self and cumulative
+import time) and measures cold start: the time to import the app and the
+time until it has answered its first request. `--record FILE` appends the
+result as a JSON line so cold start can be tracked across commits, and
+`--max-ms` fails the run when cold start exceeds a budget.
+"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run in the child interpreter: import the app, then serve one request in-process
+COLD_START_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/')
+answered = time.perf_counter()
+print(json.dumps({
+    'importMs': (imported - started) * 1000,
+    'firstResponseMs': (answered - imported) * 1000,
+    'coldStartMs': (answered - started) * 1000,
+    'status': response.status_code,
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """Rows of {'module', 'self_us', 'cumulative_us', 'depth'} from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            rows.append({
+                'module': name.strip(),
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': (len(name) - len(name.lstrip())) // 2,
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(python=sys.executable, env=None):
+    """Import the app in a fresh interpreter; returns (cold start timings, import rows)."""
+    env = dict(os.environ if env is None else env)
+    # Keep the measurement free of background threads and bytecode writes
+    env.setdefault('WARM_UP', '0')
+    env.setdefault('PYTHONDONTWRITEBYTECODE', '1')
+    result = subprocess.run([python, '-X', 'importtime', '-c', COLD_START_SCRIPT], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'app failed to start:\n{result.stderr[-4000:]}')
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr)
+
+
+def top_packages(rows, limit):
+    """Top-level packages (e.g. azure, flask) by the import time of their own modules."""
+    totals = {}
+    for row in rows:
+        package = row['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + row['self_us']
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+
+def format_report(timings, rows, limit=25):
+    lines = [f"{'self ms':>9} {'cumul ms':>9}  module"]
+    for row in sorted(rows, key=lambda r: r['cumulative_us'], reverse=True)[:limit]:
+        lines.append(f"{row['self_us'] / 1000:9.1f} {row['cumulative_us'] / 1000:9.1f}  "
+                     f"{'  ' * row['depth']}{row['module']}")
+    lines.append('')
+    lines.append('by top-level package:')
+    for package, total in top_packages(rows, 10):
+        lines.append(f'{total / 1000:9.1f} ms  {package}')
+    lines.append('')
+    lines.append(f"import app: {timings['importMs']:.0f} ms, first response: {timings['firstResponseMs']:.0f} ms "
+                 f"(HTTP {timings['status']}), cold start: {timings['coldStartMs']:.0f} ms")
+    return '\n'.join(lines)
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Report module import times and cold start of the app.')
+    parser.add_argument('--limit', type=int, default=25, help='modules to list (default %(default)s)')
+    parser.add_argument('--runs', type=int, default=3, help='cold starts to measure; the median is reported')
+    parser.add_argument('--json', action='store_true', help='print the timings as JSON instead of a table')
+    parser.add_argument('--record', metavar='FILE', help='append the result to a JSON-lines history file')
+    parser.add_argument('--max-ms', type=float, help='exit with status 1 when cold start exceeds this')
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(max(1, args.runs))]
+    runs.sort(key=lambda run: run[0]['coldStartMs'])
+    timings, rows = runs[len(runs) // 2]
+
+    if args.json:
+        print(json.dumps({**timings, 'packages': dict(top_packages(rows, 10))}, indent=2))
+    else:
+        print(format_report(timings, rows, args.limit))
+
+    if args.record:
+        record = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'commit': current_commit(),
+            'python': sys.version.split()[0],
+            'runs': len(runs),
+            **{key: round(value, 1) for key, value in timings.items() if key.endswith('Ms')},
+        }
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    if args.max_ms is not None and timings['coldStartMs'] > args.max_ms:
+        print(f"cold start {timings['coldStartMs']:.0f} ms exceeds budget of {args.max_ms:.0f} ms", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,128 @@
+"""
+In-memory static file cache.
+Small files are read once and served from memory; large ones are streamed
+with wsgi.file_wrapper so gunicorn can use sendfile. ETag and Last-Modified
+are computed when a file is loaded and conditional requests are answered
+with 304. Entries are re-checked against the disk at most every
+`revalidate` seconds, so edits show up in development and runtime-written
+files (catalog snapshots) in production. Misses are not cached: arbitrary
+request paths would otherwise grow the cache without bound.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from email.utils import formatdate
+
+from flask import Response
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+# Files up to this size are kept in memory
+DEFAULT_MAX_FILE_BYTES = 256 * 1024
+# Memory budget for cached file bodies; files past it are streamed from disk
+DEFAULT_MAX_TOTAL_BYTES = 64 * 1024 * 1024
+
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_RANGE')
+
+
+class StaticFile:
+    """A servable file: its validators, content type and, when cached, its bytes."""
+
+    __slots__ = ('path', 'size', 'mtime_ns', 'etag', 'last_modified', 'content_type', 'body')
+
+    def __init__(self, path, size, mtime_ns, etag, content_type, body=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = etag
+        self.last_modified = formatdate(mtime_ns / 1e9, usegmt=True)
+        self.content_type = content_type
+        self.body = body
+
+    @classmethod
+    def from_bytes(cls, body, content_type, mtime_ns, tag=''):
+        """In-memory file (e.g. a rendered page) with a content-derived ETag."""
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        return cls(None, len(body), mtime_ns, f'"{digest}{tag}"', content_type, body)
+
+    def read(self):
+        if self.body is not None:
+            return self.body
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+class StaticCache:
+    """Path -> StaticFile cache over a directory tree."""
+
+    def __init__(self, root, max_file_bytes=DEFAULT_MAX_FILE_BYTES,
+                 max_total_bytes=DEFAULT_MAX_TOTAL_BYTES, revalidate=2.0):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.revalidate = revalidate
+        self.cached_bytes = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """StaticFile for a root-relative path, or None when it does not exist."""
+        now = time.monotonic()
+        cached = self._entries.get(name)
+        if cached is not None and now - cached[0] < self.revalidate:
+            return cached[1]
+
+        path = safe_join(self.root, name)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is not None and not os.path.isfile(path):
+            stat = None
+
+        if stat is None:
+            with self._lock:
+                previous = self._entries.pop(name, None)
+                if previous is not None:
+                    self.cached_bytes -= len(previous[1].body or b'')
+            return None
+
+        entry = cached[1] if cached is not None else None
+        if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+            entry = self._load(path, name, stat)
+        with self._lock:
+            previous = self._entries.get(name)
+            if previous is not None and previous[1] is not entry:
+                self.cached_bytes -= len(previous[1].body or b'')
+            if previous is None or previous[1] is not entry:
+                self.cached_bytes += len(entry.body or b'')
+            self._entries[name] = (now, entry)
+        return entry
+
+    def _load(self, path, name, stat):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if stat.st_size <= self.max_file_bytes and self.cached_bytes + stat.st_size <= self.max_total_bytes:
+            with open(path, 'rb') as f:
+                body = f.read()
+            # Content-derived ETags agree across instances behind the load balancer
+            etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+            return StaticFile(path, len(body), stat.st_mtime_ns, etag, content_type, body)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        return StaticFile(path, stat.st_size, stat.st_mtime_ns, etag, content_type)
+
+
+def static_response(entry, environ, mimetype=None):
+    """Response for a StaticFile, honouring If-None-Match, If-Modified-Since and Range."""
+    if entry.body is not None:
+        response = Response(entry.body, mimetype=mimetype or entry.content_type)
+    else:
+        response = Response(wrap_file(environ, open(entry.path, 'rb')),
+                            mimetype=mimetype or entry.content_type, direct_passthrough=True)
+        response.content_length = entry.size
+    response.headers['ETag'] = entry.etag
+    response.headers['Last-Modified'] = entry.last_modified
+    if any(header in environ for header in CONDITIONAL_HEADERS):
+        response.make_conditional(environ, accept_ranges=True, complete_length=entry.size)
+    return response
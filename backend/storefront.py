@@ -0,0 +1,111 @@
+"""
+Server-side rendering support for the storefront shop page.
+Mirrors shop.js: the same subcategory lists, the same filters over the same
+normalized product shape (snapshot.compact_product), so the server-rendered
+grid matches what shop.js would have built. Rendered fragments are cached
+per category and filter combination under the catalog version.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+# Keep in sync with renderSubcategories() in shop.js
+SUBCATEGORIES = {
+    'Girls': ['T-Shirts', 'Shirts', 'Blouses', 'Pants', 'Jeans', 'Shorts', 'Skirts', 'Dresses & Rompers', 'Jackets',
+              'Hoodies', 'Coats', 'Pajamas', 'Night Suits', 'Tracksuits', 'Leggings', 'Swimwear', 'School Uniforms'],
+    'Boys': ['T-Shirts', 'Shirts', 'Pants', 'Jeans', 'Shorts', 'Outerwear', 'Pajamas', 'Tracksuits', 'Swimwear',
+             'School Uniforms'],
+    'Baby': ['Bodysuits', 'Rompers', 'Sleepwear', 'Outerwear'],
+    'Accessories': ['Hats & Caps', 'Socks & Tights', 'Scarves & Gloves', 'Hair Accessories'],
+    'Footwear': ['Shoes', 'Sandals', 'Boots', 'Sneakers'],
+}
+
+# Filter checkboxes on shop.html: (query parameter, label, [(value, text)])
+FILTER_GROUPS = (
+    ('age', 'Age Group', [('Newborn', 'Newborn (0-3 months)'), ('Infant', 'Infant (3-12 months)'),
+                          ('Toddler', 'Toddler (1-3 years)'), ('Preschool', 'Preschool (3-5 years)'),
+                          ('Kids', 'Kids (5+ years)')]),
+    ('season', 'Season', [(v, v) for v in ('Spring', 'Summer', 'Fall', 'Winter', 'All Season')]),
+    ('occasion', 'Occasion', [(v, v) for v in ('Casual', 'Formal', 'Party', 'Traditional', 'Everyday')]),
+)
+
+# Query parameter -> (list field, single-value field) of a compact product
+FILTER_FIELDS = {
+    'age': ('ageGroups', 'ageGroup'),
+    'season': ('seasons', 'season'),
+    'occasion': ('occasions', 'occasion'),
+}
+
+
+def shop_filters(args):
+    """Normalized, hashable filters from the shop page query string."""
+    category = (args.get('category') or '').strip()
+    return (
+        ('category', None if category in ('', 'All') else category),
+        ('sub', (args.get('sub') or '').strip() or None),
+    ) + tuple((name, tuple(sorted(set(args.getlist(name))))) for name in FILTER_FIELDS)
+
+
+def _matches(product, name, values):
+    """True when a product has any selected value of a checkbox filter (or none are selected)."""
+    if not values:
+        return True
+    many, one = FILTER_FIELDS[name]
+    if product[many]:
+        return any(value in values for value in product[many])
+    return product[one] in values
+
+
+def filter_products(products, filters):
+    """Products matching shop filters (same rules as applyFilters() in shop.js)."""
+    filters = dict(filters)
+    matched = []
+    for p in products:
+        if filters['category'] and p['mainCategory'] != filters['category'] \
+                and filters['category'] not in p['categories']:
+            continue
+        if filters['sub'] and p['subCategory'] != filters['sub']:
+            continue
+        if not all(_matches(p, name, filters[name]) for name in FILTER_FIELDS):
+            continue
+        matched.append(p)
+    return matched
+
+
+def inline_json(obj):
+    """JSON safe to embed in a <script type="application/json"> element."""
+    text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    for char, escape in (('<', '\\u003c'), ('>', '\\u003e'), ('&', '\\u0026')):
+        text = text.replace(char, escape)
+    return Markup(text)
+
+
+class FragmentCache:
+    """Bounded LRU cache of rendered fragments.
+
+    Keys should include the catalog version so a catalog change simply
+    stops hitting old entries, which then age out.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = render()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
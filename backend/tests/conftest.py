@@ -0,0 +1,49 @@
+"""
+Shared fixtures. The app is imported once with a throwaway job queue, no
+warm-up thread and no rate limits; run with `python -m pytest tests` from backend/.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_workdir = tempfile.mkdtemp(prefix='vancr-tests-')
+os.environ.setdefault('JOB_DB_PATH', os.path.join(_workdir, 'jobs.sqlite3'))
+os.environ.setdefault('SNAPSHOT_DIR', os.path.join(_workdir, 'data'))
+os.environ.setdefault('WARM_UP', '0')
+os.environ.setdefault('RATE_LIMIT', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+@pytest.fixture(scope='session')
+def backend():
+    import app as backend
+    return backend
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def site(backend, tmp_path, monkeypatch):
+    """A small site root served in place of the real one; returns its path."""
+    from assets import AssetServer
+    from static_cache import StaticCache
+
+    (tmp_path / 'index.html').write_text(
+        '<html><head><link rel="stylesheet" href="styles.css"></head><body>Home</body></html>')
+    (tmp_path / 'about.html').write_text(
+        '<html><head><link rel="stylesheet" href="styles.css"><script src="app.js"></script></head>'
+        '<body>' + 'About us. ' * 200 + '</body></html>')
+    (tmp_path / 'styles.css').write_text('body { color: #333; }\n' * 200)
+    (tmp_path / 'app.js').write_text('console.log("storefront");\n' * 100)
+    cache = StaticCache(str(tmp_path), revalidate=0)
+    monkeypatch.setattr(backend, 'static_cache', cache)
+    monkeypatch.setattr(backend, 'asset_server', AssetServer(cache))
+    return tmp_path
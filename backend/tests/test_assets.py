@@ -0,0 +1,60 @@
+import gzip
+import re
+
+import pytest
+
+from assets import BROTLI_AVAILABLE, build_assets, bundle_site
+from snapshot import IMMUTABLE_CACHE_CONTROL
+
+
+@pytest.fixture
+def built_site(site):
+    manifest, _ = build_assets(str(site))
+    return manifest['assets']
+
+
+def test_pages_reference_fingerprinted_assets(client, built_site):
+    for page in ('/', '/about.html'):
+        html = client.get(page).get_data(as_text=True)
+        assert f'href="{built_site["styles.css"]}"' in html
+    assert f'src="{built_site["app.js"]}"' in client.get('/about.html').get_data(as_text=True)
+    assert re.fullmatch(r'dist/styles\.[0-9a-f]{12}\.css', built_site['styles.css'])
+
+
+def test_fingerprinted_asset_is_immutable(client, built_site):
+    response = client.get('/' + built_site['styles.css'])
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_precompressed_gzip_variant_is_negotiated(client, site, built_site):
+    response = client.get('/' + built_site['styles.css'], headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert gzip.decompress(response.get_data()) == (site / 'styles.css').read_bytes()
+
+
+@pytest.mark.skipif(not BROTLI_AVAILABLE, reason='Brotli is not installed')
+def test_precompressed_brotli_variant_is_preferred(client, site, built_site):
+    import brotli
+    response = client.get('/' + built_site['app.js'], headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.get_data()) == (site / 'app.js').read_bytes()
+
+
+def test_page_variant_is_negotiated(client, built_site):
+    response = client.get('/about.html', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert built_site['styles.css'] in gzip.decompress(response.get_data()).decode('utf-8')
+
+
+def test_bundle_copies_the_site_and_builds_inside_it(site, tmp_path_factory):
+    out = tmp_path_factory.mktemp('bundle')
+    manifest, _ = bundle_site(str(out), source_root=str(site))
+
+    assert (out / 'index.html').read_text() == (site / 'index.html').read_text()
+    assert (out / manifest['assets']['styles.css']).exists()
+    assert (out / 'dist' / 'asset-manifest.json').exists()
@@ -0,0 +1,68 @@
+import hashlib
+import io
+import threading
+import types
+
+import pytest
+
+from blob_upload import _read_block, upload_stream
+
+
+class ShortReads(io.BytesIO):
+    """Stream that returns at most 3 bytes per read, like a slow socket."""
+
+    def read(self, size=-1):
+        return super().read(3 if size < 0 else min(size, 3))
+
+
+class BlobClient:
+    def __init__(self):
+        self.uploaded = None
+        self.staged = {}
+        self.committed = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def upload_blob(self, data, overwrite, content_settings):
+        self.uploaded = (bytes(data), content_settings)
+
+    def stage_block(self, block_id, data, length):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.staged[block_id] = data
+        with self._lock:
+            self.in_flight -= 1
+
+    def commit_block_list(self, blocks, content_settings):
+        self.committed = (b''.join(self.staged[b.block_id] for b in blocks), content_settings)
+
+
+def test_read_block_loops_over_short_reads():
+    stream = ShortReads(b'0123456789')
+    assert _read_block(stream, 8) == b'01234567'
+    assert _read_block(stream, 8) == b'89'
+    assert _read_block(stream, 8) == b''
+
+
+def test_small_content_is_one_put_with_its_md5():
+    pytest.importorskip('azure.storage.blob')
+    blob, settings = BlobClient(), types.SimpleNamespace()
+    data = b'x' * 100
+
+    assert upload_stream(blob, io.BytesIO(data), settings, block_size=1024) == (100, hashlib.md5(data).hexdigest())
+    assert blob.uploaded[0] == data and blob.staged == {}
+    assert bytes(settings.content_md5) == hashlib.md5(data).digest()
+
+
+def test_large_content_is_staged_in_blocks_and_committed_in_order():
+    pytest.importorskip('azure.storage.blob')
+    blob, settings = BlobClient(), types.SimpleNamespace()
+    data = bytes(range(256)) * 40
+
+    size, md5 = upload_stream(blob, ShortReads(data), settings, block_size=1000, max_concurrency=2)
+
+    assert (size, md5) == (len(data), hashlib.md5(data).hexdigest())
+    assert len(blob.staged) == 11 and blob.max_in_flight <= 2
+    assert blob.committed == (data, settings) and blob.uploaded is None
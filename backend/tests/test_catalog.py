@@ -0,0 +1,31 @@
+from benchmarks.fakes import make_products
+from price_index import PriceIndex
+from search import SearchIndex
+
+
+def test_writes_during_a_rebuild_survive_the_swap(backend, monkeypatch):
+    products = make_products(20)
+    written = dict(products[0], id='new-product', itemName='Velvet Lantern')
+    deleted = products[1]['id']
+
+    def fetch_while_writing():
+        # Both writes land after the rebuild has read Cosmos DB
+        snapshot = [dict(p) for p in products]
+        backend.on_product_written(written)
+        backend.on_product_deleted(deleted)
+        return snapshot
+
+    monkeypatch.setattr(backend, 'fetch_all_products', fetch_while_writing)
+    monkeypatch.setattr(backend, 'schedule_catalog_snapshot', lambda: None)
+    monkeypatch.setattr(backend, 'search_index', SearchIndex.build(products))
+    monkeypatch.setattr(backend, 'price_index', PriceIndex())
+    monkeypatch.setattr(backend, 'catalog_loaded_at', 0.0)
+    monkeypatch.setattr(backend, 'catalog_version', 0)
+
+    assert backend._rebuild_catalog_indexes() == 20
+
+    assert backend.search_index.search('velvet lantern')[1][0]['id'] == 'new-product'
+    assert 'new-product' in backend.price_index.docs
+    assert deleted not in backend.search_index.docs and deleted not in backend.price_index.docs
+    assert backend.catalog_pending_writes is None
+    assert backend.catalog_version == 3
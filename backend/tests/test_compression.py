@@ -0,0 +1,132 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from compression import Compressor, compress, compress_responses, supported_encodings
+
+BODY = {'products': [{'id': f'p{n}', 'itemName': 'Cotton kurta'} for n in range(100)]}
+
+
+@pytest.fixture
+def compressed_client():
+    app = Flask(__name__)
+    compress_responses(app, Compressor(('zstd', 'br', 'gzip')))
+
+    @app.route('/big')
+    def big():
+        response = jsonify(BODY)
+        response.set_etag('v1')
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify(ok=True)
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'line {n}\n' * 50 for n in range(20)), mimetype='text/plain')
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' + b'\x00' * 4096, mimetype='image/png')
+
+    @app.route('/partial')
+    def partial():
+        return Response(b' ' * 4096, status=206, mimetype='text/plain')
+
+    @app.route('/no-transform')
+    def no_transform():
+        response = jsonify(BODY)
+        response.headers['Cache-Control'] = 'no-transform'
+        return response
+
+    return app.test_client()
+
+
+def decode(response):
+    encoding, data = response.headers.get('Content-Encoding'), response.get_data()
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(data)
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip, deflate, br, zstd', 'zstd'),                  # server preference on a tie
+    ('gzip;q=1.0, br;q=0.5, zstd;q=0.1', 'gzip'),         # client quality wins
+    ('*;q=0.5, gzip;q=0', 'zstd'),
+    ('zstd;q=0, br;q=0, gzip;q=0', None),
+    ('identity', None),
+    ('', None),
+])
+def test_negotiation(accept, expected):
+    compressor = Compressor(('zstd', 'br', 'gzip'))
+    if expected and expected not in supported_encodings():
+        pytest.skip(f'{expected} is not installed')
+    assert compressor.negotiate(accept) == expected
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br', 'zstd'])
+def test_large_json_is_compressed_with_a_weak_etag(compressed_client, encoding):
+    if encoding not in supported_encodings():
+        pytest.skip(f'{encoding} is not installed')
+    response = compressed_client.get('/big', headers={'Accept-Encoding': encoding})
+
+    assert response.headers['Content-Encoding'] == encoding
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['ETag'] == 'W/"v1"'
+    assert int(response.headers['Content-Length']) == len(response.get_data())
+    assert json.loads(decode(response)) == BODY
+
+
+@pytest.mark.parametrize('path, headers', [
+    ('/small', {}),
+    ('/image', {}),
+    ('/no-transform', {}),
+    ('/partial', {}),
+])
+def test_responses_left_alone(compressed_client, path, headers):
+    response = compressed_client.get(path, headers={'Accept-Encoding': 'gzip', **headers})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streams_are_compressed_chunk_by_chunk(compressed_client):
+    response = compressed_client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    assert gzip.decompress(response.get_data()) == b''.join(f'line {n}\n'.encode() * 50 for n in range(20))
+
+
+class Cache(dict):
+    def get_or_render(self, key, render):
+        if key not in self:
+            self[key] = render()
+        return self[key]
+
+
+def test_cached_bodies_are_compressed_once_per_coding():
+    app = Flask(__name__)
+    compressor, cache = Compressor(('gzip',)), Cache()
+    body = b'{"products": []}' * 100
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        first = compressor.cached(cache, ('products', 7), body)
+        assert compressor.cached(cache, ('products', 7), body) == first
+    with app.test_request_context():
+        assert compressor.cached(cache, ('products', 7), body) == (None, body)
+
+    assert first[0] == 'gzip' and gzip.decompress(first[1]) == body
+    assert list(cache) == [(('products', 7), 'gzip')]
+
+
+def test_compress_round_trips():
+    assert gzip.decompress(compress(b'abc' * 1000, 'gzip', 6)) == b'abc' * 1000
+    with pytest.raises(ValueError):
+        compress(b'abc', 'deflate', 6)
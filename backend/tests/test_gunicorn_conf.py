@@ -0,0 +1,58 @@
+import importlib.util
+import os
+from unittest import mock
+
+import pytest
+
+from tests.conftest import BACKEND_DIR
+
+
+@pytest.fixture
+def load_conf():
+    """Load gunicorn.conf.py with a given environment; settings it exports are undone afterwards."""
+    def load(**env):
+        os.environ.update(env)
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'))
+        conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(conf)
+        return conf
+
+    names = ('GUNICORN_WORKERS', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_WORKER_MEMORY_MB',
+             'PROMETHEUS_MULTIPROC_DIR', 'RATE_LIMIT_DB')
+    with mock.patch.dict(os.environ, {name: value for name, value in os.environ.items() if name not in names},
+                         clear=True):
+        yield load
+
+
+@pytest.mark.parametrize('cpus, memory, expected', [
+    (2, None, 5),     # 2 * cpus + 1 when memory is unknown
+    (2, 4096, 5),     # plenty of memory
+    (8, 1024, 4),     # memory bound: 1024 / 256
+    (4, 100, 1),      # never fewer than one
+])
+def test_worker_count_is_bounded_by_cpu_and_memory(load_conf, monkeypatch, cpus, memory, expected):
+    conf = load_conf(GUNICORN_WORKERS='1')
+    monkeypatch.setattr(conf.multiprocessing, 'cpu_count', lambda: cpus)
+    monkeypatch.setattr(conf, '_available_memory_mb', lambda: memory)
+    assert conf._worker_count() == expected
+
+
+def test_worker_memory_budget_can_be_overridden(load_conf, monkeypatch):
+    conf = load_conf(GUNICORN_WORKERS='1', GUNICORN_WORKER_MEMORY_MB='512')
+    monkeypatch.setattr(conf.multiprocessing, 'cpu_count', lambda: 8)
+    monkeypatch.setattr(conf, '_available_memory_mb', lambda: 2048)
+    assert conf._worker_count() == 4
+
+
+def test_explicit_sizes_win(load_conf):
+    conf = load_conf(WEB_CONCURRENCY='3', GUNICORN_THREADS='8')
+    assert (conf.workers, conf.threads, conf.worker_class) == (3, 8, 'gthread')
+
+
+def test_workers_share_rate_limit_buckets(load_conf):
+    assert 'RATE_LIMIT_DB' not in os.environ
+    load_conf(GUNICORN_WORKERS='1')
+    assert 'RATE_LIMIT_DB' not in os.environ
+    load_conf(GUNICORN_WORKERS='2')
+    assert os.environ['RATE_LIMIT_DB'].endswith('.sqlite3')
+    assert os.environ['PROMETHEUS_MULTIPROC_DIR']
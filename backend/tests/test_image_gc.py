@@ -0,0 +1,98 @@
+import time
+import types
+from datetime import datetime, timezone
+
+import pytest
+
+from image_gc import blob_key, blob_name_from_url, collect_orphans
+from image_store import content_blob_name
+
+OLD = time.time() - 30 * 24 * 3600
+URL = 'https://example.blob.core.windows.net/product-images/'
+USED, ORPHAN, IN_FLIGHT = 'a' * 64, 'b' * 64, 'c' * 64
+
+
+class Container:
+    container_name = 'product-images'
+
+    def __init__(self, blobs):
+        self.blobs = dict(blobs)
+
+    def list_blobs(self):
+        return [types.SimpleNamespace(name=name, size=size,
+                                      last_modified=datetime.fromtimestamp(modified, timezone.utc))
+                for name, (size, modified) in self.blobs.items()]
+
+    def delete_blob(self, name):
+        del self.blobs[name]
+
+
+class Products:
+    def __init__(self, docs, refs):
+        self.docs, self.refs = docs, refs
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        if parameters:
+            return [{'sha256': digest} for digest in self.refs]
+        return self.docs
+
+
+@pytest.fixture
+def storage():
+    container = Container({
+        content_blob_name(USED, 'png'): (100, OLD),
+        f'images/{USED}/card.webp': (10, OLD),
+        content_blob_name(ORPHAN, 'png'): (200, OLD),
+        f'images/{ORPHAN}/card.webp': (20, OLD),
+        content_blob_name(IN_FLIGHT, 'png'): (300, OLD),
+        content_blob_name('d' * 64, 'png'): (400, time.time()),
+        'products/p1.png': (50, OLD),
+        'products/p2.png': (60, OLD),
+        'exports/report.csv': (1, OLD),
+    })
+    products = Products([{'imageHash': USED}, {'imageUrl': URL + 'products/p1.png'}], refs=[IN_FLIGHT])
+    return container, products
+
+
+def test_blob_keys_group_renditions_with_their_image():
+    assert blob_key(content_blob_name(USED, 'png')) == blob_key(f'images/{USED}/zoom.jpg') == ('content', USED)
+    assert blob_key('products/p1.png') == ('legacy', 'products/p1.png')
+    assert blob_key('images/not-a-hash.png') is None
+
+
+def test_blob_name_from_url_only_matches_the_container():
+    assert blob_name_from_url(URL + 'products/My%20Photo.png', 'product-images') == 'products/My Photo.png'
+    assert blob_name_from_url(URL + 'products/p1.png', 'other') is None
+    assert blob_name_from_url('/assets/images/p001.png', 'product-images') is None
+
+
+def test_dry_run_reports_old_unreferenced_groups(storage):
+    container, products = storage
+
+    report = collect_orphans(container, products)
+
+    assert report['dryRun'] and report['unknownBlobs'] == 1 and report['scannedBlobs'] == 8
+    assert [o['key'] for o in report['orphans']] == [ORPHAN, 'products/p2.png']
+    assert (report['orphanBlobs'], report['orphanBytes'], report['recentSkipped']) == (3, 280, 2)
+    assert len(container.blobs) == 9
+
+
+def test_delete_removes_legacy_orphans(storage):
+    container, products = storage
+    container.blobs = {name: blob for name, blob in container.blobs.items() if not name.startswith('images/')}
+
+    report = collect_orphans(container, products, delete=True)
+
+    assert report['deletedBlobs'] == 1
+    assert sorted(container.blobs) == ['exports/report.csv', 'products/p1.png']
+
+
+def test_delete_keeps_content_whose_reference_was_taken_again(storage):
+    pytest.importorskip('azure.cosmos')
+    container, products = storage
+    products.read_item = lambda item, partition_key: {'id': item, 'refCount': 1, '_etag': '1'}
+
+    report = collect_orphans(container, products, delete=True)
+
+    assert report['deletedBlobs'] == 1
+    assert content_blob_name(ORPHAN, 'png') in container.blobs
@@ -0,0 +1,164 @@
+"""ImageStore against in-memory containers that raise the Azure SDK's exceptions."""
+import hashlib
+import io
+import types
+
+import pytest
+
+pytest.importorskip('azure.cosmos')
+pytest.importorskip('azure.storage.blob')
+
+from azure.core.exceptions import ResourceNotFoundError  # noqa: E402
+from azure.cosmos import exceptions  # noqa: E402
+
+from image_store import ImageStore, content_blob_name, ref_id  # noqa: E402
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 200
+
+
+class Refs:
+    def __init__(self):
+        self.docs = {}
+        self.etags = 0
+
+    def _stamp(self, doc):
+        self.etags += 1
+        doc['_etag'] = str(self.etags)
+        return dict(doc)
+
+    def create_item(self, body):
+        if body['id'] in self.docs:
+            raise exceptions.CosmosResourceExistsError(message='exists')
+        self.docs[body['id']] = dict(body)
+        return self._stamp(self.docs[body['id']])
+
+    def read_item(self, item, partition_key):
+        if item not in self.docs:
+            raise exceptions.CosmosResourceNotFoundError(message='missing')
+        return dict(self.docs[item])
+
+    def patch_item(self, item, partition_key, patch_operations):
+        if item not in self.docs:
+            raise exceptions.CosmosResourceNotFoundError(message='missing')
+        doc = self.docs[item]
+        for op in patch_operations:
+            name = op['path'].lstrip('/')
+            doc[name] = doc.get(name, 0) + op['value'] if op['op'] == 'incr' else op['value']
+        return self._stamp(doc)
+
+    def delete_item(self, item, partition_key, **kwargs):
+        self.docs.pop(item)
+
+
+class Blob:
+    def __init__(self, container, name):
+        self.container, self.name = container, name
+        self.url = f'https://example.blob.core.windows.net/product-images/{name}'
+
+    def _data(self):
+        if self.name not in self.container.blobs:
+            raise ResourceNotFoundError('missing')
+        return self.container.blobs[self.name]
+
+    def get_blob_properties(self):
+        return types.SimpleNamespace(size=len(self._data()), etag='"1"')
+
+    def download_blob(self, offset=0, length=None, **kwargs):
+        data = self._data()[offset:None if length is None else offset + length]
+        self.container.downloads += 1
+        return types.SimpleNamespace(readall=lambda: data, readinto=lambda stream: stream.write(data))
+
+    def set_http_headers(self, content_settings, **kwargs):
+        self.container.headers[self.name] = content_settings
+
+    def upload_blob(self, data, **kwargs):
+        if self.container.fail_uploads:
+            raise IOError('upload failed')
+        self.container.blobs[self.name] = data.read() if hasattr(data, 'read') else bytes(data)
+
+    def exists(self):
+        return self.name in self.container.blobs
+
+    def delete_blob(self):
+        self.container.blobs.pop(self.name)
+
+
+class Container:
+    def __init__(self):
+        self.blobs = {}
+        self.headers = {}
+        self.fail_uploads = False
+        self.downloads = 0
+
+    def get_blob_client(self, name):
+        return Blob(self, name)
+
+    def list_blobs(self, name_starts_with=''):
+        return [types.SimpleNamespace(name=name) for name in list(self.blobs) if name.startswith(name_starts_with)]
+
+    def delete_blob(self, name):
+        self.blobs.pop(name)
+
+
+@pytest.fixture
+def store():
+    return ImageStore(Container(), Refs())
+
+
+def test_attach_registers_a_pending_upload_without_reading_it(store):
+    digest = hashlib.sha256(PNG).hexdigest()
+    store.container_client.blobs[content_blob_name(digest, 'png')] = PNG
+
+    ref = store.attach(digest, 'png', max_bytes=1024)
+
+    assert ref['refCount'] == 1 and ref['size'] == len(PNG) and ref['pending']
+    assert store.container_client.downloads == 0
+
+
+def test_verify_exposes_a_matching_upload(store):
+    digest = hashlib.sha256(PNG).hexdigest()
+    store.container_client.blobs[content_blob_name(digest, 'png')] = PNG
+    store.attach(digest, 'png', max_bytes=1024)
+
+    ref = store.verify(digest, lambda stream: 'png')
+
+    assert not ref['pending']
+    assert store.container_client.headers[content_blob_name(digest, 'png')].content_type == 'image/png'
+
+
+@pytest.mark.parametrize('claimed, check_error', [
+    (hashlib.sha256(b'some other image').hexdigest(), None),
+    (hashlib.sha256(PNG).hexdigest(), 'Image is 60000x60000'),
+])
+def test_verify_deletes_an_upload_that_fails_its_checks(store, claimed, check_error):
+    store.container_client.blobs[content_blob_name(claimed, 'png')] = PNG
+    store.attach(claimed, 'png', max_bytes=1024)
+
+    def check(stream):
+        if check_error:
+            raise ValueError(check_error)
+        return 'png'
+
+    with pytest.raises(ValueError):
+        store.verify(claimed, check)
+
+    assert store.container_client.blobs == {}
+    assert store.lookup(claimed) is None
+
+
+def test_failed_upload_takes_no_reference(store):
+    store.container_client.fail_uploads = True
+    file = types.SimpleNamespace(stream=io.BytesIO(PNG), content_type='image/png')
+
+    with pytest.raises(IOError):
+        store.put(file, 'png')
+
+    assert store.refs.docs == {}
+
+
+def test_put_references_stored_content_once(store):
+    first = store.put(types.SimpleNamespace(stream=io.BytesIO(PNG), content_type='image/png'), 'png')
+    second = store.put(types.SimpleNamespace(stream=io.BytesIO(PNG), content_type='image/png'), 'png')
+
+    assert (first['refCount'], second['refCount']) == (1, 2)
+    assert list(store.container_client.blobs) == [first['blobName']]
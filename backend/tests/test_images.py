@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+from assets import SOURCE_ROOT
+from optimize_images import METADATA_NAME, OUTPUT_DIR
+
+IMAGE = '/assets/images/p001.png'
+
+
+@pytest.fixture(scope='module')
+def metadata():
+    with open(os.path.join(SOURCE_ROOT, OUTPUT_DIR, METADATA_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_committed_variants_exist(metadata):
+    assert metadata
+    for entry in metadata.values():
+        for variants in entry['variants'].values():
+            for variant in variants:
+                assert os.path.getsize(os.path.join(SOURCE_ROOT, variant['path'])) == variant['bytes']
+
+
+def test_best_accepted_format_is_served(client):
+    response = client.get(IMAGE, headers={'Accept': 'image/avif,image/webp,image/*,*/*;q=0.8'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/avif'
+    assert response.headers['Vary'] == 'Accept'
+
+
+def test_webp_only_browser_gets_webp(client):
+    response = client.get(IMAGE, headers={'Accept': 'image/webp,*/*'})
+    assert response.mimetype == 'image/webp'
+
+
+def test_original_without_modern_formats(client):
+    response = client.get(IMAGE, headers={'Accept': '*/*'})
+    assert response.mimetype == 'image/png'
+    assert response.headers['Vary'] == 'Accept'
+
+
+def test_width_picks_smallest_covering_variant(client, metadata):
+    variants = metadata[IMAGE.lstrip('/')]['variants']['image/webp']
+    response = client.get(f'{IMAGE}?w=300', headers={'Accept': 'image/webp'})
+    assert len(variants) > 1
+    assert len(response.get_data()) == next(v for v in variants if v['width'] >= 300)['bytes']
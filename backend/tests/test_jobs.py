@@ -0,0 +1,63 @@
+import os
+
+from jobs import DONE, QUEUED, RUNNING, JobQueue
+
+
+def test_queue_file_is_created_on_first_use(tmp_path):
+    path = tmp_path / 'queue' / 'jobs.sqlite3'
+    queue = JobQueue(str(path), workers=0)
+    assert not os.path.exists(path)
+
+    queue.enqueue('noop')
+    assert queue.stats() == {QUEUED: 1}
+
+
+def test_expired_lease_holder_cannot_finish_a_reclaimed_job(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=0, lease_seconds=-1)
+    job_id = queue.enqueue('slow')
+    stale = queue._claim()
+    current = queue._claim()
+    assert stale['id'] == current['id'] == job_id
+
+    assert queue._finish(stale) is False
+    assert queue.get(job_id)['status'] == RUNNING
+    assert queue._finish(current) is True
+    assert queue.get(job_id)['status'] == DONE
+
+
+def test_failed_attempt_is_requeued_while_the_lease_is_held(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=0, backoff=0)
+    queue.register('flaky', lambda payload: 1 / 0)
+    job_id = queue.enqueue('flaky')
+
+    assert queue.run_pending()
+    job = queue.get(job_id)
+    assert (job['status'], job['attempts']) == (QUEUED, 1)
+    assert 'ZeroDivisionError' in job['last_error']
+
+
+def test_background_work_without_job_workers_still_warms_up_and_schedules_purge(backend, tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=0)
+    warmed = []
+    monkeypatch.setattr(backend, 'job_queue', queue)
+    monkeypatch.setattr(backend, 'background_pid', None)
+    monkeypatch.setattr(backend, 'start_warm_up', lambda: warmed.append(True))
+
+    assert backend.start_background_work() is True
+    assert backend.start_background_work() is False
+
+    assert warmed == [True]
+    assert {job['name'] for job in queue.list()} == {'image.gc', 'jobs.purge'}
+
+
+def test_purge_job_deletes_old_finished_jobs_and_reschedules_itself(backend, tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=0)
+    monkeypatch.setattr(backend, 'job_queue', queue)
+    monkeypatch.setattr(backend, 'JOB_RETENTION', 0)
+    queue.register('noop', lambda payload: None)
+    queue.enqueue('noop')
+    assert queue.run_pending()
+
+    backend._purge_jobs_job({})
+
+    assert [(job['name'], job['status']) for job in queue.list()] == [('jobs.purge', QUEUED)]
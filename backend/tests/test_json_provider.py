@@ -0,0 +1,76 @@
+import dataclasses
+import decimal
+import uuid
+from collections import UserDict
+from datetime import date, datetime, timezone
+
+import pytest
+
+import json_provider
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: int
+
+
+DOCUMENT = {
+    'name': 'Kurta – ₹499',
+    'zeta': 1,
+    'alpha': [1.5, None, True],
+    'createdAt': datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+    'day': date(2024, 5, 1),
+    'price': decimal.Decimal('499.00'),
+    'id': uuid.UUID(int=1),
+    'tags': {'new'},
+    'point': Point(1, 2),
+    'item': UserDict({'id': 'p1'}),
+    'page': (n for n in range(3)),
+    3: 'non-string key',
+}
+
+EXPECTED = ('{"name":"Kurta – ₹499","zeta":1,"alpha":[1.5,null,true],"createdAt":"2024-05-01T12:30:00+00:00",'
+            '"day":"2024-05-01","price":"499.00","id":"00000000-0000-0000-0000-000000000001","tags":["new"],'
+            '"point":{"x":1,"y":2},"item":{"id":"p1"},"page":[0,1,2],"3":"non-string key"}')
+
+
+@pytest.fixture(params=[True, False], ids=['orjson', 'stdlib'])
+def provider(request, backend, monkeypatch):
+    if request.param and not json_provider.ORJSON_AVAILABLE:
+        pytest.skip('orjson is not installed')
+    monkeypatch.setattr(json_provider, 'ORJSON_AVAILABLE', request.param)
+    return backend.app.json
+
+
+def test_both_paths_write_the_same_json(provider):
+    document = dict(DOCUMENT, page=(n for n in range(3)))
+    assert provider.dumps(document) == EXPECTED
+    assert provider.dumpb(dict(document, page=[0, 1, 2])) == EXPECTED.encode('utf-8')
+    assert provider.loads(EXPECTED.encode('utf-8'))['name'] == 'Kurta – ₹499'
+
+
+def test_unknown_types_are_rejected(provider):
+    with pytest.raises(TypeError):
+        provider.dumps({'value': object()})
+
+
+def test_responses_and_request_bodies_use_the_provider(provider, backend):
+    with backend.app.test_request_context('/', method='POST', json={'price': 12.5}):
+        from flask import jsonify, request
+        response = jsonify(ok=True, at=date(2024, 5, 1))
+        assert request.get_json() == {'price': 12.5}
+    assert response.mimetype == 'application/json'
+    assert response.get_data() == b'{"ok":true,"at":"2024-05-01"}\n'
+
+
+def test_indented_output_matches_too(backend, monkeypatch):
+    if not json_provider.ORJSON_AVAILABLE:
+        pytest.skip('orjson is not installed')
+    provider = backend.app.json
+    monkeypatch.setattr(provider, 'compact', False)
+    document = {'id': 'p1', 'sizes': [1, 2], 'images': {}, 'tags': []}
+
+    fast = provider.dumps(document)
+    monkeypatch.setattr(json_provider, 'ORJSON_AVAILABLE', False)
+    assert provider.dumps(document) == fast and '\n  "sizes": [\n' in fast
@@ -0,0 +1,24 @@
+import logging
+
+import pytest
+
+from log_setup import RateLimitFilter
+
+
+def records(level, count):
+    return [logging.LogRecord('app', level, 'app.py', 10, 'message', (), None) for _ in range(count)]
+
+
+def test_debug_records_are_limited_per_call_site():
+    limiter = RateLimitFilter(limit=3)
+    passed = [limiter.filter(record) for record in records(logging.DEBUG, 5)]
+    assert passed == [True, True, True, False, False]
+
+
+@pytest.mark.parametrize('level', [logging.INFO, logging.WARNING])
+def test_info_and_above_pass_unless_opted_in(level):
+    limiter = RateLimitFilter(limit=3)
+    assert all(limiter.filter(record) for record in records(level, 5))
+
+    opted_in = RateLimitFilter(limit=3, max_level=level)
+    assert sum(opted_in.filter(record) for record in records(level, 5)) == 3
@@ -0,0 +1,93 @@
+import pytest
+
+from metrics import instrument
+
+prometheus_client = pytest.importorskip('prometheus_client')
+
+
+def calls(dependency, operation, outcome='ok'):
+    return prometheus_client.REGISTRY.get_sample_value(
+        'dependency_call_duration_seconds_count',
+        {'dependency': dependency, 'operation': operation, 'outcome': outcome}) or 0
+
+
+class Container:
+    def read_item(self, item, partition_key):
+        if item == 'missing':
+            raise KeyError(item)
+        return {'id': item}
+
+    def query_items(self, query, **kwargs):
+        return iter([{'id': 1}, {'id': 2}])
+
+
+class Database:
+    id = 'shop'
+
+    def get_container_client(self, name):
+        return Container()
+
+
+class Cursor:
+    def execute(self, sql, *params):
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def __iter__(self):
+        return iter([(1,), (2,)])
+
+
+class Connection:
+    def cursor(self):
+        return Cursor()
+
+    def commit(self):
+        pass
+
+
+def test_calls_on_child_clients_are_timed_by_outcome():
+    database = instrument(Database(), 'cosmos')
+    before = calls('cosmos', 'read_item'), calls('cosmos', 'read_item', 'error')
+
+    container = database.get_container_client('products')
+    assert container.read_item('p1', partition_key='p1') == {'id': 'p1'}
+    with pytest.raises(KeyError):
+        container.read_item('missing', partition_key='missing')
+
+    assert (calls('cosmos', 'read_item'), calls('cosmos', 'read_item', 'error')) == (before[0] + 1, before[1] + 1)
+    assert database.id == 'shop' and instrument(database, 'cosmos') is database
+    assert calls('cosmos', 'get_container_client') == 0
+
+
+def test_paged_results_are_timed_once_consumed():
+    container = instrument(Container(), 'cosmos')
+    before = calls('cosmos', 'query_items')
+
+    pages = container.query_items('SELECT * FROM c')
+    assert calls('cosmos', 'query_items') == before
+    assert [doc['id'] for doc in pages] == [1, 2]
+    assert calls('cosmos', 'query_items') == before + 1
+
+
+def test_only_round_trips_of_sql_cursors_are_timed():
+    connection = instrument(Connection(), 'sql')
+    before = calls('sql', 'execute'), calls('sql', 'commit')
+
+    cursor = connection.cursor()
+    cursor.execute('SELECT 1')
+    assert cursor.fetchone() == (1,) and list(cursor) == [(1,), (2,)]
+    connection.commit()
+
+    assert (calls('sql', 'execute'), calls('sql', 'commit')) == (before[0] + 1, before[1] + 1)
+    assert calls('sql', 'fetchone') == 0
+
+
+def test_requests_are_timed_by_route(client, backend, monkeypatch):
+    monkeypatch.setattr(backend, 'METRICS_TOKEN', 'secret')
+    client.get('/api/')
+
+    assert client.get('/metrics').status_code == 401
+    body = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/",status="200"}' in body
@@ -0,0 +1,95 @@
+import pytest
+
+import price_index
+from benchmarks.fakes import make_products
+from price_index import PriceIndex, price_histogram, product_price
+
+
+def in_category(category):
+    return lambda p: category in p['categories']
+
+
+@pytest.fixture
+def products():
+    return make_products(200, seed=3)
+
+
+@pytest.fixture
+def index(products):
+    index = PriceIndex()
+    index.rebuild(products)
+    return index
+
+
+def expected(products, min_price=None, max_price=None, matches=None):
+    return [p for p in products
+            if (min_price is None or product_price(p) >= min_price)
+            and (max_price is None or product_price(p) <= max_price)
+            and (matches is None or matches(p))]
+
+
+@pytest.mark.parametrize('bounds', [(None, None), (1000, 2500), (None, 800), (4000, None), (6000, 7000)])
+def test_range_returns_exactly_the_products_in_it(index, products, bounds):
+    items, _ = index.query(*bounds, sort='price_asc')
+    assert [p['id'] for p in items] == [p['id'] for p in sorted(expected(products, *bounds),
+                                                                 key=lambda p: (product_price(p), p['id']))]
+
+
+def test_bounds_are_inclusive(index, products):
+    price = product_price(products[0])
+    items, _ = index.query(price, price, sort='price_asc')
+    assert products[0]['id'] in {p['id'] for p in items}
+    assert all(product_price(p) == price for p in items)
+
+
+def test_filter_runs_within_the_range(index, products):
+    category = products[0]['categories'][0]
+    seen = []
+
+    def matches(p):
+        seen.append(p['id'])
+        return category in p['categories']
+
+    index.query(500, 600, matches=matches, histogram_key=(category,))  # caches the histogram
+    seen.clear()
+    items, _ = index.query(1000, 2000, sort='price_desc', matches=matches, histogram_key=(category,))
+
+    assert {p['id'] for p in items} == {p['id'] for p in expected(products, 1000, 2000, in_category(category))}
+    assert [product_price(p) for p in items] == sorted((product_price(p) for p in items), reverse=True)
+    assert len(seen) == len(expected(products, 1000, 2000))
+
+
+@pytest.mark.parametrize('fraction', [0, 1])
+def test_newest_order_is_the_same_whether_walked_or_sorted(index, products, monkeypatch, fraction):
+    monkeypatch.setattr(price_index, 'NEWEST_WALK_FRACTION', fraction)
+    for bounds in [(None, None), (1000, 1500)]:
+        items, _ = index.query(*bounds, sort='newest')
+        assert [p['id'] for p in items] == [p['id'] for p in sorted(
+            expected(products, *bounds), key=lambda p: (p['createdAt'], p['id']), reverse=True)]
+
+
+def test_histogram_covers_every_match_regardless_of_bounds(index, products):
+    category = products[0]['categories'][0]
+    matching = sorted(product_price(p) for p in expected(products, matches=in_category(category)))
+
+    _, histogram = index.query(1000, 1200, matches=in_category(category), histogram_key=(category,))
+
+    assert histogram == price_histogram(matching)
+    assert sum(bucket['count'] for bucket in histogram['buckets']) == len(matching)
+
+
+def test_cached_histogram_follows_index_changes(index, products):
+    _, before = index.query(1000, 2000, histogram_key=())
+    index.upsert(dict(products[0], id='new', price=99999))
+    _, after = index.query(1000, 2000, histogram_key=())
+
+    assert after['max'] == 99999 and after != before
+    index.remove('new')
+    assert index.query(1000, 2000, histogram_key=())[1] == before
+
+
+def test_histogram_edges():
+    assert price_histogram([]) == {'min': None, 'max': None, 'buckets': []}
+    assert price_histogram([5.0, 5.0])['buckets'] == [{'min': 5.0, 'max': 5.0, 'count': 2}]
+    histogram = price_histogram([0.0, 5.0, 10.0], buckets=2)
+    assert [bucket['count'] for bucket in histogram['buckets']] == [1, 2]
@@ -0,0 +1,89 @@
+import io
+import os
+
+import pytest
+
+from assets import SOURCE_ROOT
+from benchmarks.fakes import FakeCosmosDatabase, Latency, make_products
+
+IMAGE = os.path.join(SOURCE_ROOT, 'assets', 'images', 'p001.png')
+
+
+class RecordingStore:
+    """Image store that hands out one reference and records releases."""
+
+    def __init__(self):
+        self.released = []
+
+    def put(self, file, ext):
+        return {'sha256': 'a' * 64, 'blobName': f'images/{"a" * 64}.{ext}',
+                'url': f'https://example.blob.core.windows.net/images/{"a" * 64}.{ext}', 'refCount': 1}
+
+    def release(self, digest):
+        self.released.append(digest)
+        return True
+
+
+@pytest.fixture
+def catalog(backend, monkeypatch):
+    database = FakeCosmosDatabase(Latency(cosmos=0, blob=0, sql=0, sql_connect=0))
+    products = database.get_container_client(backend.PRODUCTS_CONTAINER)
+    products.seed(make_products(3))
+    product = products.read_item(next(iter(products._documents)))
+    store = RecordingStore()
+    monkeypatch.setattr(backend, 'database', database)
+    monkeypatch.setattr(backend, 'blob_service_client', object())
+    monkeypatch.setattr(backend, 'get_image_store', lambda: store)
+    return products, product, store
+
+
+def test_failed_product_write_releases_the_new_image(client, catalog, monkeypatch):
+    products, product, store = catalog
+
+    def unavailable(*args, **kwargs):
+        raise IOError('Cosmos DB unavailable')
+
+    monkeypatch.setattr(products, 'replace_item', unavailable)
+    with open(IMAGE, 'rb') as f:
+        data = {'itemImage': (io.BytesIO(f.read()), 'photo.png'), 'price': '12.5'}
+    response = client.put(f'/api/products/{product["id"]}', data=data,
+                          content_type='multipart/form-data', headers={'X-User-Id': 'admin'})
+
+    assert response.status_code == 500
+    assert store.released == ['a' * 64]
+    assert products.read_item(product['id'])['imageUrl'] == product['imageUrl']
+
+
+class VerifyingStore:
+    """Image store whose verify() accepts or rejects a pending upload."""
+
+    def __init__(self, accept):
+        self.accept = accept
+
+    def verify(self, digest, check):
+        if not self.accept:
+            raise ValueError('Uploaded image does not match its SHA-256')
+        return {'sha256': digest, 'url': f'https://example.blob.core.windows.net/images/{digest}.png',
+                'blobName': f'images/{digest}.png'}
+
+
+@pytest.mark.parametrize('accept', [True, False])
+def test_pending_upload_is_exposed_only_once_verified(backend, catalog, monkeypatch, accept):
+    products, product, _ = catalog
+    digest = 'b' * 64
+    products.replace_item(item=product['id'], body=dict(product, pendingImageHash=digest))
+    released, scheduled = [], []
+    monkeypatch.setattr(backend, 'get_image_store', lambda: VerifyingStore(accept))
+    monkeypatch.setattr(backend, 'release_product_image', lambda image: released.append(image['imageHash']))
+    monkeypatch.setattr(backend, 'schedule_image_jobs', lambda ref, product_id: scheduled.append(product_id))
+
+    backend._image_verify_job({'sha256': digest, 'productId': product['id']})
+
+    stored = products.read_item(product['id'])
+    assert 'pendingImageHash' not in stored
+    if accept:
+        assert stored['imageHash'] == digest and stored['imageUrl'].endswith(f'{digest}.png')
+        assert released == [product.get('imageHash')] and scheduled == [product['id']]
+    else:
+        assert stored['imageUrl'] == product['imageUrl']
+        assert released == [digest] and scheduled == []
@@ -0,0 +1,58 @@
+import bcrypt
+import pytest
+
+from benchmarks.fakes import FakeSqlDatabase, Latency, make_users
+from ratelimit import MemoryStore, RateLimiter, SQLiteStore, parse_limit
+
+PASSWORD = 'correct horse'
+NO_LATENCY = Latency(cosmos=0, blob=0, sql=0, sql_connect=0)
+
+
+@pytest.mark.parametrize('make_store', [lambda path: MemoryStore(), SQLiteStore], ids=['memory', 'sqlite'])
+def test_refund_returns_a_checked_token_up_to_capacity(make_store, tmp_path):
+    limiter = RateLimiter(make_store(str(tmp_path / 'buckets.sqlite3')), {'login_email': parse_limit('2/300')})
+    key = ('login_email', 'a@example.com')
+
+    limiter.refund(key)
+    limiter.refund(key)
+    assert [limiter.check(key) for _ in range(2)] == [0.0, 0.0]
+    assert limiter.check(key) > 0
+    limiter.refund(key)
+    assert limiter.check(key) == 0.0
+    assert limiter.check(key) > 0
+
+
+@pytest.fixture
+def login(client, backend, monkeypatch, tmp_path):
+    sql = FakeSqlDatabase(str(tmp_path / 'sql.sqlite3'), NO_LATENCY)
+    user = make_users(1)[0]
+    sql.add_users([user], bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(4)).decode('utf-8'))
+    monkeypatch.setattr(backend, 'get_sql_connection', sql.connect)
+    monkeypatch.setattr(backend, 'rate_limiter', RateLimiter(MemoryStore(), {
+        'login_ip': parse_limit('100/60'),
+        'login_email': parse_limit('2/300'),
+    }))
+    return lambda password, email=user[1]: client.post(
+        '/api/login', json={'email': email, 'password': password}).status_code
+
+
+def test_successful_logins_do_not_use_up_the_email_bucket(login):
+    assert [login(PASSWORD) for _ in range(4)] == [200] * 4
+
+
+def test_failed_logins_lock_the_email(login):
+    assert [login('guess') for _ in range(3)] == [401, 401, 429]
+    assert login(PASSWORD) == 429
+
+
+def test_in_flight_logins_hold_their_tokens(login, backend):
+    # Two attempts still being checked hold both tokens, so a third concurrent guess is refused
+    email = make_users(1)[0][1]
+    assert backend.rate_limiter.check(('login_email', email)) == 0.0
+    assert backend.rate_limiter.check(('login_email', email)) == 0.0
+    assert login('guess') == 429
+
+
+def test_malformed_logins_are_not_charged(login):
+    assert [login('') for _ in range(3)] == [400] * 3
+    assert [login('guess') for _ in range(3)] == [401, 401, 429]
@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from images import DERIVATIVE_FORMATS, DERIVATIVE_WIDTHS, build_image_map, derivative_blob_name, render_derivatives
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png(width, height, mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), (200, 30, 30, 0) if mode == 'RGBA' else (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_every_rendition_is_rendered_at_its_width():
+    renditions = render_derivatives(png(1600, 800))
+
+    assert len(renditions) == len(DERIVATIVE_WIDTHS) * len(DERIVATIVE_FORMATS)
+    for size, fmt, width, height, body in renditions:
+        assert (width, height) == (DERIVATIVE_WIDTHS[size], DERIVATIVE_WIDTHS[size] // 2)
+        with Image.open(io.BytesIO(body)) as image:
+            assert image.format == fmt.upper() and image.size == (width, height)
+
+
+def test_small_originals_are_not_upscaled():
+    widths = {size: width for size, _, width, _, _ in render_derivatives(png(300, 300))}
+    assert widths == {'thumb': 120, 'card': 300, 'zoom': 300}
+
+
+def test_transparency_is_flattened_onto_white():
+    _, _, _, _, body = next(r for r in render_derivatives(png(50, 50, 'RGBA')) if r[1] == 'jpeg')
+    with Image.open(io.BytesIO(body)) as image:
+        assert all(channel > 245 for channel in image.getpixel((25, 25)))
+
+
+def test_image_map_has_a_srcset_per_format():
+    renditions = [(size, fmt, width, width, f'https://cdn/{derivative_blob_name("k", size, fmt)}')
+                  for size, width in DERIVATIVE_WIDTHS.items() for fmt in DERIVATIVE_FORMATS]
+    images = build_image_map(renditions)
+
+    assert images['card'] == {'width': 400, 'height': 400,
+                              'webp': 'https://cdn/images/k/card.webp', 'jpeg': 'https://cdn/images/k/card.jpg'}
+    assert images['srcset']['webp'] == ('https://cdn/images/k/thumb.webp 120w, '
+                                        'https://cdn/images/k/card.webp 400w, https://cdn/images/k/zoom.webp 1200w')
@@ -0,0 +1,78 @@
+import heapq
+
+import pytest
+
+from benchmarks.fakes import make_products
+from search import SearchIndex
+
+QUERIES = ['cotton', 'floral party', 'summer denim dre', 'soft knit pastel', 'girls school']
+
+
+def ranked_scores(index, query):
+    total, products = index.search(query, limit=30)
+    return total, [p['score'] for p in products]
+
+
+@pytest.fixture
+def products():
+    return make_products(600)
+
+
+def test_incremental_updates_match_a_rebuild(products):
+    index = SearchIndex.build(products)
+    for query in QUERIES:
+        index.search(query)  # cache the rankings the writes must keep current
+
+    changed = dict(products[3], itemName='Floral Party Dress', description='soft cotton party dress')
+    index.upsert(changed)
+    index.upsert({**products[0], 'id': 'new-product', 'itemName': 'Pastel Knit Cardigan'})
+    index.remove(products[10]['id'])
+
+    fresh = SearchIndex.build([changed if p is products[3] else p for p in products if p is not products[10]]
+                              + [{**products[0], 'id': 'new-product', 'itemName': 'Pastel Knit Cardigan'}])
+    for query in QUERIES:
+        total, scores = ranked_scores(index, query)
+        expected_total, expected_scores = ranked_scores(fresh, query)
+        assert total == expected_total
+        assert scores == pytest.approx(expected_scores, rel=1e-12)
+
+
+def test_edits_that_keep_the_statistics_keep_rankings_cached(products):
+    index = SearchIndex.build(products)
+    index.search('denim')
+    cached = index._impacts[('denim',)]
+    index.upsert(dict(products[5], price=1.0))
+    index.search('denim')
+    assert index._impacts[('denim',)] is cached
+
+
+def test_new_products_rescore_cached_rankings(products):
+    index = SearchIndex.build(products)
+    index.search('denim')
+    added = {'id': 'other', 'itemName': 'Striped Linen Shirt'}
+    index.upsert(added)
+    assert ranked_scores(index, 'denim') == ranked_scores(SearchIndex.build(products + [added]), 'denim')
+
+
+def test_removed_product_leaves_rankings(products):
+    index = SearchIndex.build(products)
+    _, found = index.search('cotton', limit=1)
+    index.remove(found[0]['id'])
+    total, results = index.search('cotton', limit=1000)
+    assert found[0]['id'] not in {p['id'] for p in results}
+    assert total == len(results)
+
+
+def brute_force_top_k(groups, k):
+    candidates = set().union(*(g.scores for g in groups))
+    return [(pid, score) for score, pid in heapq.nlargest(
+        k, ((sum(g.scores.get(pid, 0.0) for g in groups), pid) for pid in candidates))]
+
+
+@pytest.mark.parametrize('terms', [('cotton', 'floral', 'soft'), ('soft', 'comfy', 'school'), ('woolen', 'knit', 'pastel')])
+@pytest.mark.parametrize('max_depth', [0, 5, 10 ** 9])
+def test_threshold_walk_is_exact_at_any_depth(products, terms, max_depth):
+    from search import _threshold_top_k
+    index = SearchIndex.build(products)
+    groups = [index._group_impacts({term}) for term in terms]
+    assert _threshold_top_k(groups, 20, max_depth=max_depth) == brute_force_top_k(groups, 20)
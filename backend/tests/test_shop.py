@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from assets import SOURCE_ROOT
+
+NAV = '<a href="catalog.html">Catalog</a>'
+
+
+@pytest.fixture
+def client_rendered(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'SSR_SHOP', False)
+
+
+def test_root_shop_page_is_rendered_from_the_template(backend):
+    """GitHub Pages serves the root shop.html, so it must match the shared template."""
+    from sitegen import CLIENT_PAGE_NAME, render_client_page
+
+    with open(os.path.join(SOURCE_ROOT, CLIENT_PAGE_NAME), encoding='utf-8') as f:
+        committed = f.read()
+
+    assert committed == render_client_page(backend.app.jinja_env), \
+        'Regenerate it with `python sitegen.py --shop-page`'
+
+
+def test_client_rendered_page_comes_from_the_shop_template(client, client_rendered):
+    response = client.get('/shop.html')
+    html = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert html.count(NAV) == 1
+    assert 'class="filter-age" value="Toddler"' in html
+    assert 'Loading products…' in html
+    assert 'id="catalog-data"' not in html
+    assert html.index('auth-nav.js') < html.index('shop.js')
+
+
+def test_page_without_catalog_falls_back_to_client_rendering(client, backend, monkeypatch):
+    def unavailable():
+        raise IOError('Cosmos DB unavailable')
+
+    monkeypatch.setattr(backend, 'ensure_catalog_indexes', unavailable)
+    response = client.get('/shop.html?category=Baby')
+    html = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert 'Loading products…' in html and 'id="catalog-data"' not in html
+
+
+def test_generated_category_page_shares_the_layout(backend):
+    from sitegen import render_category_page
+
+    html = render_category_page(backend.app.jinja_env, 'Baby', [])
+
+    assert html.count(NAV) == 1
+    assert 'data-category="Baby"' in html and 'id="catalog-data"' in html
@@ -0,0 +1,66 @@
+import pytest
+
+from benchmarks.fakes import make_products
+from sitegen import build_site, build_sitemap, category_page_name
+
+
+@pytest.fixture
+def build(backend, site, tmp_path_factory):
+    out = tmp_path_factory.mktemp('out')
+    return out, lambda products, **kwargs: build_site(products, backend.app.jinja_env, out_dir=str(out),
+                                                      site_root=str(site), **kwargs)
+
+
+def test_first_build_renders_every_page(build):
+    out, run = build
+    products = make_products(20)
+    categories = {c for p in products for c in p['categories']}
+
+    report = run(products)
+
+    assert sorted(report['rendered']) == sorted(['shop.html'] + [category_page_name(c) for c in categories])
+    assert (out / 'index.html').exists() and (out / 'styles.css').exists()
+    assert (out / 'data' / 'products.json').exists()
+    html = (out / category_page_name(products[0]['categories'][0])).read_text(encoding='utf-8')
+    assert 'id="catalog-data"' in html
+
+
+def test_rebuild_renders_only_changed_categories(build):
+    out, run = build
+    products = make_products(20)
+    run(products)
+
+    assert run(products)['rendered'] == [] and run(products)['copied'] == 0
+
+    products[0] = dict(products[0], categories=products[0]['categories'][:1], price=products[0]['price'] + 1)
+    report = run(products)
+    assert sorted(report['rendered']) == sorted(['shop.html', category_page_name(products[0]['categories'][0])])
+
+
+def test_pages_of_emptied_categories_are_removed(build):
+    out, run = build
+    products = make_products(20)
+    run(products)
+
+    report = run([dict(p, categories=['Rompers']) for p in products])
+
+    assert category_page_name('Rompers') in report['rendered']
+    for category in {c for p in products for c in p['categories']} - {'Rompers'}:
+        assert category_page_name(category) in report['removed']
+        assert not (out / category_page_name(category)).exists()
+
+
+def test_sitemap_lists_category_and_public_pages(build):
+    out, run = build
+    run(make_products(5), base_url='https://shop.example.com/')
+    sitemap = (out / 'sitemap.xml').read_text()
+
+    assert '<loc>https://shop.example.com/</loc>' in sitemap
+    assert '<loc>https://shop.example.com/about.html</loc>' in sitemap
+    assert '<loc>https://shop.example.com/shop.html</loc>' in sitemap
+    assert 'admin' not in sitemap
+
+
+def test_build_sitemap_escapes_urls():
+    sitemap = build_sitemap('https://a.example/?x=1&y=2', {'terms.html': '2024-01-01'}).decode()
+    assert '<loc>https://a.example/?x=1&amp;y=2/terms.html</loc><lastmod>2024-01-01</lastmod>' in sitemap
@@ -0,0 +1,69 @@
+import json
+
+from benchmarks.fakes import make_products
+from snapshot import (
+    MANIFEST_NAME, LocalDirectoryPublisher, build_snapshot, category_slug, compact_product, publish_snapshot,
+)
+
+
+class CountingPublisher(LocalDirectoryPublisher):
+    def __init__(self, root):
+        super().__init__(root)
+        self.written = []
+
+    def write(self, name, data, cache_control):
+        self.written.append(name)
+        super().write(name, data, cache_control)
+
+
+def test_category_slug():
+    assert category_slug('Baby Girl') == 'baby-girl'
+    assert category_slug(' & ') == 'uncategorized'
+
+
+def test_compact_product_normalizes_age_groups():
+    product = dict(make_products(1)[0], ageGroups=['Toddler (1-3 years)', 'Kids'])
+    compact = compact_product(product)
+    assert compact['ageGroups'] == ['Toddler', 'Kids'] and compact['ageGroup'] == 'Toddler'
+    assert compact['mainCategory'] == product['categories'][0]
+
+
+def test_snapshot_is_newest_first_with_a_shard_per_category():
+    products = make_products(30)
+    files = build_snapshot(products)
+    items = json.loads(files['products.json'])
+
+    assert [p['id'] for p in items] == [p['id'] for p in sorted(products, key=lambda p: p['createdAt'], reverse=True)]
+    for product in products:
+        for category in product['categories']:
+            shard = json.loads(files[f'categories/{category_slug(category)}.json'])
+            assert product['id'] in {p['id'] for p in shard}
+
+
+def test_unchanged_snapshot_only_rewrites_the_manifest(tmp_path):
+    publisher = CountingPublisher(str(tmp_path))
+    products = make_products(10)
+    first = publish_snapshot(products, publisher)
+    publisher.written.clear()
+
+    second = publish_snapshot(products, publisher)
+
+    assert publisher.written == [MANIFEST_NAME]
+    assert second['files'] == first['files'] and second['retired'] == []
+    path = tmp_path / first['files']['products.json']['path']
+    assert path.read_bytes() == (tmp_path / 'products.json').read_bytes()
+
+
+def test_replaced_files_are_deleted_one_publish_later(tmp_path):
+    publisher = LocalDirectoryPublisher(str(tmp_path))
+    products = make_products(10)
+    old = publish_snapshot(products, publisher)['files']['products.json']['path']
+
+    products[0] = dict(products[0], price=products[0]['price'] + 1)
+    manifest = publish_snapshot(products, publisher)
+    assert old in manifest['retired'] and (tmp_path / old).exists()
+
+    products[0] = dict(products[0], price=products[0]['price'] + 1)
+    publish_snapshot(products, publisher)
+    assert not (tmp_path / old).exists()
+    assert json.loads((tmp_path / MANIFEST_NAME).read_text())['productCount'] == 10
@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+
+from startup_report import format_report, measure, parse_importtime, top_packages
+from tests.conftest import BACKEND_DIR
+
+# Loaded on first use or by the warm-up thread, never by importing the app
+DEFERRED_MODULES = ('PIL', 'azure.cosmos', 'azure.storage.blob', 'pyodbc', 'bcrypt')
+
+
+def test_importing_the_app_defers_heavy_modules(tmp_path):
+    env = dict(os.environ, JOB_DB_PATH=str(tmp_path / 'jobs.sqlite3'), WARM_UP='0', LOG_LEVEL='ERROR')
+    script = f'import json, sys, app; print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))'
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        300 |     flask.json
+import time:      1500 |       2000 |   flask
+import time:       900 |        900 |   azure.core
+not an import line
+import time:       garbled
+import time:       250 |       3400 | app
+"""
+
+
+def test_parse_importtime():
+    rows = parse_importtime(IMPORTTIME)
+    assert [row['module'] for row in rows] == ['_io', 'flask.json', 'flask', 'azure.core', 'app']
+    assert rows[1] == {'module': 'flask.json', 'self_us': 300, 'cumulative_us': 300, 'depth': 2}
+    assert rows[-1]['depth'] == 0
+
+
+def test_top_packages_sum_their_modules():
+    assert top_packages(parse_importtime(IMPORTTIME), 2) == [('flask', 1800), ('azure', 900)]
+
+
+def test_report_lists_slowest_modules_first():
+    timings = {'importMs': 3.4, 'firstResponseMs': 1.2, 'coldStartMs': 4.6, 'status': 200}
+    report = format_report(timings, parse_importtime(IMPORTTIME), limit=2)
+    lines = report.splitlines()
+    assert lines[1].endswith('app') and lines[2].endswith('  flask') and '_io' not in lines[3]
+    assert report.endswith('import app: 3 ms, first response: 1 ms (HTTP 200), cold start: 5 ms')
+
+
+def test_measure_reports_a_cold_start(tmp_path):
+    timings, rows = measure(env=dict(os.environ, JOB_DB_PATH=str(tmp_path / 'jobs.sqlite3'), LOG_LEVEL='ERROR'))
+    assert timings['status'] == 200
+    assert timings['coldStartMs'] >= timings['importMs'] > 0
+    assert any(row['module'] == 'app' for row in rows)
@@ -0,0 +1,51 @@
+import re
+
+import pytest
+
+from static_cache import StaticCache
+
+CACHE_ETAG = re.compile(r'^"[0-9a-f]{24}(-\w+)?"$')
+
+
+@pytest.mark.parametrize('path', ['/styles.css', '/about.html', '/dist/styles.0123456789ab.css',
+                                  '/assets/images/p001.png', '/data/products.json'])
+def test_site_paths_reach_serve_static(backend, path):
+    endpoint, _ = backend.app.url_map.bind('localhost').match(path)
+    assert endpoint == 'serve_static'
+
+
+def test_page_served_from_cache_with_etag_and_304(client, site):
+    response = client.get('/about.html')
+    assert response.status_code == 200
+    assert CACHE_ETAG.match(response.headers['ETag'])
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/about.html', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_file_served_from_cache_with_etag_and_304(client, site):
+    response = client.get('/styles.css')
+    assert response.status_code == 200
+    assert CACHE_ETAG.match(response.headers['ETag'])
+    assert response.headers['Last-Modified']
+    assert client.get('/styles.css', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+@pytest.mark.parametrize('path', ['/backend/app.py', '/backend/.env', '/.git/config', '/api/nothing'])
+def test_backend_and_dotfiles_not_served(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_misses_are_not_cached_and_deleted_files_free_their_bytes(tmp_path):
+    cache = StaticCache(str(tmp_path), revalidate=0)
+    (tmp_path / 'page.html').write_bytes(b'<p>hello</p>')
+
+    assert cache.get('page.html').body == b'<p>hello</p>'
+    for n in range(100):
+        assert cache.get(f'missing-{n}.html') is None
+    assert list(cache._entries) == ['page.html']
+
+    (tmp_path / 'page.html').unlink()
+    assert cache.get('page.html') is None
+    assert cache._entries == {} and cache.cached_bytes == 0
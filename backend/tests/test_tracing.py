@@ -0,0 +1,71 @@
+import json
+import time
+
+import tracing
+from metrics import timed
+
+TRACE_ID, PARENT_ID = '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7'
+
+
+def test_trace_continues_a_valid_traceparent():
+    root, token = tracing.start_trace('GET /', request_id='req-1', traceparent=f'00-{TRACE_ID}-{PARENT_ID}-01')
+    tracing.end_trace(root, token)
+    assert (root.trace.trace_id, root.parent_id, root.trace.request_id) == (TRACE_ID, PARENT_ID, 'req-1')
+
+
+def test_malformed_ids_are_replaced():
+    root, token = tracing.start_trace('GET /', request_id='bad id\n', traceparent='00-nothex-01')
+    tracing.end_trace(root, token)
+    assert root.parent_id is None and len(root.trace.trace_id) == 32 and root.trace.request_id != 'bad id\n'
+    assert tracing.current_span() is None
+
+
+def test_dependency_calls_are_child_spans():
+    root, token = tracing.start_trace('GET /api/products')
+    timed('cosmos', 'read_item', lambda: None)
+    try:
+        timed('sql', 'execute', lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    tracing.end_trace(root, token)
+
+    cosmos, sql, _ = root.trace.spans
+    assert (cosmos.name, cosmos.kind, cosmos.parent_id, cosmos.error) == ('cosmos read_item', 'client', root.span_id, None)
+    assert sql.error == 'division by zero'
+
+
+def test_request_id_is_echoed_and_traced(client):
+    response = client.get('/api/', headers={'X-Request-ID': 'abc-123', 'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+
+    assert response.headers['X-Request-ID'] == 'abc-123'
+    assert response.headers['traceparent'].startswith(f'00-{TRACE_ID}-')
+    assert len(client.get('/api/').headers['X-Request-ID']) == 32
+
+
+def test_exporter_writes_only_slow_traces(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    exporter = tracing.TraceExporter(str(path), min_ms=5)
+    fast, token = tracing.start_trace('GET /fast')
+    tracing.end_trace(fast, token, exporter)
+    slow, token = tracing.start_trace('GET /slow', request_id='slow-1')
+    slow.start_ns -= 10_000_000
+    tracing.end_trace(slow, token, exporter)
+
+    for _ in range(100):
+        if path.exists() and path.read_text():
+            break
+        time.sleep(0.01)
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(s['name'], s['requestId']) for s in spans] == [('GET /slow', 'slow-1')]
+    assert 'GET /slow' in tracing.format_waterfall(spans)
+
+
+def test_otlp_payload():
+    root, token = tracing.start_trace('GET /', request_id='r1', **{'http.status_code': 500})
+    root.error = 'HTTP 500'
+    tracing.end_trace(root, token)
+
+    span, = tracing.otlp_payload([root.to_dict()], 'svc')['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert span['kind'] == 2 and span['status'] == {'code': 2, 'message': 'HTTP 500'}
+    assert {'key': 'http.status_code', 'value': {'intValue': '500'}} in span['attributes']
+    assert {'key': 'request.id', 'value': {'stringValue': 'r1'}} in span['attributes']
@@ -0,0 +1,58 @@
+import io
+import struct
+import tempfile
+import types
+
+import pytest
+
+from images import image_dimensions
+from uploads import check_image_upload
+
+
+def jpeg(width, height, metadata_bytes=0):
+    """A JPEG header whose frame comes after `metadata_bytes` of APP1 segments."""
+    data = b'\xff\xd8'
+    while metadata_bytes > 0:
+        size = min(metadata_bytes, 60000)
+        data += b'\xff\xe1' + struct.pack('>H', size + 2) + b'\x00' * size
+        metadata_bytes -= size
+    data += b'\xff\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    return data + b'\xff\xd9'
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def upload(data):
+    spool = tempfile.SpooledTemporaryFile(max_size=1024, mode='rb+')
+    spool.write(data)
+    spool.seek(0)
+    return types.SimpleNamespace(stream=spool)
+
+
+def test_jpeg_frame_after_large_metadata_is_found_by_seeking():
+    stream = CountingStream(jpeg(640, 480, metadata_bytes=300000))
+
+    assert image_dimensions(stream) == (640, 480)
+    assert stream.bytes_read < 100
+    assert stream.tell() == 0
+
+
+def test_upload_with_large_metadata_is_checked_against_its_real_size():
+    data = jpeg(20000, 20000, metadata_bytes=200000)
+
+    with pytest.raises(ValueError, match='20000x20000'):
+        check_image_upload(upload(data), 1024 * 1024, 8000, 40_000_000)
+    assert check_image_upload(upload(jpeg(800, 600, metadata_bytes=200000)), 1024 * 1024, 8000, 40_000_000) == 'jpeg'
+
+
+def test_truncated_jpeg_has_no_dimensions():
+    assert image_dimensions(jpeg(640, 480, metadata_bytes=1000)[:500]) is None
@@ -0,0 +1,336 @@
+"""
+Request tracing.
+Every request gets a request ID: the incoming X-Request-ID header, or a new
+one. The ID is returned in the response and added to the app's log records.
+The request is the root span of a trace that follows W3C traceparent when
+the caller sends one. Dependency calls (timed by metrics.timed) are child
+spans. A finished trace is exported as a whole, either as JSON lines to
+TRACE_FILE or in OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT. TRACE_MIN_MS limits
+the export to slow requests. `python tracing.py TRACE_FILE [ID]` prints the
+waterfall of one trace, or of the slowest ones.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+import uuid
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+# Finished traces waiting for the exporter thread; traces past this are dropped
+EXPORT_QUEUE_SIZE = 1000
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(length):
+    return uuid.uuid4().hex[:length]
+
+
+class Trace:
+    """Spans of one request, exported together when the root span ends."""
+
+    __slots__ = ('trace_id', 'request_id', 'spans')
+
+    def __init__(self, trace_id, request_id):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace, name, parent_id=None, kind='internal', attributes=None):
+        self.trace = trace
+        self.span_id = _new_id(16)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'requestId': self.trace.request_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'attributes': self.attributes,
+            'status': {'code': 'ERROR', 'message': self.error} if self.error else {'code': 'OK'},
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_request_id():
+    span = _current_span.get()
+    return span.trace.request_id if span is not None else None
+
+
+def start_trace(name, request_id=None, traceparent=None, **attributes):
+    """Open the root span of a new trace and make it current; returns (span, token)."""
+    match = TRACEPARENT_RE.match(traceparent or '')
+    trace_id, parent_id = match.groups() if match else (_new_id(32), None)
+    if not request_id or not REQUEST_ID_RE.match(request_id):
+        request_id = _new_id(32)
+    span = Span(Trace(trace_id, request_id), name, parent_id, 'server', attributes)
+    return span, _current_span.set(span)
+
+
+def end_trace(span, token, exporter=None, error=None):
+    """Close the root span, restore the previous context and hand the trace to the exporter."""
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = str(error) or type(error).__name__
+    span.trace.spans.append(span)
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Ended from a different context than it started in
+        _current_span.set(None)
+    if exporter is not None:
+        exporter.submit(span)
+
+
+@contextlib.contextmanager
+def span(name, kind='internal', **attributes):
+    """Child span of the current span; does nothing outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = str(e) or type(e).__name__
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+        parent.trace.spans.append(child)
+
+
+def add_span(name, start_ns, kind='internal', error=None, **attributes):
+    """Record an already finished child span of the current span (for work that
+    cannot be wrapped in span(), such as consuming a generator)."""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    child.start_ns = start_ns
+    child.end_ns = time.time_ns()
+    child.error = error
+    parent.trace.spans.append(child)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds request_id (or '-') to every log record."""
+
+    def filter(self, record):
+        record.request_id = current_request_id() or '-'
+        return True
+
+
+class TraceExporter:
+    """Exports finished traces from a background thread (file or OTLP/HTTP JSON)."""
+
+    def __init__(self, path=None, otlp_endpoint=None, min_ms=0, service_name='vancr-backend', logger=None):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint.rstrip('/') if otlp_endpoint else None
+        self.min_ns = int(min_ms * 1e6)
+        self.service_name = service_name
+        self.logger = logger or logging.getLogger(__name__)
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, root):
+        if root.end_ns - root.start_ns < self.min_ns:
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(root.trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        # Started lazily so each gunicorn worker gets its own thread after the fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            traces = [self._queue.get()]
+            while len(traces) < 100:
+                try:
+                    traces.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [s.to_dict() for trace in traces for s in trace.spans]
+            try:
+                if self.path:
+                    self._write_file(spans)
+                if self.otlp_endpoint:
+                    self._post_otlp(spans)
+            except Exception as e:
+                self.logger.warning(f'Trace export failed ({len(spans)} spans dropped): {e}')
+
+    def _write_file(self, spans):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(s, separators=(',', ':')) + '\n' for s in spans))
+
+    def _post_otlp(self, spans):
+        body = json.dumps(otlp_payload(spans, self.service_name)).encode('utf-8')
+        req = urllib.request.Request(f'{self.otlp_endpoint}/v1/traces', data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=5) as response:
+            response.read()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans, service_name):
+    """OTLP/HTTP JSON request body for span dicts (as written to TRACE_FILE)."""
+    kinds = {'internal': 1, 'server': 2, 'client': 3}
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{'scope': {'name': 'vancr.tracing'}, 'spans': [{
+            'traceId': s['traceId'],
+            'spanId': s['spanId'],
+            'parentSpanId': s['parentSpanId'] or '',
+            'name': s['name'],
+            'kind': kinds.get(s['kind'], 1),
+            'startTimeUnixNano': str(s['startTimeUnixNano']),
+            'endTimeUnixNano': str(s['endTimeUnixNano']),
+            'attributes': [{'key': k, 'value': _otlp_value(v)}
+                           for k, v in dict(s['attributes'], **{'request.id': s['requestId']}).items()],
+            'status': {'code': 2, 'message': s['status']['message']} if s['status']['code'] == 'ERROR' else {'code': 1},
+        } for s in spans]}],
+    }]}
+
+
+def trace_requests(app, exporter=None):
+    """Trace every request of a Flask app and tag its log records with the request ID."""
+    from flask import g, request
+    from flask.logging import default_handler
+
+    app.logger.addFilter(RequestIdFilter())
+    default_handler.setFormatter(logging.Formatter(
+        '[%(asctime)s] %(levelname)s in %(module)s [%(request_id)s]: %(message)s'))
+
+    @app.before_request
+    def start_request_trace():
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g.trace = start_trace(f'{request.method} {route}',
+                              request_id=request.headers.get(REQUEST_ID_HEADER),
+                              traceparent=request.headers.get('traceparent'),
+                              **{'http.method': request.method, 'http.route': route, 'http.target': request.path})
+
+    @app.after_request
+    def add_request_id(response):
+        root = g.get('trace', (None,))[0]
+        if root is not None:
+            root.set(**{'http.status_code': response.status_code})
+            if response.status_code >= 500:
+                root.error = f'HTTP {response.status_code}'
+            response.headers[REQUEST_ID_HEADER] = root.trace.request_id
+            response.headers['traceparent'] = f'00-{root.trace.trace_id}-{root.span_id}-01'
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(error=None):
+        started = g.pop('trace', None)
+        if started is not None:
+            end_trace(*started, exporter=exporter, error=error)
+
+
+def load_traces(path):
+    """{trace id: [span dicts]} from a TRACE_FILE."""
+    traces = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                s = json.loads(line)
+                traces.setdefault(s['traceId'], []).append(s)
+    return traces
+
+
+def format_waterfall(spans, width=40):
+    """Text waterfall of one trace: offset, duration, bar and name of every span, nested."""
+    root = min(spans, key=lambda s: s['startTimeUnixNano'])
+    start, end = root['startTimeUnixNano'], max(s['endTimeUnixNano'] for s in spans)
+    total = max(end - start, 1)
+    children = {}
+    for s in spans:
+        children.setdefault(s['parentSpanId'], []).append(s)
+    lines = [f"trace {root['traceId']} request {root['requestId']}: {root['name']} {total / 1e6:.1f} ms"]
+
+    def walk(s, depth):
+        offset = s['startTimeUnixNano'] - start
+        duration = s['endTimeUnixNano'] - s['startTimeUnixNano']
+        left = int(offset / total * width)
+        bar = ' ' * left + '#' * max(1, int(duration / total * width))
+        mark = ' !' if s['status']['code'] == 'ERROR' else ''
+        lines.append(f"{offset / 1e6:8.1f} {duration / 1e6:8.1f} ms  |{bar:<{width}}|  {'  ' * depth}{s['name']}{mark}")
+        for child in sorted(children.get(s['spanId'], []), key=lambda c: c['startTimeUnixNano']):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Show request waterfalls from a trace file.')
+    parser.add_argument('file', help='TRACE_FILE written by the app')
+    parser.add_argument('id', nargs='?', help='trace ID or request ID (default: the slowest traces)')
+    parser.add_argument('--slowest', type=int, default=5, help='traces to show without an ID (default %(default)s)')
+    args = parser.parse_args()
+
+    traces = load_traces(args.file)
+    if args.id:
+        selected = [spans for trace_id, spans in traces.items()
+                    if trace_id == args.id or any(s['requestId'] == args.id for s in spans)]
+        if not selected:
+            raise SystemExit(f'No trace with ID {args.id}')
+    else:
+        duration = lambda spans: max(s['endTimeUnixNano'] for s in spans) - min(s['startTimeUnixNano'] for s in spans)  # noqa: E731
+        selected = sorted(traces.values(), key=duration, reverse=True)[:args.slowest]
+    print('\n\n'.join(format_waterfall(spans) for spans in selected))
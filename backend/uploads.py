@@ -0,0 +1,71 @@
+"""
+Request body limits and upload validation.
+Bodies are capped per endpoint (MAX_CONTENT_LENGTH everywhere else) and
+checked against Content-Length before anything is read. Multipart file parts
+are spooled to a temporary file once they pass a threshold, so a large upload
+never sits in worker memory. Images are rejected early from their magic bytes
+and header dimensions, without decoding any pixels.
+"""
+import os
+import tempfile
+
+from flask import Request
+
+from images import SNIFF_BYTES, image_dimensions, sniff_image_type
+
+
+class LimitedRequest(Request):
+    """Flask request with per-endpoint body limits and disk-spooled file parts."""
+
+    # Endpoint name -> maximum body size in bytes (others use MAX_CONTENT_LENGTH)
+    body_limits = {}
+
+    # File parts larger than this are moved from memory to a temporary file
+    spool_threshold = 1024 * 1024
+
+    @property
+    def max_content_length(self):
+        limit = self.body_limits.get(self.endpoint)
+        return limit if limit is not None else super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_threshold, mode='rb+')
+
+
+def stream_size(stream):
+    """Size of a seekable stream, leaving it rewound."""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def check_image_upload(file, max_bytes, max_dimension, max_pixels):
+    """Validate an uploaded image from its size and container headers; returns its format.
+
+    Raises ValueError when the upload is empty, too large, not a PNG, JPEG,
+    GIF or WEBP image, or has dimensions outside the limits.
+    """
+    return check_image_stream(file.stream, max_bytes, max_dimension, max_pixels)
+
+
+def check_image_stream(stream, max_bytes, max_dimension, max_pixels):
+    """check_image_upload() for any seekable stream (e.g. a blob read back into a spool)."""
+    size = stream_size(stream)
+    if size == 0 or size > max_bytes:
+        raise ValueError(f'Image must be between 1 byte and {max_bytes} bytes')
+
+    kind = sniff_image_type(stream.read(SNIFF_BYTES))
+    stream.seek(0)
+    if kind is None:
+        raise ValueError('Uploaded file is not a PNG, JPEG, GIF or WEBP image')
+
+    # Seeks through the spooled upload, so metadata of any size is skipped unread
+    dimensions = image_dimensions(stream)
+    if dimensions is None:
+        raise ValueError('Could not read the image dimensions')
+    width, height = dimensions
+    if not width or not height or max(width, height) > max_dimension or width * height > max_pixels:
+        raise ValueError(f'Image is {width}x{height}; the limit is {max_dimension}px per side '
+                         f'and {max_pixels // 1_000_000} megapixels')
+    return kind
@@ -0,0 +1,40 @@
+// Direct-to-blob image uploads for the admin pages.
+// The browser hashes the file, asks the backend for a short-lived SAS for that
+// single blob and PUTs the bytes straight to Blob Storage, so images never
+// pass through the app server. Returns { sha256, ext } to attach to a product.
+
+async function sha256Hex(file) {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadImageDirect(apiBase, userId, file) {
+  const sha256 = await sha256Hex(file);
+
+  const sasRes = await fetch(`${apiBase}/api/uploads/image-sas`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-User-Id': userId
+    },
+    body: JSON.stringify({ sha256, filename: file.name, size: file.size })
+  });
+  const sas = await sasRes.json();
+  if (!sasRes.ok || !sas.ok) {
+    throw new Error(sas.error || 'Could not start image upload');
+  }
+
+  // Identical image already stored - nothing to upload
+  if (sas.uploadRequired) {
+    const putRes = await fetch(sas.uploadUrl, {
+      method: 'PUT',
+      headers: { ...sas.headers, 'Content-Type': file.type || 'application/octet-stream' },
+      body: file
+    });
+    if (!putRes.ok) {
+      throw new Error(`Image upload failed (${putRes.status})`);
+    }
+  }
+
+  return { sha256: sas.sha256, ext: sas.ext };
+}
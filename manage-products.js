@@ -43,7 +43,7 @@ function renderProducts() {
   
   tbody.innerHTML = products.map(product => `
     <tr>
-      <td><img src="${product.imageUrl}" alt="Product" class="product-image-thumb" onerror="this.src='assets/images/placeholder.png'"></td>
+      <td><img src="${(product.images && product.images.thumb && product.images.thumb.jpeg) || product.imageUrl}" alt="Product" class="product-image-thumb" onerror="this.src='assets/images/placeholder.png'"></td>
       <td>₹${product.price.toFixed(2)}</td>
       <td>${product.categories.join(', ')}</td>
       <td>${product.ageGroups.join(', ')}</td>
@@ -123,7 +123,8 @@ function openEditModal(productId) {
   if (!productToEdit) return;
   
   // Set product image
-  document.getElementById('editProductImage').src = productToEdit.imageUrl;
+  document.getElementById('editProductImage').src =
+    (productToEdit.images && productToEdit.images.card && productToEdit.images.card.jpeg) || productToEdit.imageUrl;
   
   // Set price
   document.getElementById('editPrice').value = productToEdit.price;
@@ -218,63 +219,50 @@ document.getElementById('editForm').addEventListener('submit', async (e) => {
     // Check if new image is uploaded
     const imageFile = document.getElementById('editImage').files[0];
     
-    if (imageFile) {
-      // If new image is uploaded, use FormData to include the file
-      const formData = new FormData();
-      formData.append('price', newPrice);
-      formData.append('categories', JSON.stringify(categories));
-      formData.append('ageGroups', JSON.stringify(ageGroups));
-      formData.append('seasons', JSON.stringify(seasons));
-      formData.append('occasions', JSON.stringify(occasions));
-      formData.append('itemImage', imageFile);
-      
-      const response = await fetch(`${API_BASE}/api/products/${productToEdit.id}`, {
-        method: 'PUT',
-        headers: {
-          'X-User-Id': user.userId
-        },
-        body: formData
-      });
-      
-      const data = await response.json();
-      
-      if (response.ok && data.ok) {
-        showStatus('Product updated successfully', 'success');
-        closeEditModal();
-        loadProducts();
-      } else {
-        showEditModalError(data.error || 'Failed to update product');
-      }
-    } else {
-      // No new image, send JSON only
-      const response = await fetch(`${API_BASE}/api/products/${productToEdit.id}`, {
-        method: 'PUT',
+    // Upload a new image straight to Blob Storage before saving
+    const uploaded = imageFile ? await uploadImageDirect(API_BASE, user.userId, imageFile) : null;
+    
+    const response = await fetch(`${API_BASE}/api/products/${productToEdit.id}`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-User-Id': user.userId
+      },
+      body: JSON.stringify({
+        price: newPrice,
+        categories: categories,
+        ageGroups: ageGroups,
+        seasons: seasons,
+        occasions: occasions
+      })
+    });
+    
+    let data = await response.json();
+    
+    // Verify the uploaded blob and attach it to the product
+    if (response.ok && data.ok && uploaded) {
+      const imageResponse = await fetch(`${API_BASE}/api/products/${productToEdit.id}/image`, {
+        method: 'POST',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': user.userId
         },
-        body: JSON.stringify({
-          price: newPrice,
-          categories: categories,
-          ageGroups: ageGroups,
-          seasons: seasons,
-          occasions: occasions
-        })
+        body: JSON.stringify(uploaded)
       });
-      
-      const data = await response.json();
-      
-      if (response.ok && data.ok) {
-        showStatus('Product updated successfully', 'success');
-        closeEditModal();
-        loadProducts();
-      } else {
-        showEditModalError(data.error || 'Failed to update product');
-      }
+      data = await imageResponse.json();
+    }
+    
+    if (data.ok) {
+      showStatus(data.imagePending ? 'Product updated; the new image appears once it has been checked'
+                                   : 'Product updated successfully', 'success');
+      closeEditModal();
+      loadProducts();
+    } else {
+      showEditModalError(data.error || 'Failed to update product');
     }
   } catch (error) {
     console.error('Error updating product:', error);
-    showEditModalError('Network error. Could not update product.');
+    showEditModalError(error instanceof TypeError ? 'Network error. Could not update product.' : error.message);
   }
 });
 
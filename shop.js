@@ -24,6 +24,7 @@ async function loadProducts() {
           id: p.id,
           name: p.itemName || `${p.categories && p.categories.length > 0 ? p.categories.join('/') : 'Item'} - ₹${p.price || 0}`,
           image: p.imageUrl,
+          images: p.images || null,
           price: p.price || 0,
           description: p.description || '',
           mainCategory: p.categories && p.categories.length > 0 ? p.categories[0] : 'Uncategorized',
@@ -87,6 +88,43 @@ let PRODUCTS = [];
 let CURRENT_MAIN = null;
 let CURRENT_SUB = null;
 
+// Catalog data inlined by the server-rendered shop page (null for the static page)
+function readInlineCatalog() {
+  const el = document.getElementById('catalog-data');
+  if (!el) return null;
+  try {
+    return JSON.parse(el.textContent);
+  } catch (e) {
+    console.error('Invalid inline catalog data', e);
+    return null;
+  }
+}
+
+// Hover zoom for a product card (also used on server-rendered cards)
+function enhanceCard(card) {
+  const container = card.querySelector('.product-image-container');
+  const img = card.querySelector('.product-image');
+  if (!container || !img) return;
+  
+  // Switch to the zoom rendition once the user starts zooming
+  container.addEventListener('mouseenter', () => {
+    card.querySelectorAll('source, img').forEach(el => { if (el.sizes) el.sizes = '5in'; });
+  }, { once: true });
+  
+  container.addEventListener('mousemove', (e) => {
+    const rect = container.getBoundingClientRect();
+    const x = ((e.clientX - rect.left) / rect.width) * 100;
+    const y = ((e.clientY - rect.top) / rect.height) * 100;
+    img.style.transformOrigin = `${x}% ${y}%`;
+    img.style.transform = 'scale(2.5)';
+  });
+  
+  container.addEventListener('mouseleave', () => {
+    img.style.transform = 'scale(1)';
+    img.style.transformOrigin = 'center center';
+  });
+}
+
 function renderProducts(list) {
   const target = document.getElementById('products');
   if (!list || list.length === 0) {
@@ -98,32 +136,23 @@ function renderProducts(list) {
     const card = document.createElement('div');
     card.className = 'product-card';
     const displayName = p.name || (p.categories && p.categories.length > 0 ? p.categories.join('/') : 'Product');
+    // Resized renditions (when available) so cards don't download full-size uploads
+    const imageHtml = p.images && p.images.srcset
+      ? `<picture>
+          <source type="image/webp" srcset="${p.images.srcset.webp}" sizes="2in">
+          <img src="${p.images.card.jpeg}" srcset="${p.images.srcset.jpeg}" sizes="2in" alt="${displayName}" class="product-image" loading="lazy" />
+        </picture>`
+      : `<img src="${p.image || 'assets/images/p001.png'}" alt="${displayName}" class="product-image" />`;
     card.innerHTML = `
       <div class="product-image-container">
-        <img src="${p.image || 'assets/images/p001.png'}" alt="${displayName}" class="product-image" />
+        ${imageHtml}
         <div class="zoom-icon">🔍</div>
       </div>
       <p class="price" style="font-size: 1.4rem; font-weight: 700; color: #2d7a3f; margin: 8px 0;">₹${p.price || 0}</p>
       ${p.description ? `<p class="desc" style="font-size: 0.9rem; color: #666;">${p.description}</p>` : ''}
     `;
     
-    // Add mouse move event for zoom effect
-    const container = card.querySelector('.product-image-container');
-    const img = card.querySelector('.product-image');
-    
-    container.addEventListener('mousemove', (e) => {
-      const rect = container.getBoundingClientRect();
-      const x = ((e.clientX - rect.left) / rect.width) * 100;
-      const y = ((e.clientY - rect.top) / rect.height) * 100;
-      img.style.transformOrigin = `${x}% ${y}%`;
-      img.style.transform = 'scale(2.5)';
-    });
-    
-    container.addEventListener('mouseleave', () => {
-      img.style.transform = 'scale(1)';
-      img.style.transformOrigin = 'center center';
-    });
-    
+    enhanceCard(card);
     target.appendChild(card);
   });
 }
@@ -187,12 +216,18 @@ function filterBySubcategory(sub) {
 }
 
 document.addEventListener('DOMContentLoaded', async () => {
-  const main = getQueryParam('category') || 'All';
+  // Pre-rendered category pages (shop-<category>.html) carry their category on <body>
+  const main = getQueryParam('category') || document.body.dataset.category || 'All';
   CURRENT_MAIN = main === 'All' ? null : main;
+  CURRENT_SUB = getQueryParam('sub');
   document.getElementById('current-category').textContent = main;
   renderSubcategories(main);
 
-  PRODUCTS = await loadProducts();
+  // Server-rendered and statically generated pages already show the grid and
+  // inline the category's products, so no API round trip or re-render is needed
+  const inline = readInlineCatalog();
+  const grid = document.getElementById('products');
+  PRODUCTS = inline || await loadProducts();
   // Normalize some fields for backward compatibility
   PRODUCTS = PRODUCTS.map(p => ({
     ...p,
@@ -200,7 +235,14 @@ document.addEventListener('DOMContentLoaded', async () => {
     subCategory: p.subCategory || p.subcategory || p.type || ''
   }));
 
-  renderProducts(PRODUCTS.filter(p => !CURRENT_MAIN || p.mainCategory === CURRENT_MAIN));
+  // Statically generated pages are not filtered by subcategory, server-rendered ones are
+  if (inline && (grid.dataset.rendered === 'server' || !CURRENT_SUB)) {
+    grid.querySelectorAll('.product-card').forEach(enhanceCard);
+  } else if (CURRENT_SUB) {
+    applyFilters();
+  } else {
+    renderProducts(PRODUCTS.filter(p => !CURRENT_MAIN || p.mainCategory === CURRENT_MAIN));
+  }
 
   document.querySelectorAll('.filter-age, .filter-season, .filter-occasion').forEach(el => {
     el.addEventListener('change', applyFilters);